@@ -3,6 +3,8 @@ let reconnectAttempts = 0;
 let maxReconnectAttempts = 3;
 let reconnectTimeout;
 let surveyCompleted = false;
+// Highest frame sequence number received; acknowledged to the server
+let lastSeq = 0;
 
 function setConnectionStatus(connected) {
     const connectBtn = document.getElementById("connect-btn");
@@ -49,12 +51,15 @@ function connect(isReconnect = false) {
     if (!isReconnect) {
         document.getElementById("messages").innerHTML = "";
         surveyCompleted = false;
+        lastSeq = 0;
     }
 
-    // Create WebSocket connection
-    let wsUrl = `ws://localhost:8000/ws/${conversationId}`;
+    // Create WebSocket connection; frames are acknowledged so the server can
+    // redeliver the ones we miss and close as soon as we have the last one
+    // The conversation arrives in one bootstrap frame, before its history
+    let wsUrl = `ws://localhost:8000/ws/${conversationId}?ack=1&bootstrap=first_paint`;
     if (isReconnect) {
-        wsUrl += "?reconnect=true";
+        wsUrl += `&reconnect=true&last_seq=${lastSeq}`;
     }
 
     socket = new WebSocket(wsUrl);
@@ -76,12 +81,26 @@ function connect(isReconnect = false) {
         try {
             const data = JSON.parse(event.data);
 
+            if (data.seq !== undefined) {
+                socket.send(JSON.stringify({ type: "ack", seq: data.seq }));
+                if (data.seq <= lastSeq) {
+                    return; // Redelivered frame we already handled
+                }
+                lastSeq = data.seq;
+            }
+
             // Handle different message types
             if (data.type === "error") {
                 addMessage(`Error: ${data.message}`, "error");
             } else if (data.type === "state") {
                 addMessage("Received initial state", "system");
                 console.log("State:", data);
+            } else if (data.type === "bootstrap") {
+                addMessage("Received initial state", "system");
+                console.log("Bootstrap:", data);
+                if (data.resume_message) {
+                    addMessage(`Resumed conversation: ${data.resume_message}`, "system");
+                }
             } else if (data.type === "history") {
                 addMessage("Received message history", "system");
                 if (data.messages && data.messages.length > 0) {
@@ -115,6 +134,9 @@ function connect(isReconnect = false) {
                         "system"
                     );
                 }
+            } else if (data.type === "ping") {
+                // Heartbeat: answer so the server keeps the connection
+                socket.send(JSON.stringify({ type: "pong" }));
             } else if (data.type === "reconnect_success") {
                 addMessage(`Reconnection successful: ${data.message}`, "system");
             } else {
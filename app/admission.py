@@ -0,0 +1,244 @@
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+
+class AdmissionClass:
+    """
+    Limits for one class of work.
+
+    Lower `priority` values are admitted first when work is waiting. A
+    request that waited `max_wait` seconds without being admitted is shed,
+    as is one that arrives when `max_queue` requests of its class already wait.
+    """
+
+    def __init__(self, name: str, limit: int, priority: int = 0, max_wait: float = 1.0,
+                 max_queue: int = 100, retry_after: Optional[float] = None):
+        self.name = name
+        self.limit = limit
+        self.priority = priority
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.retry_after = retry_after if retry_after is not None else max(1.0, max_wait)
+
+
+class Rejected(Exception):
+    def __init__(self, admission_class: str, reason: str, retry_after: float):
+        super().__init__(f"{admission_class} request rejected: {reason}")
+        self.admission_class = admission_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admits work up to a shared `capacity` and per-class limits.
+
+    Work that cannot start immediately waits in a priority queue. When a slot
+    is released the highest-priority waiter whose class is under its limit
+    starts, so a class at its limit does not hold back the others.
+    """
+
+    def __init__(self, classes: List[AdmissionClass], capacity: int,
+                 on_reject: Optional[Callable[[Rejected], None]] = None,
+                 on_admit: Optional[Callable[[str, float], None]] = None):
+        self.classes = {admission_class.name: admission_class for admission_class in classes}
+        self.capacity = capacity
+        self.in_flight = 0
+        self.class_in_flight = {name: 0 for name in self.classes}
+        self.class_waiting = {name: 0 for name in self.classes}
+        self._on_reject = on_reject
+        self._on_admit = on_admit
+        self._waiters: List[Any] = []
+        self._order = itertools.count()
+
+    def _has_room(self, admission_class: AdmissionClass) -> bool:
+        return (self.in_flight < self.capacity
+                and self.class_in_flight[admission_class.name] < admission_class.limit)
+
+    def _start(self, admission_class: AdmissionClass, waited: float):
+        self.in_flight += 1
+        self.class_in_flight[admission_class.name] += 1
+        if self._on_admit is not None:
+            self._on_admit(admission_class.name, waited)
+
+    def _reject(self, admission_class: AdmissionClass, reason: str) -> Rejected:
+        rejected = Rejected(admission_class.name, reason, admission_class.retry_after)
+        if self._on_reject is not None:
+            self._on_reject(rejected)
+        return rejected
+
+    def _waiting_ahead(self, priority: int) -> bool:
+        # Waiters held back only by their own class limit do not count
+        return any(not future.done() and entry_priority <= priority and self._has_room(entry_class)
+                   for entry_priority, _, future, entry_class in self._waiters)
+
+    async def acquire(self, name: str):
+        """Wait for a slot in the given class, raising Rejected if the work is shed."""
+        admission_class = self.classes[name]
+        if self._has_room(admission_class) and not self._waiting_ahead(admission_class.priority):
+            self._start(admission_class, 0.0)
+            return
+        if self.class_waiting[name] >= admission_class.max_queue:
+            raise self._reject(admission_class, "queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (admission_class.priority, next(self._order), future, admission_class))
+        self.class_waiting[name] += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, admission_class.max_wait)
+        except asyncio.TimeoutError:
+            # Admitted just as the wait timed out: hand the slot on
+            if future.done() and not future.cancelled():
+                self.release(name)
+            raise self._reject(admission_class, "queue_timeout")
+        except asyncio.CancelledError:
+            # Admitted just as the caller went away: hand the slot on
+            if future.done() and not future.cancelled():
+                self.release(name)
+            raise
+        finally:
+            self.class_waiting[name] -= 1
+        if self._on_admit is not None:
+            self._on_admit(name, time.monotonic() - started)
+
+    def release(self, name: str):
+        self.in_flight -= 1
+        self.class_in_flight[name] -= 1
+        self._wake()
+
+    def _wake(self):
+        skipped = []
+        while self._waiters and self.in_flight < self.capacity:
+            entry = heapq.heappop(self._waiters)
+            _, _, future, admission_class = entry
+            if future.done():
+                continue
+            if not self._has_room(admission_class):
+                skipped.append(entry)
+                continue
+            self.in_flight += 1
+            self.class_in_flight[admission_class.name] += 1
+            future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self._waiters, entry)
+
+    @asynccontextmanager
+    async def slot(self, name: str) -> AsyncIterator[None]:
+        await self.acquire(name)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "classes": {
+                name: {"limit": admission_class.limit, "priority": admission_class.priority,
+                       "in_flight": self.class_in_flight[name], "waiting": self.class_waiting[name]}
+                for name, admission_class in self.classes.items()
+            },
+        }
+
+
+# Picks the admission class of a request from its ASGI scope; None means exempt
+Classifier = Callable[[Dict[str, Any]], Optional[str]]
+
+WEBSOCKET_TRY_AGAIN_LATER = 1013
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that admits HTTP requests and WebSocket handshakes.
+
+    Shed HTTP requests get 429 with Retry-After. Shed WebSocket connections
+    are accepted and immediately closed with code 1013 (Try Again Later).
+    A WebSocket holds its slot only until the app first waits for a client
+    message, i.e. until the initial state has been sent.
+    """
+
+    def __init__(self, app: Any, controller: AdmissionController, classify: Classifier):
+        self.app = app
+        self.controller = controller
+        self.classify = classify
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        name = self.classify(scope)
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(name)
+        except Rejected as rejected:
+            if scope["type"] == "http":
+                await self._reject_http(send, rejected)
+            else:
+                await self._reject_websocket(receive, send)
+            return
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.controller.release(name)
+
+        if scope["type"] == "http":
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                release()
+            return
+
+        receives = 0
+
+        async def receive_and_release():
+            nonlocal receives
+            receives += 1
+            # The first receive is the handshake; the next one means the
+            # connection is set up and only waiting for the client
+            if receives > 1:
+                release()
+            return await receive()
+
+        try:
+            await self.app(scope, receive_and_release, send)
+        finally:
+            release()
+
+    @staticmethod
+    async def _reject_http(send, rejected: Rejected):
+        body = json.dumps({"detail": "Server is busy, please retry later.",
+                           "reason": rejected.reason}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(rejected.retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _reject_websocket(receive, send):
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+        await send({"type": "websocket.accept"})
+        await send({"type": "websocket.close", "code": WEBSOCKET_TRY_AGAIN_LATER,
+                    "reason": "Server is busy, please retry later."})
@@ -0,0 +1,299 @@
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# Fetches up to `limit` responses for a survey saved after `after_seq`
+PageFetcher = Callable[[str, int, int], List[Dict[str, Any]]]
+
+MISSING = -1
+
+
+class Categorical:
+    """Maps string labels to dense integer codes."""
+
+    def __init__(self):
+        self.labels: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def lookup(self, label: Any) -> int:
+        """Return the code for a label without adding it."""
+        return self._codes.get(str(label), MISSING)
+
+    def code(self, label: Any) -> int:
+        if label is None:
+            return MISSING
+        label = str(label)
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+
+class ResponseColumns:
+    """
+    Append-only columnar copy of one survey's responses.
+
+    Each column is a NumPy array that grows by doubling, and text values are
+    stored as categorical codes. New pages are appended without rebuilding
+    what is already loaded.
+    """
+
+    def __init__(self, survey_id: str):
+        self.survey_id = survey_id
+        self.size = 0
+        self.last_seq = 0
+        self.customers = Categorical()
+        self.answer_labels: Dict[str, Categorical] = {}
+        self._capacity = 1024
+        self._completed_at = np.zeros(self._capacity, dtype=np.int64)
+        self._customer = np.zeros(self._capacity, dtype=np.int32)
+        self._answers: Dict[str, np.ndarray] = {}
+
+    def _grow(self, needed: int):
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self._capacity:
+            return
+
+        def resize(array: np.ndarray, fill: int) -> np.ndarray:
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            return grown
+
+        self._completed_at = resize(self._completed_at, 0)
+        self._customer = resize(self._customer, MISSING)
+        self._answers = {question_id: resize(column, MISSING)
+                         for question_id, column in self._answers.items()}
+        self._capacity = capacity
+
+    def _answer_column(self, question_id: str) -> np.ndarray:
+        column = self._answers.get(question_id)
+        if column is None:
+            column = self._answers[question_id] = np.full(
+                self._capacity, MISSING, dtype=np.int32)
+            self.answer_labels[question_id] = Categorical()
+        return column
+
+    def append(self, page: List[Dict[str, Any]]):
+        if not page:
+            return
+        start = self.size
+        self._grow(start + len(page))
+        for offset, response in enumerate(page):
+            row = start + offset
+            completed_at = response.get("completed_at")
+            self._completed_at[row] = int(datetime.fromisoformat(
+                completed_at).timestamp()) if completed_at else 0
+            self._customer[row] = self.customers.code(
+                response.get("customer_id"))
+            for question_id, answer in response.get("answers", {}).items():
+                column = self._answer_column(question_id)
+                column[row] = self.answer_labels[question_id].code(answer)
+        self.size = start + len(page)
+        self.last_seq = page[-1]["seq"]
+
+    @property
+    def completed_at(self) -> np.ndarray:
+        return self._completed_at[:self.size]
+
+    @property
+    def customer(self) -> np.ndarray:
+        return self._customer[:self.size]
+
+    def answers(self, question_id: str) -> np.ndarray:
+        column = self._answers.get(question_id)
+        if column is None:
+            return np.full(self.size, MISSING, dtype=np.int32)
+        return column[:self.size]
+
+    def labels(self, question_id: str) -> List[str]:
+        categorical = self.answer_labels.get(question_id)
+        return categorical.labels if categorical else []
+
+    def snapshot(self) -> "ColumnsSnapshot":
+        """The columns as they are now; call with the columns' lock held."""
+        return ColumnsSnapshot(self)
+
+
+class ColumnsSnapshot:
+    """
+    ResponseColumns frozen at one size, for reading while they grow. The
+    arrays are views of the loaded rows, and labels are cut at the counts
+    known when the snapshot was taken, since codes are only ever appended.
+    """
+
+    def __init__(self, columns: ResponseColumns):
+        self.survey_id = columns.survey_id
+        self.size = columns.size
+        self.completed_at = columns.completed_at
+        self.customer = columns.customer
+        self._columns = columns
+        self._customer_count = len(columns.customers.labels)
+        self._answers = {question_id: column[:self.size]
+                         for question_id, column in columns._answers.items()}
+        self._label_counts = {question_id: len(categorical.labels)
+                              for question_id, categorical in columns.answer_labels.items()}
+
+    def customer_code(self, customer_id: str) -> int:
+        code = self._columns.customers.lookup(customer_id)
+        return code if code < self._customer_count else MISSING
+
+    @property
+    def customer_labels(self) -> List[str]:
+        return self._columns.customers.labels[:self._customer_count]
+
+    def answers(self, question_id: str) -> np.ndarray:
+        column = self._answers.get(question_id)
+        if column is None:
+            return np.full(self.size, MISSING, dtype=np.int32)
+        return column
+
+    def labels(self, question_id: str) -> List[str]:
+        count = self._label_counts.get(question_id, 0)
+        return self._columns.answer_labels[question_id].labels[:count] if count else []
+
+
+def group_count(row_codes: np.ndarray, n_rows: int, col_codes: np.ndarray, n_cols: int) -> np.ndarray:
+    """Count rows per (row, column) code pair, ignoring missing codes."""
+    present = (row_codes >= 0) & (col_codes >= 0)
+    combined = row_codes[present].astype(
+        np.int64) * n_cols + col_codes[present]
+    return np.bincount(combined, minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+
+
+class AnalyticsEngine:
+    """
+    Answers analytical queries over survey responses from columnar arrays.
+
+    Columns are built on first use and refreshed incrementally: only pages
+    saved after the last loaded seq are fetched, and only when the store has
+    reported a new response for that survey since the previous refresh.
+    """
+
+    PAGE_SIZE = 5000
+
+    def __init__(self, fetch_page: PageFetcher):
+        self._fetch_page = fetch_page
+        self._columns: Dict[str, ResponseColumns] = {}
+        self._dirty: Dict[str, bool] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def mark_dirty(self, survey_id: str):
+        self._dirty[survey_id] = True
+
+    def columns(self, survey_id: str) -> ColumnsSnapshot:
+        """A snapshot of the survey's columns, refreshed first if responses were saved."""
+        with self._guard:
+            lock = self._locks.setdefault(survey_id, threading.Lock())
+        with lock:
+            columns = self._columns.get(survey_id)
+            if columns is None:
+                columns = ResponseColumns(survey_id)
+            elif not self._dirty.get(survey_id, False):
+                return columns.snapshot()
+            # Clear the flag before fetching so a response saved mid-refresh is not missed
+            self._dirty[survey_id] = False
+            try:
+                while True:
+                    page = self._fetch_page(
+                        survey_id, columns.last_seq, self.PAGE_SIZE)
+                    columns.append(page)
+                    if len(page) < self.PAGE_SIZE:
+                        break
+            except Exception:
+                # Fetch the rest on the next query instead of serving a partial load
+                self._dirty[survey_id] = True
+                raise
+            # New columns are only kept once fully loaded
+            self._columns[survey_id] = columns
+            return columns.snapshot()
+
+    @staticmethod
+    def _mask(columns: ColumnsSnapshot, customer_id: Optional[str] = None,
+              since: Optional[datetime] = None, until: Optional[datetime] = None) -> np.ndarray:
+        mask = np.ones(columns.size, dtype=bool)
+        if customer_id is not None:
+            code = columns.customer_code(customer_id)
+            mask &= (columns.customer == code) & (code != MISSING)
+        if since is not None:
+            mask &= columns.completed_at >= int(since.timestamp())
+        if until is not None:
+            mask &= columns.completed_at < int(until.timestamp())
+        return mask
+
+    def counts(self, survey_id: str, question_id: str, **filters: Any) -> Dict[str, Any]:
+        """Distribution of answers to one question."""
+        columns = self.columns(survey_id)
+        answers = columns.answers(question_id)[self._mask(columns, **filters)]
+        labels = columns.labels(question_id)
+        totals = np.bincount(answers[answers >= 0], minlength=len(labels))
+        return {
+            "question": question_id,
+            "responses": int(answers.size),
+            "answered": int(totals.sum()),
+            "counts": dict(zip(labels, totals.tolist())),
+        }
+
+    def crosstab(self, survey_id: str, question_id: str, by: str,
+                 bucket_seconds: int = 3600, **filters: Any) -> Dict[str, Any]:
+        """
+        Cross-tabulate answers to a question by "customer", by "time" bucket
+        or by the answers to another question.
+        """
+        columns = self.columns(survey_id)
+        mask = self._mask(columns, **filters)
+        answers = columns.answers(question_id)[mask]
+        col_labels = columns.labels(question_id)
+
+        if by == "customer":
+            row_codes = columns.customer[mask]
+            row_labels = columns.customer_labels
+        elif by == "time":
+            buckets = columns.completed_at[mask] // bucket_seconds
+            unique_buckets, row_codes = np.unique(buckets, return_inverse=True)
+            row_labels = [datetime.fromtimestamp(int(b) * bucket_seconds).isoformat()
+                          for b in unique_buckets]
+        else:
+            row_codes = columns.answers(by)[mask]
+            row_labels = columns.labels(by)
+
+        table = group_count(row_codes, len(row_labels),
+                            answers, len(col_labels))
+        # Drop rows with no answers, e.g. customers filtered out by the mask
+        keep = table.sum(axis=1) > 0
+        return {
+            "question": question_id,
+            "by": by,
+            "columns": col_labels,
+            "rows": [label for label, kept in zip(row_labels, keep) if kept],
+            "counts": table[keep].tolist(),
+        }
+
+    @staticmethod
+    def funnel(question_ids: List[str], progress: Dict[str, List[Any]]) -> Dict[str, Any]:
+        """
+        Completion funnel over conversations: how many started, reached each
+        question (by current_question_index) and completed.
+        """
+        index = np.asarray(progress["current_question_index"], dtype=np.int64)
+        completed = np.asarray(progress["status"]) == "completed"
+        reached_by_index = np.bincount(
+            np.clip(index, 0, len(question_ids)), minlength=len(question_ids) + 1)
+        # A conversation at index i has reached every question up to i
+        reached = np.cumsum(reached_by_index[::-1])[::-1][:len(question_ids)]
+        started = int(index.size)
+        return {
+            "started": started,
+            "steps": [
+                {"question": question_id, "reached": int(count),
+                 "rate": round(count / started, 4) if started else 0.0}
+                for question_id, count in zip(question_ids, reached)
+            ],
+            "completed": int(completed.sum()),
+            "completion_rate": round(float(completed.sum()) / started, 4) if started else 0.0,
+        }
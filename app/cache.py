@@ -0,0 +1,105 @@
+import gzip
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+def encode_json(value: Any) -> bytes:
+    """Encode a value the same way FastAPI's JSONResponse does."""
+    return json.dumps(
+        value,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class EncodedPayload:
+    """A value together with its pre-serialized (and optionally gzipped) JSON body."""
+
+    __slots__ = ("value", "body", "gzip_body", "etag", "version")
+
+    def __init__(self, value: Any, version: int, compress_min_size: Optional[int]):
+        self.value = value
+        self.version = version
+        self.body = encode_json(value)
+        self.etag = '"%s"' % hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.gzip_body = None
+        if compress_min_size is not None and len(self.body) >= compress_min_size:
+            self.gzip_body = gzip.compress(self.body, mtime=0)
+
+
+class EncodedResponseCache:
+    """
+    Cache of encoded payloads keyed by an arbitrary key and its version.
+
+    Every key has a version counter that is bumped by invalidate(). Entries
+    built for an older version are rebuilt on the next read, so a load that
+    races with an invalidation can never be served afterwards.
+    """
+
+    def __init__(self, compress_min_size: Optional[int] = 1024):
+        self.compress_min_size = compress_min_size
+        self._entries: Dict[Hashable, EncodedPayload] = {}
+        self._versions: Dict[Hashable, int] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, key: Hashable) -> Tuple[int, int]:
+        return self._generation, self._versions.get(key, 0)
+
+    def get(self, key: Hashable) -> Optional[EncodedPayload]:
+        """Return the cached payload for key if it is still current."""
+        entry = self._entries.get(key)
+        if entry is not None and entry.version == self.version(key):
+            self.hits += 1
+            return entry
+        return None
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Optional[EncodedPayload]:
+        """Return the cached payload for key, loading and encoding it on a miss.
+
+        A loader result of None is not cached and None is returned.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        self.misses += 1
+        version = self.version(key)
+        value = loader()
+        if value is None:
+            return None
+
+        entry = EncodedPayload(value, version, self.compress_min_size)
+        with self._lock:
+            if version == self.version(key):
+                self._entries[key] = entry
+        return entry
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Invalidate one key, or every key when called without arguments."""
+        with self._lock:
+            if key is None:
+                self._generation += 1
+                self._entries.clear()
+            else:
+                self._versions[key] = self._versions.get(key, 0) + 1
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.invalidate()
+        self.hits = 0
+        self.misses = 0
+
+
+def splice_json_object(fields: Dict[str, bytes]) -> str:
+    """Build a JSON object from already-encoded member values."""
+    members = [
+        encode_json(name) + b":" + raw
+        for name, raw in fields.items()
+    ]
+    return (b"{" + b",".join(members) + b"}").decode("utf-8")
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.retry import RetryBudget, retry_layer
+
+logger = logging.getLogger(__name__)
+
+# A customer source yields (customer_id, customer) pairs to dispatch
+CustomerSource = Callable[[], AsyncIterator[Tuple[str, Dict[str, Any]]]]
+# A dispatch function creates and greets one conversation; it runs in the threadpool
+DispatchFunction = Callable[[str, Dict[str, Any]], Any]
+
+
+class RateLimiter:
+    """Token bucket limiter whose rate can be adjusted while it is in use."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens +
+                           (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Campaign:
+    """
+    Dispatches one conversation per customer at a bounded rate and concurrency.
+
+    When the RPC layer raises ConnectionError the campaign halves its rate,
+    pauses all workers for an exponentially growing backoff and retries the
+    customer. Each success restores a little of the configured rate
+    (additive increase, multiplicative decrease). Retries are paid for from
+    `retry_budget`, if given; a customer whose retry is refused counts as failed.
+    The dispatch function runs in a retry layer, so its own RPC retries
+    collapse into the campaign's.
+    """
+
+    MIN_RATE = 0.5
+    MAX_ATTEMPTS = 5
+    BASE_BACKOFF = 0.5
+    MAX_BACKOFF = 30.0
+
+    def __init__(
+        self,
+        survey_id: str,
+        source: CustomerSource,
+        dispatch: DispatchFunction,
+        rate: float = 50.0,
+        concurrency: int = 10,
+        total: Optional[int] = None,
+        retry_budget: Optional[RetryBudget] = None,
+    ):
+        self.id = str(uuid.uuid4())
+        self.survey_id = survey_id
+        self.target_rate = rate
+        self.concurrency = concurrency
+        self._retry_budget = retry_budget
+        self.status = "pending"
+        self.total = total
+        self.enumerated = 0
+        self.dispatched = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.skipped = 0
+        self.last_error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.finished_at: Optional[str] = None
+        self.finished_monotonic: Optional[float] = None
+
+        self._source = source
+        self._dispatch = dispatch
+        self._limiter = RateLimiter(rate)
+        self._backoff = 0.0
+        self._backoff_until = 0.0
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._cancelled = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> asyncio.Task:
+        self.status = "running"
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    def pause(self):
+        if self.status == "running":
+            self.status = "paused"
+            self._resumed.clear()
+
+    def resume(self):
+        if self.status == "paused":
+            self.status = "running"
+            self._resumed.set()
+
+    def cancel(self):
+        if self.status in ("pending", "running", "paused"):
+            self.status = "cancelled"
+            self._cancelled = True
+            self._resumed.set()
+
+    async def wait(self):
+        if self._task is not None:
+            await self._task
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "survey_id": self.survey_id,
+            "status": self.status,
+            "rate": self.target_rate,
+            "current_rate": round(self._limiter.rate, 3),
+            "concurrency": self.concurrency,
+            "total": self.total,
+            "enumerated": self.enumerated,
+            "dispatched": self.dispatched,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "skipped": self.skipped,
+            "in_progress": self.dispatched - self.succeeded - self.failed,
+            "backoff_seconds": self._backoff,
+            "last_error": self.last_error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    async def _run(self):
+        # The queue is bounded so that enumerating a huge customer list
+        # never runs more than a few items ahead of the workers
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue))
+                   for _ in range(self.concurrency)]
+        try:
+            async for customer_id, customer in self._source():
+                if self._cancelled:
+                    break
+                if customer is None:
+                    self.skipped += 1
+                    continue
+                self.enumerated += 1
+                await queue.put((customer_id, customer))
+            if self.total is None:
+                self.total = self.enumerated + self.skipped
+            await queue.join()
+            if not self._cancelled:
+                self.status = "completed"
+        except Exception as e:
+            self.status = "failed"
+            self.last_error = str(e)
+            logger.exception("Campaign %s failed: %s", self.id, e)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            self.finished_at = datetime.now().isoformat()
+            self.finished_monotonic = time.monotonic()
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            customer_id, customer = await queue.get()
+            try:
+                await self._dispatch_one(customer_id, customer)
+            finally:
+                queue.task_done()
+
+    async def _dispatch_one(self, customer_id: str, customer: Dict[str, Any]):
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            await self._resumed.wait()
+            if self._cancelled:
+                if attempt > 1:
+                    self.failed += 1
+                return
+            delay = self._backoff_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._limiter.acquire()
+
+            if attempt == 1:
+                self.dispatched += 1
+            try:
+                await run_in_threadpool(self._dispatch_in_retry_layer, customer_id, customer)
+            except ConnectionError as e:
+                self.last_error = str(e)
+                self._on_backend_error()
+                if attempt < self.MAX_ATTEMPTS and (
+                        self._retry_budget is None or self._retry_budget.try_spend()):
+                    self.retried += 1
+                    continue
+                self.failed += 1
+                return
+            except Exception as e:
+                self.failed += 1
+                self.last_error = str(e)
+                return
+            self.succeeded += 1
+            self._on_backend_success()
+            return
+
+    def _dispatch_in_retry_layer(self, customer_id: str, customer: Dict[str, Any]):
+        # The campaign retries the dispatch, so RPC retries inside it make one attempt
+        with retry_layer():
+            return self._dispatch(customer_id, customer)
+
+    def _on_backend_error(self):
+        self._backoff = min(self.MAX_BACKOFF, max(
+            self.BASE_BACKOFF, self._backoff * 2))
+        self._backoff_until = time.monotonic() + self._backoff
+        self._limiter.rate = max(self.MIN_RATE, self._limiter.rate / 2)
+
+    def _on_backend_success(self):
+        self._backoff = self._backoff / 2 if self._backoff > 0.01 else 0.0
+        self._limiter.rate = min(
+            self.target_rate, self._limiter.rate + self.target_rate * 0.05)
+
+
+class CampaignRegistry:
+    """
+    Keeps track of the campaigns started by this process. Finished
+    campaigns are kept for `ttl` seconds, so their results can be read.
+    """
+
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+        self.campaigns: Dict[str, Campaign] = {}
+
+    def start(self, campaign: Campaign) -> Campaign:
+        self.prune(time.monotonic())
+        self.campaigns[campaign.id] = campaign
+        campaign.start()
+        return campaign
+
+    def get(self, campaign_id: str) -> Optional[Campaign]:
+        self.prune(time.monotonic())
+        return self.campaigns.get(campaign_id)
+
+    def list(self) -> List[Campaign]:
+        self.prune(time.monotonic())
+        return list(self.campaigns.values())
+
+    def prune(self, now: float):
+        expired = [campaign_id for campaign_id, campaign in self.campaigns.items()
+                   if campaign.finished_monotonic is not None
+                   and campaign.finished_monotonic + self.ttl <= now]
+        for campaign_id in expired:
+            del self.campaigns[campaign_id]
@@ -1,8 +1,17 @@
+import bisect
+import itertools
+import logging
+import threading
 import time
 import random
 import uuid
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List, Tuple
+
+from app.latency import LatencyProfile, ProfileSpec, RPCSimulator, load_profile
+from app.search import InvertedIndex
+
+logger = logging.getLogger(__name__)
 
 mock_db = {
     "conversations": {},
@@ -32,17 +41,140 @@ mock_db = {
             ]
         }
     ],
-    "survey_responses": []
+    "survey_responses": [],
+    # Running counters per survey, maintained by save_survey_response
+    "survey_results": {},
+    # Positions in survey_responses for each survey, in save order
+    "survey_response_index": {},
+    # Full-text index of free-text answers per survey
+    "feedback_index": {}
 }
 
+# Serializes writes that must update several structures together
+_write_lock = threading.Lock()
+
+# Change events emitted by the store so that callers can invalidate caches.
+# A listener is called as listener(event, payload) after the write is applied.
+_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+
+def subscribe(listener: Callable[[str, Dict[str, Any]], None]) -> None:
+    """Register a listener for store change events."""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def unsubscribe(listener: Callable[[str, Dict[str, Any]], None]) -> None:
+    """Remove a previously registered listener."""
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def publish(event: str, **payload: Any) -> None:
+    """Notify every listener of a change event."""
+    for listener in list(_listeners):
+        try:
+            listener(event, payload)
+        except Exception as e:
+            logger.exception("Store listener failed for event %s: %s", event, e)
+
 # Simulate network latency and possible failures
 
 
-def simulate_rpc_call():
-    time.sleep(random.uniform(0.1, 0.5))  # Simulate network delay
-    # temporary disable random failures for testing
-    if random.random() < 0.1:  # 10% chance of failure
-        raise ConnectionError("RPC call failed")
+# The profile comes from RPC_LATENCY_PROFILE / RPC_LATENCY_SEED and can be
+# switched at runtime with set_latency_profile
+rpc_simulator = RPCSimulator.from_env()
+
+
+def set_latency_profile(spec: ProfileSpec, seed: Optional[int] = None) -> LatencyProfile:
+    """Switch the latency profile used by every simulated RPC call."""
+    profile = load_profile(spec)
+    rpc_simulator.configure(profile, seed)
+    return profile
+
+
+def simulate_rpc_call(method: Optional[str] = None):
+    rpc_simulator.call(method)
+
+
+def _survey_option_ids(survey_id: str) -> Dict[str, set]:
+    """Map each question of a survey to its option IDs (empty for open questions)."""
+    for survey in mock_db["surveys"]:
+        if survey["id"] == survey_id:
+            return {
+                question["id"]: {option["id"] for option in question["options"]}
+                for question in survey["questions"]
+            }
+    return {}
+
+
+def _index_feedback(response: Dict[str, Any], seq: int) -> None:
+    """Index the free-text answers of one response. Caller holds _write_lock."""
+    survey_id = response.get("survey_id")
+    if survey_id is None:
+        return
+    option_ids = _survey_option_ids(survey_id)
+    index = mock_db["feedback_index"].setdefault(survey_id, InvertedIndex())
+    for question_id, answer in response.get("answers", {}).items():
+        # Closed questions hold option IDs, not free text
+        if option_ids.get(question_id) or not isinstance(answer, str):
+            continue
+        index.add((seq, question_id), answer,
+                  seq=seq,
+                  question_id=question_id,
+                  conversation_id=response.get("conversation_id"),
+                  customer_id=response.get("customer_id"),
+                  completed_at=response.get("completed_at"))
+
+
+def _record_survey_result(response: Dict[str, Any]) -> None:
+    """Fold one response into the per-survey counters. Caller holds _write_lock."""
+    survey_id = response.get("survey_id")
+    if survey_id is None:
+        return
+
+    option_ids = _survey_option_ids(survey_id)
+    results = mock_db["survey_results"].setdefault(
+        survey_id, {"responses": 0, "questions": {}})
+    results["responses"] += 1
+    for question_id, answer in response.get("answers", {}).items():
+        counts = results["questions"].setdefault(
+            question_id, {"answered": 0, "options": {}})
+        counts["answered"] += 1
+        # Only closed questions are counted per option; free text is not
+        if option_ids.get(question_id):
+            key = answer if answer in option_ids[question_id] else "other"
+            counts["options"][key] = counts["options"].get(key, 0) + 1
+
+
+def _create_conversation(customer_id: str, survey_id: str) -> str:
+    conversation_id = str(uuid.uuid4())
+
+    # Get customer info and survey
+    customer = mock_db["customers"].get(customer_id)
+    survey = None
+    for s in mock_db["surveys"]:
+        if s["id"] == survey_id:
+            survey = s
+            break
+
+    if not customer or not survey:
+        raise ValueError("Customer or survey not found")
+
+    # Create initial conversation state
+    mock_db["conversations"][conversation_id] = {
+        "id": conversation_id,
+        "customer_id": customer_id,
+        "survey_id": survey_id,
+        "current_question_index": 0,
+        "answers": {},
+        "messages": [],
+        "status": "active",
+        "created_at": datetime.now().isoformat(),
+        "updated_at": datetime.now().isoformat()
+    }
+
+    return conversation_id
 
 
 class MockRPCDatabase:
@@ -53,78 +185,165 @@ class MockRPCDatabase:
     @staticmethod
     def get_conversation_state(conversation_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve the state of a conversation."""
-        simulate_rpc_call()
+        simulate_rpc_call("get_conversation_state")
         return mock_db["conversations"].get(conversation_id)
 
     @staticmethod
     def save_conversation_state(conversation_id: str, state: Dict[str, Any]) -> None:
         """Save or update the state of a conversation."""
-        simulate_rpc_call()
+        simulate_rpc_call("save_conversation_state")
         mock_db["conversations"][conversation_id] = state
+        publish("conversation_saved", conversation_id=conversation_id, state=state)
 
     @staticmethod
     def get_customer_info(customer_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve customer information."""
-        simulate_rpc_call()
+        simulate_rpc_call("get_customer_info")
         return mock_db["customers"].get(customer_id)
 
     @staticmethod
     def save_survey_response(response: Dict[str, Any]) -> None:
         """Save a survey response."""
-        simulate_rpc_call()
-        mock_db["survey_responses"].append(response)
+        simulate_rpc_call("save_survey_response")
+        with _write_lock:
+            mock_db["survey_responses"].append(response)
+            # seq is the 1-based position in survey_responses
+            seq = len(mock_db["survey_responses"])
+            mock_db["survey_response_index"].setdefault(
+                response.get("survey_id"), []).append(seq - 1)
+            _record_survey_result(response)
+            _index_feedback(response, seq)
+        publish("survey_response_saved", survey_id=response.get("survey_id"),
+                conversation_id=response.get("conversation_id"), seq=seq, response=response)
+
+    @staticmethod
+    def update_survey_responses(updates: List[Tuple[int, Dict[str, Any]]]) -> None:
+        """Merge fields into many saved responses, each identified by its seq."""
+        simulate_rpc_call("update_survey_responses")
+        with _write_lock:
+            for seq, fields in updates:
+                if 0 < seq <= len(mock_db["survey_responses"]):
+                    mock_db["survey_responses"][seq - 1].update(fields)
+
+    @staticmethod
+    def search_feedback(survey_id: str, query: str, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """Full-text search over the free-text answers to a survey, best matches first."""
+        simulate_rpc_call("search_feedback")
+        # Only copying the postings the query reads holds up writers; ranking doesn't
+        with _write_lock:
+            index = mock_db["feedback_index"].get(survey_id)
+            if index is None:
+                return {"total": 0, "results": []}
+            snapshot = index.snapshot(query)
+        return snapshot.search(offset, limit)
+
+    @staticmethod
+    def get_survey_responses_page(survey_id: str, after_seq: int = 0, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Get up to `limit` responses for a survey saved after `after_seq`, oldest first.
+        Each returned response carries its `seq`, a position that only ever increases.
+        """
+        simulate_rpc_call("get_survey_responses_page")
+        with _write_lock:
+            positions = mock_db["survey_response_index"].get(survey_id, [])
+            # seq is the 1-based position in survey_responses
+            start = bisect.bisect_left(positions, after_seq)
+            return [
+                dict(mock_db["survey_responses"][position], seq=position + 1)
+                for position in positions[start:start + limit]
+            ]
+
+    @staticmethod
+    def get_survey_results(survey_id: str) -> Dict[str, Any]:
+        """Get the aggregated answer counts for a survey."""
+        simulate_rpc_call("get_survey_results")
+        with _write_lock:
+            results = mock_db["survey_results"].get(survey_id)
+            if not results:
+                return {"responses": 0, "questions": {}}
+            return {
+                "responses": results["responses"],
+                "questions": {
+                    question_id: {
+                        "answered": counts["answered"],
+                        "options": dict(counts["options"])
+                    }
+                    for question_id, counts in results["questions"].items()
+                }
+            }
 
     @staticmethod
     def get_all_surveys() -> List[Dict[str, Any]]:
         """Get all available surveys."""
-        simulate_rpc_call()
+        simulate_rpc_call("get_all_surveys")
         return mock_db["surveys"]
 
     @staticmethod
     def get_survey_by_id(survey_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific survey by ID."""
-        simulate_rpc_call()
+        simulate_rpc_call("get_survey_by_id")
         for survey in mock_db["surveys"]:
             if survey["id"] == survey_id:
                 return survey
         return None
 
+    @staticmethod
+    def save_survey(survey: Dict[str, Any]) -> None:
+        """Create or replace a survey definition."""
+        simulate_rpc_call("save_survey")
+        for index, existing in enumerate(mock_db["surveys"]):
+            if existing["id"] == survey["id"]:
+                mock_db["surveys"][index] = survey
+                break
+        else:
+            mock_db["surveys"].append(survey)
+        publish("survey_saved", survey_id=survey["id"])
+
     @staticmethod
     def create_conversation(customer_id: str, survey_id: str) -> str:
         """Create a new conversation for a survey with a customer."""
-        simulate_rpc_call()
-        conversation_id = str(uuid.uuid4())
-
-        # Get customer info and survey
-        customer = mock_db["customers"].get(customer_id)
-        survey = None
-        for s in mock_db["surveys"]:
-            if s["id"] == survey_id:
-                survey = s
-                break
+        simulate_rpc_call("create_conversation")
+        return _create_conversation(customer_id, survey_id)
 
-        if not customer or not survey:
-            raise ValueError("Customer or survey not found")
-
-        # Create initial conversation state
-        mock_db["conversations"][conversation_id] = {
-            "id": conversation_id,
-            "customer_id": customer_id,
-            "survey_id": survey_id,
-            "current_question_index": 0,
-            "answers": {},
-            "messages": [],
-            "status": "active",
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
+    @staticmethod
+    def get_customers_info(customer_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Retrieve information for many customers in a single call."""
+        simulate_rpc_call("get_customers_info")
+        customers = mock_db["customers"]
+        return {
+            customer_id: customers[customer_id]
+            for customer_id in customer_ids
+            if customer_id in customers
         }
 
-        return conversation_id
+    @staticmethod
+    def list_customers(offset: int = 0, limit: int = 500) -> List[Dict[str, Any]]:
+        """List customers page by page, each with its ID included."""
+        simulate_rpc_call("list_customers")
+        page = itertools.islice(
+            mock_db["customers"].items(), offset, offset + limit)
+        return [dict(customer, id=customer_id) for customer_id, customer in page]
+
+    @staticmethod
+    def create_conversations(pairs: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        Create conversations for many (customer_id, survey_id) pairs in a single call.
+        Returns the new conversation IDs in order, with None for pairs that failed.
+        """
+        simulate_rpc_call("create_conversations")
+        conversation_ids = []
+        for customer_id, survey_id in pairs:
+            try:
+                conversation_ids.append(
+                    _create_conversation(customer_id, survey_id))
+            except ValueError:
+                conversation_ids.append(None)
+        return conversation_ids
 
     @staticmethod
     def get_conversation_messages(conversation_id: str) -> List[Dict[str, Any]]:
         """Get all messages for a conversation."""
-        simulate_rpc_call()
+        simulate_rpc_call("get_conversation_messages")
         conversation = mock_db["conversations"].get(conversation_id)
         if not conversation:
             return []
@@ -133,7 +352,7 @@ class MockRPCDatabase:
     @staticmethod
     def add_message_to_conversation(conversation_id: str, sender: str, message: str) -> bool:
         """Add a message to a conversation."""
-        simulate_rpc_call()
+        simulate_rpc_call("add_message_to_conversation")
         conversation = mock_db["conversations"].get(conversation_id)
         if not conversation:
             return False
@@ -153,12 +372,26 @@ class MockRPCDatabase:
 
         # Update the conversation in the database
         mock_db["conversations"][conversation_id] = conversation
+        publish("message_added", conversation_id=conversation_id,
+                survey_id=conversation.get("survey_id"), message=message_obj)
         return True
 
+    @staticmethod
+    def get_conversation_progress(survey_id: str) -> Dict[str, List[Any]]:
+        """Get the progress of every conversation for a survey as parallel columns."""
+        simulate_rpc_call("get_conversation_progress")
+        progress = {"current_question_index": [], "status": []}
+        for conversation in list(mock_db["conversations"].values()):
+            if conversation.get("survey_id") == survey_id:
+                progress["current_question_index"].append(
+                    conversation.get("current_question_index", 0))
+                progress["status"].append(conversation.get("status"))
+        return progress
+
     @staticmethod
     def get_customer_active_surveys(customer_id: str) -> List[Dict[str, Any]]:
         """Retrieve all active surveys for a specific customer."""
-        simulate_rpc_call()
+        simulate_rpc_call("get_customer_active_surveys")
 
         active_surveys = []
         for conversation_id, conversation in mock_db["conversations"].items():
@@ -170,7 +403,7 @@ class MockRPCDatabase:
     @staticmethod
     def resume_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
         """Resume a previously started conversation."""
-        simulate_rpc_call()
+        simulate_rpc_call("resume_conversation")
 
         conversation = mock_db["conversations"].get(conversation_id)
         if not conversation:
@@ -186,5 +419,6 @@ class MockRPCDatabase:
 
         # Save the updated conversation
         mock_db["conversations"][conversation_id] = conversation
+        publish("conversation_saved", conversation_id=conversation_id, state=conversation)
 
         return conversation
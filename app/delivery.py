@@ -0,0 +1,92 @@
+import json
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+
+class Outbox:
+    """
+    Sequence numbers and redelivery buffer for the frames sent on one connection.
+
+    stamp() gives each frame the next sequence number and keeps it until the
+    client acknowledges it. Acks are cumulative: acking n acknowledges every
+    frame up to n. At most `max_pending` frames are kept; older ones are
+    dropped and counted in `dropped`. Numbering continues after `start`, so
+    a client that reconnects keeps seeing increasing sequence numbers.
+    """
+
+    def __init__(self, max_pending: int = 64, start: int = 0):
+        self.max_pending = max_pending
+        self.last_seq = start
+        self.acked_seq = start
+        self.dropped = 0
+        self._pending: "OrderedDict[int, str]" = OrderedDict()
+
+    def stamp(self, body: str) -> str:
+        """Add the next sequence number to a JSON object frame and keep it for redelivery."""
+        self.last_seq += 1
+        stamped = body[:-1] + f',"seq":{self.last_seq}}}'
+        self._pending[self.last_seq] = stamped
+        if len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+        return stamped
+
+    def ack(self, seq: int):
+        seq = min(seq, self.last_seq)
+        if seq <= self.acked_seq:
+            return
+        self.acked_seq = seq
+        while self._pending and next(iter(self._pending)) <= seq:
+            self._pending.popitem(last=False)
+
+    @property
+    def all_acked(self) -> bool:
+        return self.acked_seq >= self.last_seq
+
+    def unacked(self) -> List[str]:
+        return list(self._pending.values())
+
+
+def parse_ack(data: str) -> Optional[int]:
+    """The sequence number of an {"type": "ack", "seq": n} frame, or None for other frames."""
+    if '"ack"' not in data:
+        return None
+    try:
+        message = json.loads(data)
+        if message.get("type") == "ack":
+            return int(message["seq"])
+    except (ValueError, AttributeError, KeyError, TypeError):
+        pass
+    return None
+
+
+class ParkedOutboxes:
+    """
+    Outboxes of connections that closed with unacknowledged frames, kept
+    for `ttl` seconds so a reconnecting client can have them redelivered.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Outbox]]" = OrderedDict()
+
+    def park(self, conversation_id: str, outbox: Outbox, now: float):
+        self._entries.pop(conversation_id, None)
+        self._entries[conversation_id] = (now + self.ttl, outbox)
+        self.prune(now)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def take(self, conversation_id: str, now: float) -> Optional[Outbox]:
+        entry = self._entries.pop(conversation_id, None)
+        if entry is None or entry[0] <= now:
+            return None
+        return entry[1]
+
+    def prune(self, now: float):
+        while self._entries and next(iter(self._entries.values()))[0] <= now:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,250 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.search import STOPWORDS, tokenize
+
+logger = logging.getLogger(__name__)
+
+POSITIVE = {
+    "amazing": 3.0, "awesome": 3.0, "best": 3.0, "delicious": 3.0, "excellent": 3.0,
+    "fantastic": 3.0, "love": 3.0, "perfect": 3.0, "wonderful": 3.0, "great": 2.5,
+    "favorite": 2.5, "favourite": 2.5, "tasty": 2.5, "yummy": 2.5, "enjoy": 2.0,
+    "good": 2.0, "like": 1.5, "nice": 2.0, "refreshing": 2.0, "rich": 1.5,
+    "creamy": 1.5, "smooth": 1.5, "sweet": 1.0, "classic": 1.0, "happy": 2.0,
+    "fresh": 1.5,
+}
+NEGATIVE = {
+    "awful": -3.0, "disgusting": -3.0, "hate": -3.0, "horrible": -3.0, "terrible": -3.0,
+    "worst": -3.0, "bad": -2.5, "gross": -2.5, "bland": -2.0, "boring": -2.0,
+    "dislike": -2.0, "meh": -1.5, "bitter": -1.5, "artificial": -1.5, "icy": -1.0,
+    "sour": -1.0, "expensive": -1.0, "melted": -1.0, "sickly": -2.0,
+}
+LEXICON = {**POSITIVE, **NEGATIVE}
+NEGATIONS = frozenset(["not", "no", "never", "isn", "wasn",
+                      "don", "doesn", "didn", "hardly", "nothing"])
+INTENSIFIERS = {"very": 1.3, "really": 1.3,
+                "so": 1.2, "extremely": 1.5, "super": 1.3}
+NEGATION_SCOPE = 3
+NORMALIZATION_ALPHA = 15.0
+KEYWORD_STOPWORDS = STOPWORDS | NEGATIONS | set(INTENSIFIERS) | {
+    "t", "s", "just", "very", "really", "because", "flavor", "flavour", "ice", "cream"}
+
+
+def _token_polarities(tokens: List[str]) -> List[float]:
+    polarities = []
+    negated_until = -1
+    boost = 1.0
+    for position, token in enumerate(tokens):
+        if token in NEGATIONS:
+            negated_until = position + NEGATION_SCOPE
+            continue
+        if token in INTENSIFIERS:
+            boost = INTENSIFIERS[token]
+            continue
+        value = LEXICON.get(token)
+        if value is not None:
+            if position <= negated_until:
+                value = -0.75 * value
+            polarities.append(value * boost)
+        boost = 1.0
+    return polarities
+
+
+def score_batch(texts: List[str]) -> List[Dict[str, Any]]:
+    """
+    Score a batch of texts with the sentiment lexicon and extract keywords.
+
+    This is a pure function of its input so it can run in a worker process.
+    Token polarities of the whole batch are summed with one vectorized
+    np.add.reduceat pass and normalized to [-1, 1].
+    """
+    token_lists = [tokenize(text) for text in texts]
+    polarities = [_token_polarities(tokens) for tokens in token_lists]
+
+    lengths = np.array([len(p) for p in polarities], dtype=np.int64)
+    flat = np.fromiter((value for p in polarities for value in p),
+                       dtype=np.float64, count=int(lengths.sum()))
+    sums = np.zeros(len(texts), dtype=np.float64)
+    nonempty = lengths > 0
+    if flat.size:
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        sums[nonempty] = np.add.reduceat(flat, starts[nonempty])
+    scores = sums / np.sqrt(sums * sums + NORMALIZATION_ALPHA)
+
+    results = []
+    for tokens, score in zip(token_lists, scores):
+        keywords = Counter(
+            token for token in tokens
+            if token not in KEYWORD_STOPWORDS and len(token) > 2 and not token.isdigit()
+        )
+        label = "positive" if score >= 0.05 else "negative" if score <= -0.05 else "neutral"
+        results.append({
+            "sentiment": {"score": round(float(score), 4), "label": label},
+            "keywords": [token for token, _ in keywords.most_common(5)],
+        })
+    return results
+
+
+# Writes enrichment results back: receives [(seq, fields), ...]
+ResultWriter = Callable[[List[Tuple[int, Dict[str, Any]]]], Any]
+
+
+class EnrichmentPipeline:
+    """
+    Enriches completed survey responses off the turn path.
+
+    submit() only appends to a bounded in-memory queue and never blocks; when
+    the queue is full the item is dropped and counted. Batcher threads drain
+    the queue into micro-batches (up to `batch_size` items or `max_wait`
+    seconds), score them on a process pool and write the results back with
+    one call per batch. `on_batch` is called with each batch's latency in
+    seconds, whether the batch succeeded or failed.
+    """
+
+    def __init__(
+        self,
+        writer: ResultWriter,
+        batch_size: int = 64,
+        max_wait: float = 0.25,
+        max_queue: int = 10000,
+        batchers: int = 2,
+        executor_factory: Callable[[], Executor] = lambda: ProcessPoolExecutor(
+            max_workers=2),
+        on_batch: Optional[Callable[[float], None]] = None,
+    ):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.batchers = batchers
+        self._executor_factory = executor_factory
+        self._on_batch = on_batch
+        self._executor: Optional[Executor] = None
+        self._queue: "queue.Queue[Tuple[int, str]]" = queue.Queue(
+            maxsize=max_queue)
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        self.submitted = 0
+        self.dropped = 0
+        self.enriched = 0
+        self.failed_batches = 0
+        self.batches = 0
+        self._latencies: deque = deque(maxlen=256)
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            self._executor = self._executor_factory()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"enrichment-{i}", daemon=True)
+                for i in range(self.batchers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def stop(self, timeout: float = 5.0):
+        with self._start_lock:
+            self._stopping.set()
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def submit(self, seq: int, text: str) -> bool:
+        """Queue a response for enrichment without blocking. Returns False if it was dropped."""
+        # The app starts the pipeline at startup; this covers use outside it
+        if not self.running:
+            self.start()
+        try:
+            self._queue.put_nowait((seq, text))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))], 4)
+
+        return {
+            "queue_depth": self.queue_depth,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "enriched": self.enriched,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "batch_latency_seconds": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": latencies[-1] if latencies else None,
+            },
+        }
+
+    def _next_batch(self) -> List[Tuple[int, str]]:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._process(batch)
+
+    def _process(self, batch: List[Tuple[int, str]]):
+        started = time.monotonic()
+        try:
+            results = self._executor.submit(
+                score_batch, [text for _, text in batch]).result()
+            enriched_at = datetime.now().isoformat()
+            self.writer([
+                (seq, dict(result, enriched_at=enriched_at))
+                for (seq, _), result in zip(batch, results)
+            ])
+            self.enriched += len(batch)
+        except Exception as e:
+            self.failed_batches += 1
+            logger.exception("Enrichment batch of %d failed: %s", len(batch), e)
+        finally:
+            latency = time.monotonic() - started
+            self.batches += 1
+            self._latencies.append(latency)
+            if self._on_batch is not None:
+                self._on_batch(latency)
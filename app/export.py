@@ -0,0 +1,126 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+# Fetches the page of responses saved after the given seq
+PageFetcher = Callable[[int], Awaitable[List[Dict[str, Any]]]]
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+BASE_COLUMNS = ["cursor", "conversation_id",
+                "customer_id", "survey_id", "completed_at"]
+
+
+def encode_cursor(seq: int) -> str:
+    """Encode a response position as an opaque, URL-safe cursor."""
+    return base64.urlsafe_b64encode(f"v1:{seq}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Decode a cursor produced by encode_cursor, raising ValueError if it is malformed."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        version, seq = base64.urlsafe_b64decode(
+            padded.encode()).decode().split(":", 1)
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if version != "v1" or not seq.isdigit():
+        raise ValueError("Malformed cursor")
+    return int(seq)
+
+
+def completed_since(response: Dict[str, Any], since: datetime) -> bool:
+    """Whether a response was completed at or after `since`."""
+    completed_at = response.get("completed_at")
+    if not completed_at:
+        return False
+    # Compare as epoch seconds, as the analytics columns do, so naive and aware
+    # timestamps can be mixed
+    return datetime.fromisoformat(completed_at).timestamp() >= since.timestamp()
+
+
+async def iter_responses(fetch_page: PageFetcher, after_seq: int, since: Optional[datetime]) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield pages of responses after a cursor position, optionally completed at or after `since`."""
+    while True:
+        page = await fetch_page(after_seq)
+        if not page:
+            return
+        after_seq = page[-1]["seq"]
+        if since is not None:
+            page = [response for response in page
+                    if completed_since(response, since)]
+        if page:
+            yield page
+
+
+def ndjson_rows(page: Iterable[Dict[str, Any]]) -> bytes:
+    lines = []
+    for response in page:
+        row = {key: value for key, value in response.items() if key != "seq"}
+        row["cursor"] = encode_cursor(response["seq"])
+        lines.append(json.dumps(row, ensure_ascii=False,
+                     separators=(",", ":")))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class CsvRows:
+    """Encodes pages of responses as CSV, with one column per answer."""
+
+    def __init__(self, answer_columns: List[str]):
+        self.answer_columns = answer_columns
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def header(self) -> bytes:
+        self._writer.writerow(BASE_COLUMNS + self.answer_columns)
+        return self._drain()
+
+    def rows(self, page: Iterable[Dict[str, Any]]) -> bytes:
+        for response in page:
+            answers = response.get("answers", {})
+            self._writer.writerow(
+                [encode_cursor(response["seq"])]
+                + [response.get(column, "") for column in BASE_COLUMNS[1:]]
+                + [answers.get(column, "") for column in self.answer_columns]
+            )
+        return self._drain()
+
+
+async def stream_export(
+    fetch_page: PageFetcher,
+    export_format: str,
+    after_seq: int = 0,
+    since: Optional[datetime] = None,
+    answer_columns: Optional[List[str]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Stream responses as NDJSON or CSV, one chunk per page, so memory use stays
+    constant however many responses are exported. If the store becomes
+    unavailable mid-stream, NDJSON ends with an error line. CSV has no room
+    for one, so the error is raised and the response is aborted before its
+    end. Either way clients resume from the last cursor they received.
+    """
+    csv_rows = None
+    if export_format == "csv":
+        csv_rows = CsvRows(answer_columns or [])
+    if csv_rows:
+        yield csv_rows.header()
+    try:
+        async for page in iter_responses(fetch_page, after_seq, since):
+            yield csv_rows.rows(page) if csv_rows else ndjson_rows(page)
+    except ConnectionError:
+        if csv_rows:
+            raise
+        yield b'{"error":"Database service is currently unavailable. Resume from the last cursor."}\n'
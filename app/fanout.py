@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+# One event for observers: conversation ID, survey ID, coalescing key and encoded JSON body
+Event = Tuple[str, Optional[str], Optional[Hashable], str]
+
+
+class Observer:
+    """
+    A read-only subscriber to conversations and surveys.
+
+    Events wait in a bounded queue and are sent by the observer's own task
+    as `batch` frames, at most one every `interval` seconds. An event with a
+    coalescing key replaces a waiting event with the same key. Past
+    `max_pending` the oldest waiting events are dropped, and the next frame
+    says how many.
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[None]], interval: float = 0.05,
+                 max_pending: int = 5000, max_batch: int = 500):
+        self.send = send
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.conversations: Set[str] = set()
+        self.surveys: Set[str] = set()
+        self.dropped = 0
+        self._pending: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+
+    def push(self, key: Optional[Hashable], body: str) -> int:
+        """Queue an event; returns how many events were dropped to make room."""
+        if key is None:
+            key = next(self._seq)
+        else:
+            self._pending.pop(key, None)
+        self._pending[key] = body
+        self._wake.set()
+        if len(self._pending) <= self.max_pending:
+            return 0
+        self._pending.popitem(last=False)
+        self.dropped += 1
+        return 1
+
+    def take_batch(self) -> Optional[str]:
+        """Encode up to `max_batch` waiting events as one frame, or None if none are waiting."""
+        if not self._pending:
+            return None
+        events = [self._pending.popitem(last=False)[1]
+                  for _ in range(min(self.max_batch, len(self._pending)))]
+        body = '{"type":"batch","events":[' + ",".join(events) + "]"
+        if self.dropped:
+            body += ',"dropped":%d' % self.dropped
+            self.dropped = 0
+        return body + "}"
+
+    async def run(self):
+        """Send batches until cancelled or the send fails."""
+        while True:
+            await self._wake.wait()
+            # Let events arriving close together share a frame
+            await asyncio.sleep(self.interval)
+            self._wake.clear()
+            body = self.take_batch()
+            if self._pending:
+                self._wake.set()
+            if body is not None:
+                await self.send(body)
+
+
+class FanOut:
+    """
+    Routes events to the observers of their conversation or survey.
+
+    publish() may be called from any thread: store listeners run in the
+    writer's thread. Each event is encoded once by the caller and the same
+    string is shared by every observer's batch. Events are handed to the
+    event loop the observers were attached on, in one callback per burst.
+    """
+
+    def __init__(self):
+        self.by_conversation: Dict[str, Set[Observer]] = {}
+        self.by_survey: Dict[str, Set[Observer]] = {}
+        self.observers: Set[Observer] = set()
+        self.dropped = 0
+        self._events: List[Event] = []
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, observer: Observer):
+        self._loop = asyncio.get_running_loop()
+        self.observers.add(observer)
+
+    def detach(self, observer: Observer):
+        self.observers.discard(observer)
+        for conversation_id in list(observer.conversations):
+            self.unwatch(observer, conversation_id=conversation_id)
+        for survey_id in list(observer.surveys):
+            self.unwatch(observer, survey_id=survey_id)
+
+    def watch(self, observer: Observer, conversation_id: Optional[str] = None, survey_id: Optional[str] = None):
+        if conversation_id is not None:
+            observer.conversations.add(conversation_id)
+            self.by_conversation.setdefault(conversation_id, set()).add(observer)
+        if survey_id is not None:
+            observer.surveys.add(survey_id)
+            self.by_survey.setdefault(survey_id, set()).add(observer)
+
+    def unwatch(self, observer: Observer, conversation_id: Optional[str] = None, survey_id: Optional[str] = None):
+        for index, key, keys in ((self.by_conversation, conversation_id, observer.conversations),
+                                 (self.by_survey, survey_id, observer.surveys)):
+            if key is None:
+                continue
+            keys.discard(key)
+            watchers = index.get(key)
+            if watchers is not None:
+                watchers.discard(observer)
+                if not watchers:
+                    del index[key]
+
+    def publish(self, conversation_id: str, survey_id: Optional[str], key: Optional[Hashable], body: str):
+        if not self.observers or self._loop is None:
+            return
+        with self._lock:
+            self._events.append((conversation_id, survey_id, key, body))
+            if len(self._events) > 1:
+                return  # A delivery is already scheduled
+        try:
+            self._loop.call_soon_threadsafe(self.deliver)
+        except RuntimeError:
+            with self._lock:
+                self._events.clear()  # The observers' loop is closed
+
+    def deliver(self):
+        """Hand the published events to their observers; runs on the observers' loop."""
+        with self._lock:
+            events, self._events = self._events, []
+        for conversation_id, survey_id, key, body in events:
+            targets: Any = self.by_conversation.get(conversation_id, ())
+            if survey_id in self.by_survey:
+                targets = set(targets) | self.by_survey[survey_id]
+            for observer in targets:
+                self.dropped += observer.push(key, body)
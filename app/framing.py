@@ -0,0 +1,62 @@
+import json
+import zlib
+from typing import Dict, List, Union
+
+try:
+    import msgpack
+except ImportError:  # Binary framing is only offered where msgpack is installed
+    msgpack = None
+
+Frame = Union[str, bytes]
+
+
+class Framing:
+    """How frames are put on the wire: JSON text, as produced by the frame encoders."""
+
+    name = "json"
+    subprotocol = "survey.json"
+
+    def encode(self, body: str) -> Frame:
+        return body
+
+
+class ZlibFraming(Framing):
+    """JSON text, sent as a zlib-compressed binary message once it is over `threshold` bytes."""
+
+    name = "zlib"
+    subprotocol = "survey.zlib"
+
+    def __init__(self, threshold: int = 1024, level: int = 6):
+        self.threshold = threshold
+        self.level = level
+
+    def encode(self, body: str) -> Frame:
+        if len(body) < self.threshold:
+            return body
+        return zlib.compress(body.encode(), self.level)
+
+
+class MsgpackFraming(Framing):
+    """Every frame as a MessagePack binary message."""
+
+    name = "msgpack"
+    subprotocol = "survey.msgpack"
+
+    def encode(self, body: str) -> Frame:
+        return msgpack.packb(json.loads(body))
+
+
+JSON_FRAMING = Framing()
+
+FRAMINGS: Dict[str, Framing] = {framing.subprotocol: framing for framing in (JSON_FRAMING, ZlibFraming())}
+if msgpack is not None:
+    FRAMINGS["survey.msgpack"] = MsgpackFraming()
+
+
+def negotiate(offered: List[str]) -> Framing:
+    """The first framing the client offered that this server supports; JSON if none."""
+    for subprotocol in offered:
+        if subprotocol in FRAMINGS:
+            return FRAMINGS[subprotocol]
+    return JSON_FRAMING
+
@@ -0,0 +1,222 @@
+import contextvars
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Hashable, Iterator, List, Optional, Pattern, Tuple
+
+NEW = "new"
+PENDING = "pending"
+DONE = "done"
+MISMATCH = "mismatch"
+
+
+class IdempotencyStore:
+    """
+    Bounded store of results keyed by client-supplied idempotency keys.
+
+    reserve() claims a key before the work runs; complete() stores the result
+    for replays and release() forgets a reservation whose work failed, so
+    the client can try again. Entries expire after `ttl` seconds and the
+    least recently used are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> [expires at, fingerprint, done, result]
+        self._entries: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.replays = 0
+
+    def reserve(self, key: Hashable, fingerprint: str) -> Tuple[str, Any]:
+        """
+        Claim `key` for a request with the given fingerprint. Returns
+        (NEW, None) if the caller should do the work, (DONE, result) for a
+        replay, (PENDING, None) while the first request is still running and
+        (MISMATCH, None) if the key was used for a different request.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._entries[key] = [now + self.ttl, fingerprint, False, None]
+                self._evict(now)
+                return NEW, None
+            self._entries.move_to_end(key)
+            if entry[1] != fingerprint:
+                return MISMATCH, None
+            if not entry[2]:
+                return PENDING, None
+            self.replays += 1
+            return DONE, entry[3]
+
+    def complete(self, key: Hashable, result: Any):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[2] = True
+                entry[3] = result
+
+    def release(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not entry[2]:
+                del self._entries[key]
+
+    def _evict(self, now: float):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest[0] > now:
+                break
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.replays = 0
+
+
+def fingerprint(*parts: Any) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+_recording: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar(
+    "recording", default=None)
+
+
+@contextmanager
+def recording() -> Iterator[List[str]]:
+    """Collect the frames recorded with record() in this block, for replays."""
+    frames: List[str] = []
+    token = _recording.set(frames)
+    try:
+        yield frames
+    finally:
+        _recording.reset(token)
+
+
+def record(frame: str):
+    frames = _recording.get()
+    if frames is not None:
+        frames.append(frame)
+
+
+async def _send_json(send, status: int, detail: str, headers: List[Tuple[bytes, bytes]] = ()):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+# Statuses that ask the client to try again, so a retry with the same key must run again
+TRANSIENT_STATUSES = frozenset({408, 409, 425, 429})
+
+
+def is_transient(status: int) -> bool:
+    return status >= 500 or status in TRANSIENT_STATUSES
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware honouring the Idempotency-Key header on POSTs to `paths`.
+
+    The first request with a key runs normally and its response is stored
+    once sent, unless it is a 5xx or says to try again later (408, 409, 425,
+    429). Repeats with the same key and body get the
+    stored response, marked with Idempotent-Replayed, without running the
+    endpoint. A repeat that arrives while the first is still running gets
+    409, and reusing a key for a different request gets 422.
+    """
+
+    def __init__(self, app: Any, store: IdempotencyStore, paths: Pattern):
+        self.app = app
+        self.store = store
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not self.paths.fullmatch(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        key = next((value.decode("latin-1") for name, value in scope["headers"]
+                    if name == b"idempotency-key"), None)
+        if not key:
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        state, stored = self.store.reserve(
+            key, fingerprint(scope["method"], scope["path"], scope["query_string"], body))
+        if state == DONE:
+            status, headers, stored_body = stored
+            await send({"type": "http.response.start", "status": status,
+                        "headers": headers + [(b"idempotent-replayed", b"true")]})
+            await send({"type": "http.response.body", "body": stored_body})
+            return
+        if state == PENDING:
+            await _send_json(send, 409, "A request with this Idempotency-Key is still being processed.",
+                             [(b"retry-after", b"1")])
+            return
+        if state == MISMATCH:
+            await _send_json(send, 422, "This Idempotency-Key was already used for a different request.")
+            return
+
+        replayed = False
+
+        async def replay_body():
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        response: dict = {"status": 500, "headers": [], "body": []}
+        stored_result = False
+
+        async def send_and_store(message):
+            nonlocal stored_result
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+                # Store as soon as the response is complete, not after the
+                # endpoint's background tasks have also run
+                if not message.get("more_body", False) and not is_transient(response["status"]):
+                    self.store.complete(key, (response["status"], response["headers"],
+                                              b"".join(response["body"])))
+                    stored_result = True
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, send_and_store)
+        finally:
+            if not stored_result:
+                self.store.release(key)
@@ -0,0 +1,167 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Union
+
+# Built-in profiles. A profile spec is a dict of LatencyProfile arguments;
+# "base" names another profile to start from.
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # No delay and no failures: for fast, deterministic tests
+    "zero": {"distribution": "fixed", "delay": 0.0, "failure_rate": 0.0},
+    # The original simulation: 100-500ms uniform delay, 10% failures
+    "default": {"distribution": "uniform", "low": 0.1, "high": 0.5, "failure_rate": 0.1},
+    # Mostly fast calls with a heavy tail, as seen from a real backend
+    "lognormal": {"distribution": "lognormal", "median": 0.12, "sigma": 0.9,
+                  "max_delay": 5.0, "failure_rate": 0.02},
+    # The lognormal profile with a 5 second degradation every 30 seconds
+    "brownout": {"base": "lognormal", "brownout": {
+        "period": 30.0, "duration": 5.0, "latency_factor": 8.0, "failure_rate": 0.4}},
+}
+
+ProfileSpec = Union[str, Dict[str, Any]]
+
+
+class LatencyProfile:
+    """
+    Delay distribution and failure rate of simulated RPC calls.
+
+    `distribution` is "fixed", "uniform" or "lognormal" (median and sigma of
+    the underlying normal, capped at max_delay). A brownout periodically
+    multiplies delays and raises the failure rate. `methods` overrides any
+    of these settings for individual RPC methods.
+    """
+
+    def __init__(
+        self,
+        name: str = "custom",
+        distribution: str = "uniform",
+        delay: float = 0.0,
+        low: float = 0.1,
+        high: float = 0.5,
+        median: float = 0.1,
+        sigma: float = 0.5,
+        max_delay: float = 10.0,
+        failure_rate: float = 0.0,
+        brownout: Optional[Dict[str, float]] = None,
+        methods: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
+        if distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        if not 0 <= failure_rate <= 1:
+            raise ValueError("failure_rate must be between 0 and 1")
+        self.name = name
+        self.distribution = distribution
+        self.delay = delay
+        self.low = low
+        self.high = high
+        self.median = median
+        self.sigma = sigma
+        self.max_delay = max_delay
+        self.failure_rate = failure_rate
+        self.brownout = brownout
+        self._settings = {
+            "distribution": distribution, "delay": delay, "low": low, "high": high,
+            "median": median, "sigma": sigma, "max_delay": max_delay,
+            "failure_rate": failure_rate, "brownout": brownout,
+        }
+        self.methods = {
+            method: LatencyProfile(**dict(self._settings, name=f"{name}:{method}", **overrides))
+            for method, overrides in (methods or {}).items()
+        }
+
+    def for_method(self, method: Optional[str]) -> "LatencyProfile":
+        return self.methods.get(method, self) if method else self
+
+    def in_brownout(self, elapsed: float) -> bool:
+        return bool(self.brownout) and elapsed % self.brownout["period"] < self.brownout["duration"]
+
+    def sample_delay(self, rng: Any, elapsed: float = 0.0) -> float:
+        if self.distribution == "fixed":
+            delay = self.delay
+        elif self.distribution == "uniform":
+            delay = rng.uniform(self.low, self.high)
+        else:
+            delay = min(self.max_delay, rng.lognormvariate(
+                math.log(self.median), self.sigma))
+        if self.in_brownout(elapsed):
+            delay *= self.brownout.get("latency_factor", 1.0)
+        return delay
+
+    def current_failure_rate(self, elapsed: float = 0.0) -> float:
+        if self.in_brownout(elapsed):
+            return max(self.failure_rate, self.brownout.get("failure_rate", 0.0))
+        return self.failure_rate
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(self._settings, name=self.name,
+                    methods={method: profile._settings for method, profile in self.methods.items()})
+
+
+def load_profile(spec: ProfileSpec) -> LatencyProfile:
+    """
+    Build a profile from a built-in name, a JSON object (inline or in a file)
+    or a dict, e.g. {"base": "lognormal", "methods": {"save_survey_response":
+    {"median": 0.4}}}.
+    """
+    if isinstance(spec, str):
+        if spec in PROFILES:
+            return load_profile(dict(PROFILES[spec], name=spec))
+        text = spec.strip()
+        if not text.startswith("{"):
+            if not os.path.isfile(text):
+                raise ValueError(f"Unknown latency profile: {spec}")
+            with open(text) as f:
+                text = f.read()
+        return load_profile(json.loads(text))
+
+    settings = dict(spec)
+    base = settings.pop("base", None)
+    if base is not None:
+        if base not in PROFILES:
+            raise ValueError(f"Unknown base latency profile: {base}")
+        settings = dict(PROFILES[base], **settings)
+        settings.pop("base", None)
+        settings.setdefault("name", base)
+    return LatencyProfile(**settings)
+
+
+class RPCSimulator:
+    """
+    Applies a latency profile to simulated RPC calls.
+
+    With a seed, delays and failures come from a private random.Random so
+    that runs can be repeated; without one the global random module is used.
+    """
+
+    def __init__(self, profile: LatencyProfile, seed: Optional[int] = None):
+        self._lock = threading.Lock()
+        self.configure(profile, seed)
+
+    def configure(self, profile: LatencyProfile, seed: Optional[int] = None):
+        with self._lock:
+            self.profile = profile
+            self.seed = seed
+            self._rng = random.Random(seed) if seed is not None else random
+            self._epoch = time.monotonic()
+
+    @classmethod
+    def from_env(cls) -> "RPCSimulator":
+        """Configure from RPC_LATENCY_PROFILE and RPC_LATENCY_SEED."""
+        seed = os.environ.get("RPC_LATENCY_SEED")
+        return cls(load_profile(os.environ.get("RPC_LATENCY_PROFILE", "default")),
+                   int(seed) if seed else None)
+
+    def call(self, method: Optional[str] = None):
+        profile = self.profile.for_method(method)
+        elapsed = time.monotonic() - self._epoch
+        # Draw both values under the lock so a seeded sequence is not interleaved
+        with self._lock:
+            delay = profile.sample_delay(self._rng, elapsed)
+            failed = self._rng.random() < profile.current_failure_rate(elapsed)
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise ConnectionError("RPC call failed")
@@ -0,0 +1,321 @@
+"""
+Load generator for the survey API.
+
+Drives complete survey journeys against a running server at a fixed arrival
+rate with bounded concurrency, and writes a JSON report with throughput,
+per-step latency percentiles and error rates:
+
+    poetry install --extras loadtest
+    python -m app.loadtest --base-url http://localhost:8000 --rate 20 \\
+        --concurrency 50 --duration 60 --journey mixed --output report.json
+
+A WebSocket journey creates a conversation, opens /ws/{id}, answers q1 and q2
+and sends detailed feedback. A REST journey does the same through
+POST /conversations/{id}/messages, polling the message list for each bot reply.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+JOURNEYS = ("ws", "rest", "mixed")
+
+FEEDBACK = [
+    "I love how rich and creamy the chocolate is",
+    "Vanilla is a classic, simple and not too sweet",
+    "Strawberry tastes fresh, it reminds me of summer",
+    "Honestly it was a bit icy last time but still my favorite",
+]
+
+
+class StepError(Exception):
+    """A journey step got an unexpected response."""
+
+
+class Recorder:
+    """Collects per-step latencies and errors for the report."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.error_messages: Counter = Counter()
+        self.journeys_started = 0
+        self.journeys_completed = 0
+        self.journeys_failed = 0
+        self.journeys_rejected = 0
+
+    @asynccontextmanager
+    async def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            self.error_messages[f"{name}: {type(e).__name__}: {e}"[:200]] += 1
+            raise
+        finally:
+            self.latencies.setdefault(name, []).append(
+                time.perf_counter() - started)
+
+    def report(self, elapsed: float, config: Dict[str, Any]) -> Dict[str, Any]:
+        steps = {}
+        for name, samples in self.latencies.items():
+            values = np.asarray(samples) * 1000
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            errors = self.errors.get(name, 0)
+            steps[name] = {
+                "count": len(samples),
+                "errors": errors,
+                "error_rate": round(errors / len(samples), 4),
+                "latency_ms": {
+                    "mean": round(float(values.mean()), 2),
+                    "p50": round(float(p50), 2),
+                    "p95": round(float(p95), 2),
+                    "p99": round(float(p99), 2),
+                    "max": round(float(values.max()), 2),
+                },
+            }
+        finished = self.journeys_completed + self.journeys_failed
+        return {
+            "config": config,
+            "elapsed_seconds": round(elapsed, 3),
+            "journeys": {
+                "started": self.journeys_started,
+                "completed": self.journeys_completed,
+                "failed": self.journeys_failed,
+                "rejected": self.journeys_rejected,
+                "error_rate": round(self.journeys_failed / finished, 4) if finished else 0.0,
+                "throughput_per_second": round(self.journeys_completed / elapsed, 3) if elapsed else 0.0,
+            },
+            "steps": steps,
+            "top_errors": dict(self.error_messages.most_common(10)),
+        }
+
+
+def expect_status(response: httpx.Response, expected: int):
+    if response.status_code != expected:
+        raise StepError(
+            f"HTTP {response.status_code}: {response.text[:100]}")
+
+
+async def create_conversation(client: httpx.AsyncClient, recorder: Recorder,
+                              customer_id: str, survey_id: str) -> str:
+    async with recorder.step("create_conversation"):
+        response = await client.post("/conversations", json={
+            "customer_id": customer_id, "survey_id": survey_id})
+        expect_status(response, 201)
+        return response.json()["conversation_id"]
+
+
+async def rest_journey(client: httpx.AsyncClient, recorder: Recorder, customer_id: str,
+                       survey_id: str, reply_timeout: float = 10.0, poll_interval: float = 0.05):
+    """Answer the survey over REST, waiting for each bot reply before moving on."""
+    conversation_id = await create_conversation(client, recorder, customer_id, survey_id)
+
+    async def bot_messages() -> int:
+        response = await client.get(f"/conversations/{conversation_id}/messages",
+                                    params={"fields": "sender"})
+        expect_status(response, 200)
+        return sum(1 for message in response.json() if message["sender"] == "BOT")
+
+    async def wait_for(done: Callable[[], Awaitable[bool]]):
+        deadline = time.monotonic() + reply_timeout
+        while not await done():
+            if time.monotonic() > deadline:
+                raise StepError("Timed out waiting for the bot reply")
+            await asyncio.sleep(poll_interval)
+
+    async def answer(step: str, content: str, done: Callable[[], Awaitable[bool]]):
+        async with recorder.step(step):
+            response = await client.post(f"/conversations/{conversation_id}/messages",
+                                         json={"content": content})
+            expect_status(response, 201)
+            await wait_for(done)
+
+    def replied_after(count: int) -> Callable[[], Awaitable[bool]]:
+        async def replied() -> bool:
+            return await bot_messages() > count
+        return replied
+
+    async def completed() -> bool:
+        response = await client.get(f"/conversations/{conversation_id}",
+                                    params={"fields": "status"})
+        expect_status(response, 200)
+        return response.json().get("status") == "completed"
+
+    # The greeting is sent in the background after the conversation is created
+    async with recorder.step("greeting"):
+        await wait_for(replied_after(0))
+    await answer("answer_q1", random.choice(["1", "2", "3"]), replied_after(await bot_messages()))
+    await answer("answer_q2", "yes", replied_after(await bot_messages()))
+    await answer("detailed_feedback", random.choice(FEEDBACK), completed)
+
+
+async def ws_journey(client: httpx.AsyncClient, recorder: Recorder, customer_id: str,
+                     survey_id: str, ws_url: str, reply_timeout: float = 10.0):
+    """Answer the survey over the WebSocket, timing each answer until the bot replies."""
+    try:
+        import websockets
+    except ImportError:
+        raise RuntimeError(
+            "WebSocket journeys need the 'websockets' package (the loadtest extra)")
+
+    conversation_id = await create_conversation(client, recorder, customer_id, survey_id)
+
+    async def receive_until(websocket, frame_types) -> Dict[str, Any]:
+        while True:
+            frame = json.loads(await asyncio.wait_for(websocket.recv(), reply_timeout))
+            if frame.get("type") == "error":
+                raise StepError(frame.get("message", "error frame"))
+            if frame.get("type") in frame_types:
+                return frame
+
+    async with recorder.step("ws_connect"):
+        websocket = await websockets.connect(f"{ws_url}/ws/{conversation_id}")
+        try:
+            await receive_until(websocket, ("history",))
+        except Exception:
+            await websocket.close()
+            raise
+
+    try:
+        for step, content, reply in (
+            ("answer_q1", random.choice(["1", "2", "3"]), ("message",)),
+            ("answer_q2", "yes", ("message",)),
+            ("detailed_feedback", random.choice(FEEDBACK), ("completed",)),
+        ):
+            async with recorder.step(step):
+                await websocket.send(json.dumps({"content": content}))
+                await receive_until(websocket, reply)
+    finally:
+        await websocket.close()
+
+
+async def run_load(
+    base_url: str,
+    journey: str = "mixed",
+    rate: float = 5.0,
+    concurrency: int = 20,
+    duration: Optional[float] = 30.0,
+    journeys: Optional[int] = None,
+    customer_ids: Optional[List[str]] = None,
+    survey_id: str = "1",
+    ws_fraction: float = 0.5,
+    reply_timeout: float = 10.0,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> Dict[str, Any]:
+    """
+    Start journeys at `rate` per second (open model) until `duration` seconds
+    have passed or `journeys` have been started. At most `concurrency` run at
+    once; arrivals beyond that are rejected and counted, so the measured
+    latencies are not hidden by client-side queueing.
+    """
+    if journey not in JOURNEYS:
+        raise ValueError(f"journey must be one of {', '.join(JOURNEYS)}")
+    customer_ids = customer_ids or ["1", "2"]
+    ws_url = "ws" + base_url[len("http"):] if base_url.startswith("http") else base_url
+    recorder = Recorder()
+    running: set = set()
+
+    async with httpx.AsyncClient(base_url=base_url, transport=transport,
+                                 timeout=reply_timeout) as client:
+        async def one_journey():
+            customer_id = random.choice(customer_ids)
+            use_ws = journey == "ws" or (
+                journey == "mixed" and random.random() < ws_fraction)
+            try:
+                if use_ws:
+                    await ws_journey(client, recorder, customer_id, survey_id, ws_url, reply_timeout)
+                else:
+                    await rest_journey(client, recorder, customer_id, survey_id, reply_timeout)
+                recorder.journeys_completed += 1
+            except Exception:
+                recorder.journeys_failed += 1
+
+        started = time.perf_counter()
+        next_arrival = started
+        while True:
+            now = time.perf_counter()
+            if duration is not None and now - started >= duration:
+                break
+            if journeys is not None and recorder.journeys_started + recorder.journeys_rejected >= journeys:
+                break
+            if next_arrival > now:
+                await asyncio.sleep(next_arrival - now)
+            next_arrival += 1.0 / rate
+
+            if len(running) >= concurrency:
+                recorder.journeys_rejected += 1
+                continue
+            recorder.journeys_started += 1
+            task = asyncio.create_task(one_journey())
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+        if running:
+            await asyncio.gather(*running)
+        elapsed = time.perf_counter() - started
+
+    return recorder.report(elapsed, {
+        "base_url": base_url,
+        "journey": journey,
+        "rate": rate,
+        "concurrency": concurrency,
+        "duration": duration,
+        "journeys": journeys,
+        "survey_id": survey_id,
+    })
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Drive survey journeys against a running server and report latency.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--journey", choices=JOURNEYS, default="mixed")
+    parser.add_argument("--rate", type=float, default=5.0,
+                        help="journeys started per second")
+    parser.add_argument("--concurrency", type=int, default=20,
+                        help="maximum journeys in flight")
+    parser.add_argument("--duration", type=float, default=30.0,
+                        help="seconds to keep starting journeys")
+    parser.add_argument("--journeys", type=int, default=None,
+                        help="stop after this many arrivals")
+    parser.add_argument("--customers", default="1,2",
+                        help="comma-separated customer IDs to use")
+    parser.add_argument("--survey-id", default="1")
+    parser.add_argument("--ws-fraction", type=float, default=0.5,
+                        help="share of WebSocket journeys in mixed mode")
+    parser.add_argument("--reply-timeout", type=float, default=10.0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_load(
+        args.base_url,
+        journey=args.journey,
+        rate=args.rate,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        journeys=args.journeys,
+        customer_ids=args.customers.split(","),
+        survey_id=args.survey_id,
+        ws_fraction=args.ws_fraction,
+        reply_timeout=args.reply_timeout,
+    ))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
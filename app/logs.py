@@ -0,0 +1,215 @@
+"""
+Structured, asynchronous logging for the app.
+
+Records from loggers under "app" are filtered (sampling and rate limiting)
+in the calling thread, put on a bounded in-memory queue and written as JSON
+lines by a background listener thread, so the event loop never blocks on
+stdout. Configure with LOG_LEVEL (default INFO) and LOG_SAMPLING, e.g.
+LOG_SAMPLING="DEBUG=0.01,INFO=0.25".
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+_conversation_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "conversation_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord(
+    "", 0, "", 0, "", (), None)).keys()) | {"message", "asctime", "conversation_id", "suppressed"}
+
+
+@contextmanager
+def bind_conversation(conversation_id: Optional[str]) -> Iterator[None]:
+    """Tag every record logged in this context with a conversation ID."""
+    token = _conversation_id.set(conversation_id)
+    try:
+        yield
+    finally:
+        _conversation_id.reset(token)
+
+
+def set_conversation_id(conversation_id: Optional[str]):
+    """Tag records for the rest of the current task with a conversation ID."""
+    _conversation_id.set(conversation_id)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "conversation_id", None) is None:
+            record.conversation_id = _conversation_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the records at each level; unlisted levels are kept."""
+
+    def __init__(self, rates: Dict[int, float], rng: Any = random):
+        super().__init__()
+        self.rates = rates
+        self._rng = rng
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or self._rng.random() < rate
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let at most `burst` identical warnings or errors through per `interval`
+    seconds. Records are identical when they come from the same call site
+    with the same message template. The first record after a quiet period
+    carries the number that were suppressed.
+    """
+
+    def __init__(self, interval: float = 60.0, burst: int = 5, level: int = logging.WARNING):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.level = level
+        self._windows: Dict[Tuple[str, int, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level:
+            return True
+        key = (record.pathname, record.lineno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            # [window start, records let through, records suppressed]
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        conversation_id = getattr(record, "conversation_id", None)
+        if conversation_id is not None:
+            entry["conversation_id"] = conversation_id
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message and traceback now, in the caller's thread, but
+        # leave JSON formatting to the writer
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at the time of the write."""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def parse_sampling(spec: str) -> Dict[int, float]:
+    """Parse "DEBUG=0.01,INFO=0.25" into {level: rate}."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        level = logging.getLevelName(name.strip().upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown log level: {name}")
+        rates[level] = float(rate)
+    return rates
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[DroppingQueueHandler] = None
+
+
+def setup_logging(
+    level: Optional[str] = None,
+    sampling: Optional[str] = None,
+    max_queue: int = 10000,
+    handler: Optional[logging.Handler] = None,
+) -> logging.Logger:
+    """Route the "app" loggers through a sampled, rate-limited background queue."""
+    global _listener, _handler
+    shutdown_logging()
+
+    writer = handler or _StdoutHandler()
+    writer.setFormatter(JsonFormatter())
+    _handler = DroppingQueueHandler(queue.Queue(maxsize=max_queue))
+    _handler.addFilter(ContextFilter())
+    _handler.addFilter(SamplingFilter(parse_sampling(
+        sampling if sampling is not None else os.environ.get("LOG_SAMPLING", ""))))
+    _handler.addFilter(RateLimitFilter())
+    _listener = logging.handlers.QueueListener(_handler.queue, writer)
+    _listener.start()
+
+    logger = logging.getLogger("app")
+    logger.handlers = [_handler]
+    logger.setLevel((level or os.environ.get("LOG_LEVEL", "INFO")).upper())
+    logger.propagate = False
+    return logger
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
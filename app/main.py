@@ -1,19 +1,66 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, status, Body
+from fastapi import FastAPI, HTTPException, BackgroundTasks, status, Body, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter
+from starlette.concurrency import run_in_threadpool
 from typing import List, Dict, Any, Optional
 import uvicorn
 import time
 from datetime import datetime
-import traceback
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List, Any, Optional
+from starlette.websockets import WebSocketState
+from typing import Dict, List, Any, Optional, Set, Tuple, Type
 import json
 import asyncio
-
-from app.db import MockRPCDatabase
-
-app = FastAPI(title="Survey Chatbot API")
+import functools
+import logging
+import os
+import re
+from contextlib import ExitStack, asynccontextmanager
+
+from app.admission import AdmissionClass, AdmissionController, AdmissionMiddleware, Rejected
+from app.analytics import AnalyticsEngine
+from app.cache import EncodedResponseCache, EncodedPayload, encode_json, splice_json_object
+from app.campaigns import Campaign, CampaignRegistry
+from app.db import MockRPCDatabase, subscribe
+from app.delivery import Outbox, ParkedOutboxes, parse_ack
+from app.enrichment import EnrichmentPipeline
+from app.fanout import FanOut, Observer
+from app.framing import JSON_FRAMING, Frame, Framing, negotiate
+from app.export import EXPORT_FORMATS, decode_cursor, stream_export
+from app.idempotency import (DONE, MISMATCH, PENDING, IdempotencyMiddleware, IdempotencyStore, fingerprint,
+                             record, recording)
+from app.logs import bind_conversation, set_conversation_id, setup_logging, shutdown_logging
+from app.mux import MuxChannel, Multiplexer, tag_frame
+from app.metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, Counter, CounterFunc, Gauge, GaugeFunc,
+                         Histogram, InstrumentedRPC, MetricsMiddleware, RateMeter, Registry)
+from app.retry import RetryBudget, in_retry_layer, retry_layer
+from app.session import SessionContext, SessionRegistry, bind_session
+from app import tracing
+from app.tracing import TracedRoute, TracingMiddleware, current_trace, rpc_span, span, trace, traced
+from app.watchdog import LoopWatchdog
+from app.workers import WorkerPool
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    watchdog.ensure_started()
+    # Start the enrichment workers now rather than on the first saved response
+    enrichment.start()
+    yield
+    watchdog.stop()
+    manager.stop_reaper()
+    enrichment.stop()
+    if tracing.exporter is not None:
+        tracing.exporter.close()
+    shutdown_logging()
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Survey Chatbot API", lifespan=lifespan)
+app.router.route_class = TracedRoute
 
 # Add CORS middleware to allow cross-origin requests
 app.add_middleware(
@@ -24,8 +71,192 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create database instance
-db = MockRPCDatabase()
+# Metrics exposed at /metrics
+metrics = Registry()
+rpc_latency = metrics.register(Histogram(
+    "rpc_duration_seconds", "Latency of database RPC calls", ["method"]))
+rpc_errors = metrics.register(Counter(
+    "rpc_errors_total", "Database RPC calls that raised", ["method", "error"]))
+rpc_retries = metrics.register(Counter(
+    "rpc_retries_total", "RPC calls retried by with_retry", ["method"]))
+rpc_give_ups = metrics.register(Counter(
+    "rpc_give_ups_total", "RPC calls that failed after every retry", ["method"]))
+rpc_retries_collapsed = metrics.register(Counter(
+    "rpc_retries_collapsed_total", "RPC calls inside another retry loop, made without retries of their own",
+    ["method"]))
+http_latency = metrics.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]))
+turn_latency = metrics.register(Histogram(
+    "turn_duration_seconds", "Time to process one survey answer", ["transport"]))
+background_tasks_pending = metrics.register(Gauge(
+    "background_tasks_pending", "Background tasks scheduled but not yet finished"))
+ws_messages = metrics.register(Counter(
+    "websocket_messages_total", "WebSocket frames received and sent", ["direction"]))
+ws_closed = metrics.register(Counter(
+    "websocket_closed_by_server_total", "WebSocket connections refused or closed by the server",
+    ["reason"]))
+ws_bytes_sent = metrics.register(Counter(
+    "websocket_bytes_sent_total",
+    "Size of WebSocket frames sent before transport compression, in characters for text frames",
+    ["framing"]))
+ws_mux_busy = metrics.register(Counter(
+    "websocket_mux_busy_total", "Multiplexed messages refused because their conversation had too many waiting"))
+session_reloads = metrics.register(Counter(
+    "websocket_session_reloads_total", "WebSocket session parts reloaded after a store change",
+    ["part"]))
+loop_lag = metrics.register(Histogram(
+    "event_loop_lag_seconds", "How late the event loop heartbeat woke up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)))
+loop_blocking_samples = metrics.register(Counter(
+    "event_loop_blocking_samples_total", "Stack samples taken while the event loop was blocked",
+    ["coroutine", "blocking_call"]))
+
+# Detects blocking calls made on the event loop thread
+watchdog = LoopWatchdog(
+    on_lag=loop_lag.observe,
+    on_block=lambda sample: loop_blocking_samples.labels(
+        sample["coroutine"], sample["blocking_call"]).inc())
+
+admission_rejected = metrics.register(Counter(
+    "admission_rejected_total", "Requests shed by admission control", ["class", "reason"]))
+admission_wait = metrics.register(Histogram(
+    "admission_queue_wait_seconds", "Time requests waited for admission", ["class"]))
+
+# Admission control: in-progress survey turns are admitted before new
+# conversations and reads, which are admitted before analytics. Work that
+# waits longer than its class allows is shed with 429 / close code 1013.
+admission = AdmissionController([
+    AdmissionClass("turn", limit=64, priority=0, max_wait=5.0),
+    AdmissionClass("read", limit=48, priority=1, max_wait=1.0),
+    AdmissionClass("create", limit=32, priority=2, max_wait=1.0),
+    AdmissionClass("analytics", limit=8, priority=3, max_wait=0.5, retry_after=5.0),
+], capacity=64,
+    on_reject=lambda rejected: admission_rejected.labels(
+        rejected.admission_class, rejected.reason).inc(),
+    on_admit=lambda name, waited: admission_wait.labels(name).observe(waited))
+
+ADMISSION_RULES = [
+    ("POST", re.compile(r"/conversations/[^/]+/(messages|resume)"), "turn"),
+    ("POST", re.compile(r"/conversations(:batch)?|/campaigns"), "create"),
+    ("GET", re.compile(r"/analytics|/surveys/[^/]+/(results|feedback/search|responses/export)"), "analytics"),
+    (None, re.compile(r"/health|/metrics|/debug/.*|/ws-test"), None),
+]
+
+
+def admission_class(scope: Dict[str, Any]) -> Optional[str]:
+    """Admission class of a request; None exempts it (health checks, metrics)."""
+    method = scope.get("method", "GET")
+    for rule_method, pattern, name in ADMISSION_RULES:
+        if rule_method in (None, method) and pattern.fullmatch(scope["path"]):
+            return name
+    return "read"
+
+
+# Results of POSTs and WebSocket answers sent with an idempotency key, so
+# client retries are answered without running them again. The middleware
+# runs inside admission control, so a request shed with 429 is never stored.
+idempotency = IdempotencyStore(ttl=24 * 3600, max_entries=10000)
+metrics.register(CounterFunc(
+    "idempotent_replays_total", "Requests and WebSocket answers answered from the idempotency store",
+    lambda: idempotency.replays))
+app.add_middleware(IdempotencyMiddleware, store=idempotency,
+                   paths=re.compile(r"/conversations(/[^/]+/messages)?"))
+app.add_middleware(AdmissionMiddleware, controller=admission, classify=admission_class)
+app.add_middleware(MetricsMiddleware, latency=http_latency)
+app.add_middleware(TracingMiddleware)
+
+# Retries of every RPC caller are limited to about 10% of calls
+retry_budget = RetryBudget(ratio=0.1)
+metrics.register(GaugeFunc(
+    "retry_budget_tokens", "Retries currently allowed by the retry budget", lambda: retry_budget.tokens))
+metrics.register(CounterFunc(
+    "retry_budget_exhausted_total", "Retries refused because the retry budget was spent",
+    lambda: retry_budget.exhausted))
+
+# Create database instance; every RPC is timed and traced
+db = InstrumentedRPC(MockRPCDatabase(), rpc_latency, rpc_errors, span=rpc_span)
+
+# Pre-encoded survey payloads, shared by the REST endpoints and WebSocket state frames
+survey_cache = EncodedResponseCache()
+
+
+def invalidate_survey_cache(event: str, payload: Dict[str, Any]):
+    if event == "survey_saved":
+        survey_cache.invalidate(("survey", payload["survey_id"]))
+        survey_cache.invalidate("surveys")
+
+
+subscribe(invalidate_survey_cache)
+
+# What each WebSocket connection knows about its conversation, kept for the
+# life of the connection and reloaded only after another writer changed it
+sessions = SessionRegistry(on_reload=lambda part: session_reloads.labels(part).inc())
+subscribe(sessions.on_store_event)
+
+# Read-only observers of conversations, fed from store events in batches
+observers = FanOut()
+
+
+def publish_to_observers(event: str, payload: Dict[str, Any]):
+    if event == "message_added":
+        message = payload["message"]
+        observers.publish(payload["conversation_id"], payload.get("survey_id"), None, json.dumps({
+            "type": "message", "conversation_id": payload["conversation_id"], **message}))
+    elif event == "conversation_saved" and "state" in payload:
+        # Only the latest state of a conversation matters, so waiting ones are replaced
+        state = payload["state"]
+        observers.publish(payload["conversation_id"], state.get("survey_id"),
+                          ("state", payload["conversation_id"]), json.dumps({
+                              "type": "state",
+                              "conversation_id": payload["conversation_id"],
+                              "status": state.get("status"),
+                              "current_question_index": state.get("current_question_index", 0),
+                              "awaiting_detailed_feedback": state.get("awaiting_detailed_feedback", False),
+                          }))
+
+
+subscribe(publish_to_observers)
+
+
+def load_session_survey(survey_id: str) -> Optional[Dict[str, Any]]:
+    payload = survey_cache.get_or_load(("survey", survey_id), lambda: with_retry(db.get_survey_by_id, survey_id))
+    return payload.value if payload else None
+
+
+SESSION_LOADERS = {
+    "conversation": lambda conversation_id: with_retry(db.get_conversation_state, conversation_id),
+    "customer": lambda customer_id: with_retry(db.get_customer_info, customer_id),
+    "survey": load_session_survey,
+}
+
+# Columnar analytics over survey responses, refreshed as responses are saved
+analytics = AnalyticsEngine(
+    lambda survey_id, after_seq, limit: with_retry(db.get_survey_responses_page, survey_id, after_seq, limit))
+
+
+def mark_analytics_dirty(event: str, payload: Dict[str, Any]):
+    if event == "survey_response_saved":
+        analytics.mark_dirty(payload["survey_id"])
+
+
+subscribe(mark_analytics_dirty)
+
+# Sentiment/keyword enrichment of detailed feedback, run off the turn path
+enrichment_batch_latency = metrics.register(Histogram(
+    "enrichment_batch_duration_seconds", "Time to score and write back one enrichment batch"))
+enrichment = EnrichmentPipeline(
+    lambda updates: with_retry(db.update_survey_responses, updates),
+    on_batch=enrichment_batch_latency.observe)
+
+
+def enqueue_enrichment(event: str, payload: Dict[str, Any]):
+    if event == "survey_response_saved":
+        feedback = payload["response"].get("answers", {}).get("detailed_feedback")
+        if feedback:
+            enrichment.submit(payload["seq"], feedback)
+
+
+subscribe(enqueue_enrichment)
 
 # Pydantic models for request/response validation
 
@@ -46,6 +277,8 @@ class ConversationState(BaseModel):
     status: str
     created_at: str
     updated_at: str
+    awaiting_detailed_feedback: Optional[bool] = None
+    resumed_at: Optional[str] = None
 
 
 class StartConversationRequest(BaseModel):
@@ -73,6 +306,68 @@ class Survey(BaseModel):
     name: str
     questions: List[SurveyQuestion]
 
+
+class Customer(BaseModel):
+    id: Optional[str] = None
+    name: str
+    email: Optional[str] = None
+
+
+class ActiveSurvey(BaseModel):
+    conversation_id: str
+    survey_id: str
+    survey_name: str
+    started_at: str
+    last_updated: str
+    progress: float
+    current_question_index: int
+    total_questions: int
+
+# WebSocket frames sent from the server to the client
+
+
+class HistoryFrame(BaseModel):
+    type: str = "history"
+    messages: List[Message]
+
+
+class MessageFrame(BaseModel):
+    type: str = "message"
+    sender: str
+    content: str
+    timestamp: str
+
+
+class ErrorFrame(BaseModel):
+    type: str = "error"
+    message: str
+
+
+class ResumedFrame(BaseModel):
+    type: str = "resumed"
+    currentQuestion: SurveyQuestion
+    message: str
+
+
+class CompletedFrame(BaseModel):
+    type: str = "completed"
+    message: str
+    close_connection: Optional[bool] = None
+    close_code: Optional[int] = None
+    close_reason: Optional[str] = None
+
+
+class ReconnectSuccessFrame(BaseModel):
+    type: str = "reconnect_success"
+    message: str
+
+
+# Validators/serializers for the hot endpoints, built once at import time
+conversation_adapter = TypeAdapter(ConversationState)
+message_list_adapter = TypeAdapter(List[Message])
+active_survey_list_adapter = TypeAdapter(List[ActiveSurvey])
+customer_adapter = TypeAdapter(Customer)
+
 # Exception handling for RPC failures
 
 
@@ -98,24 +393,167 @@ def handle_rpc_error(func):
 
 
 def with_retry(func, *args, max_retries=3, **kwargs):
-    """Execute a function with retry logic for RPC calls."""
-    for attempt in range(max_retries):
-        try:
-            return func(*args, **kwargs)
-        except ConnectionError as e:
-            if attempt < max_retries - 1:
-                backoff = 0.5 * (2 ** attempt)  # Exponential backoff
-                print(
-                    f"RPC connection error on attempt {attempt+1}/{max_retries}, retrying in {backoff:.2f}s: {e}")
-                time.sleep(backoff)
-            else:
-                print(f"Failed after {max_retries} attempts: {e}")
-                raise
+    """
+    Execute a function with retry logic for RPC calls.
+
+    Retries are paid for from the shared retry budget. Inside another retry
+    layer only one attempt is made and the enclosing layer decides whether
+    to try again, so nested loops do not multiply the number of RPCs.
+    """
+    method = getattr(func, "__name__", "unknown")
+    nested = in_retry_layer()
+    if nested:
+        rpc_retries_collapsed.labels(method).inc()
+    attempts = 1 if nested else max_retries
+    retry_budget.record_call()
+    with span(f"rpc.{method}", rpc=method), retry_layer():
+        for attempt in range(attempts):
+            try:
+                with span("rpc.attempt", rpc=method, attempt=attempt + 1):
+                    return func(*args, **kwargs)
+            except ConnectionError as e:
+                if nested:
+                    raise
+                if attempt < attempts - 1 and retry_budget.try_spend():
+                    rpc_retries.labels(method).inc()
+                    backoff = 0.5 * (2 ** attempt)  # Exponential backoff
+                    logger.warning("RPC connection error in %s on attempt %d/%d, retrying in %.2fs: %s",
+                                   method, attempt + 1, max_retries, backoff, e)
+                    with span("rpc.backoff"):
+                        time.sleep(backoff)
+                else:
+                    rpc_give_ups.labels(method).inc()
+                    logger.error("RPC %s failed after %d attempts: %s",
+                                 method, attempt + 1, e)
+                    raise
     return None
 
+# Count a background task as pending until it has run, optionally timing it
+# and tagging its log records with a conversation ID
+
+
+def tracked_task(func, histogram=None, conversation_id=None):
+    background_tasks_pending.inc()
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            with bind_conversation(conversation_id):
+                return func(*args, **kwargs)
+        finally:
+            background_tasks_pending.dec()
+            if histogram is not None:
+                histogram.observe(time.perf_counter() - started)
+    return run
+
+# Helper function to serve a pre-encoded payload
+
+
+def encoded_response(request: Request, payload: EncodedPayload) -> Response:
+    headers = {"ETag": payload.etag, "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == payload.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if payload.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(payload.gzip_body, media_type="application/json", headers=headers)
+    return Response(payload.body, media_type="application/json", headers=headers)
+
+# Helpers for typed responses with optional field projection
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[Set[str]]:
+    """Parse a ?fields=a,b projection and check it against the model."""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return requested
+
+
+def encode_model(adapter: TypeAdapter, value: Any, include: Any = None) -> bytes:
+    """Validate and serialize a value in a single pass through pydantic-core."""
+    return adapter.dump_json(adapter.validate_python(value), include=include, exclude_unset=True)
+
+
+def typed_response(adapter: TypeAdapter, value: Any, include: Any = None) -> Response:
+    return Response(encode_model(adapter, value, include), media_type="application/json")
+
+
+async def send_frame(websocket: WebSocket, frame: BaseModel):
+    """Serialize a typed frame and send it as a text message."""
+    body = frame.model_dump_json(exclude_none=True)
+    # Clients that connected with ?timing=1 get the turn's spans so far
+    turn = current_trace()
+    if turn is not None and turn.attrs.get("timing"):
+        body = body[:-1] + ',"timing":' + json.dumps(turn.summary()) + "}"
+    with span("ws.send", frame=getattr(frame, "type", None)):
+        await send_raw(websocket, body)
+    record(body)
+
+
+async def send_raw(websocket: WebSocket, body: str):
+    """
+    Send an encoded frame, numbering it first if the client acknowledges
+    frames, in the framing the client negotiated.
+    """
+    outbox = manager.outbox(websocket)
+    if outbox is not None:
+        body = outbox.stamp(body)
+    framing = manager.framing(websocket)
+    await send_encoded(websocket, framing, framing.encode(body))
+
+
+async def send_encoded(websocket: WebSocket, framing: Framing, frame: Frame):
+    if isinstance(frame, bytes):
+        await websocket.send_bytes(frame)
+    else:
+        await websocket.send_text(frame)
+    ws_messages.labels("out").inc()
+    ws_bytes_sent.labels(framing.name).inc(len(frame))
+
+
+async def close_when_delivered(websocket: WebSocket, code: int, reason: str, timeout: float = 5.0):
+    """
+    Close the connection once the client has acknowledged every frame, or
+    after `timeout` seconds. Clients that do not acknowledge frames are
+    closed at once: the close frame follows the data frames on the socket.
+    """
+    outbox = manager.outbox(websocket)
+    if outbox is not None:
+        deadline = time.monotonic() + timeout
+        try:
+            while not outbox.all_acked:
+                data = await asyncio.wait_for(websocket.receive_text(), deadline - time.monotonic())
+                ws_messages.labels("in").inc()
+                manager.touch(websocket)
+                seq = parse_ack(data)
+                if seq is not None:
+                    outbox.ack(seq)
+        except asyncio.TimeoutError:
+            logger.warning("Closing with %d unacknowledged frames",
+                           outbox.last_seq - outbox.acked_seq)
+        except WebSocketDisconnect:
+            return
+    await websocket.close(code=code, reason=reason)
+
+
+def finish_idempotent_message(key: Any, frames: List[str]):
+    """Keep the frames of a WebSocket answer for replays, unless it failed."""
+    if any(json.loads(frame).get("type") == "error" for frame in frames):
+        idempotency.release(key)
+    else:
+        idempotency.complete(key, list(frames))
+
 # Helper function to format bot messages
 
 
+@traced("format_message")
 def format_bot_message(customer_name: str, survey_question: dict) -> str:
     if not survey_question.get("options"):
         return f"Would you like to provide feedback on why you selected this option?"
@@ -124,6 +562,28 @@ def format_bot_message(customer_name: str, survey_question: dict) -> str:
         [f"{option['id']} - {option['text']}" for option in survey_question["options"]])
     return f"Hello {customer_name}! {survey_question['text']}\nHere are your options:\n{options_text}\n\nPlease reply with the number corresponding to your choice."
 
+# Send the first survey question to a newly created conversation
+
+
+def greet_customer(conv_id, cust, surv):
+    """Add the first question to a new conversation; RPC errors are raised."""
+    first_question = surv["questions"][0]
+    message = format_bot_message(cust["name"], first_question)
+    return with_retry(db.add_message_to_conversation, conv_id, "BOT", message)
+
+
+def send_first_message(conv_id, cust, surv):
+    # Only the RPC is retried, by with_retry; sending the message again
+    # after a failure could greet the customer twice
+    try:
+        logger.debug("Sending first message")
+        result = greet_customer(conv_id, cust, surv)
+        logger.debug("First message sent, result: %s", result)
+    except ConnectionError as e:
+        logger.error("Failed to send first message: %s", e)
+    except Exception as e:
+        logger.exception("Error sending first message: %s", e)
+
 # Health check endpoint
 
 
@@ -135,10 +595,11 @@ async def health():
 
 
 @app.get("/surveys")
-async def get_surveys():
+async def get_surveys(request: Request):
     """Get all available surveys."""
     try:
-        return db.get_all_surveys()
+        payload = survey_cache.get_or_load("surveys", db.get_all_surveys)
+        return encoded_response(request, payload)
     except ConnectionError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -152,16 +613,17 @@ async def get_surveys():
 
 
 @app.get("/surveys/{survey_id}")
-async def get_survey(survey_id: str):
+async def get_survey(request: Request, survey_id: str):
     """Get a specific survey by ID."""
     try:
-        survey = db.get_survey_by_id(survey_id)
-        if not survey:
+        payload = survey_cache.get_or_load(
+            ("survey", survey_id), lambda: db.get_survey_by_id(survey_id))
+        if not payload:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Survey with ID {survey_id} not found"
             )
-        return survey
+        return encoded_response(request, payload)
     except ConnectionError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -173,6 +635,226 @@ async def get_survey(survey_id: str):
             detail=f"An unexpected error occurred: {str(e)}"
         )
 
+# Get aggregated results for a survey
+
+
+@app.get("/surveys/{survey_id}/results")
+async def get_survey_results(survey_id: str):
+    """Get per-question and per-option answer counts for a survey."""
+    try:
+        payload = survey_cache.get_or_load(
+            ("survey", survey_id), lambda: db.get_survey_by_id(survey_id))
+        if not payload:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Survey with ID {survey_id} not found"
+            )
+        results = db.get_survey_results(survey_id)
+    except HTTPException:
+        raise
+    except ConnectionError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database service is currently unavailable. Please try again later."
+        )
+
+    counts = results["questions"]
+    questions = []
+    for question in payload.value["questions"]:
+        question_counts = counts.get(
+            question["id"], {"answered": 0, "options": {}})
+        answered = question_counts["answered"]
+        entry = {"id": question["id"], "text": question["text"],
+                 "answered": answered}
+        if question["options"]:
+            entry["options"] = [
+                {
+                    "id": option["id"],
+                    "text": option["text"],
+                    "count": question_counts["options"].get(option["id"], 0),
+                    "percent": round(100 * question_counts["options"].get(option["id"], 0) / answered, 2) if answered else 0.0
+                }
+                for option in question["options"]
+            ]
+            entry["other"] = question_counts["options"].get("other", 0)
+        questions.append(entry)
+
+    # Answers recorded outside the survey definition, such as detailed feedback
+    extra = {
+        question_id: {"answered": question_counts["answered"]}
+        for question_id, question_counts in counts.items()
+        if question_id not in {question["id"] for question in payload.value["questions"]}
+    }
+
+    return {
+        "survey_id": survey_id,
+        "responses": results["responses"],
+        "questions": questions,
+        "extra_answers": extra
+    }
+
+# Search free-text feedback for a survey
+
+
+@app.get("/surveys/{survey_id}/feedback/search")
+async def search_feedback(
+    survey_id: str,
+    q: str = Query(..., min_length=1,
+                   description='Search terms; wrap phrases in double quotes'),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Search open-ended answers to a survey, ranked by relevance."""
+    try:
+        payload = survey_cache.get_or_load(
+            ("survey", survey_id), lambda: db.get_survey_by_id(survey_id))
+        if not payload:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Survey with ID {survey_id} not found"
+            )
+        results = db.search_feedback(survey_id, q, offset, limit)
+    except HTTPException:
+        raise
+    except ConnectionError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database service is currently unavailable. Please try again later."
+        )
+    return {"survey_id": survey_id, "query": q, "offset": offset, "limit": limit, **results}
+
+# Export the responses to a survey
+
+
+EXPORT_PAGE_SIZE = 500
+
+
+@app.get("/surveys/{survey_id}/responses/export")
+async def export_survey_responses(
+    survey_id: str,
+    format: str = Query("ndjson", description="ndjson or csv"),
+    since: Optional[str] = Query(
+        None, description="Only export responses completed at or after this ISO timestamp"),
+    cursor: Optional[str] = Query(
+        None, description="Resume after the row that carried this cursor")
+):
+    """Stream a survey's responses as NDJSON or CSV."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported format {format}; expected one of {', '.join(EXPORT_FORMATS)}"
+        )
+    try:
+        after_seq = decode_cursor(cursor) if cursor else 0
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    try:
+        since_at = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid since timestamp {since}; expected an ISO 8601 timestamp"
+        )
+
+    try:
+        payload = survey_cache.get_or_load(
+            ("survey", survey_id), lambda: db.get_survey_by_id(survey_id))
+    except ConnectionError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database service is currently unavailable. Please try again later."
+        )
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Survey with ID {survey_id} not found"
+        )
+
+    async def fetch_page(after: int):
+        return await run_in_threadpool(
+            with_retry, db.get_survey_responses_page, survey_id, after, EXPORT_PAGE_SIZE)
+
+    answer_columns = [question["id"]
+                      for question in payload.value["questions"]] + ["detailed_feedback"]
+    return StreamingResponse(
+        stream_export(fetch_page, format, after_seq, since_at, answer_columns),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition":
+                 f'attachment; filename="survey-{survey_id}-responses.{format}"'}
+    )
+
+# Run analytical queries over survey responses
+
+
+@app.get("/analytics")
+async def query_analytics(
+    survey_id: str,
+    query: str = Query(..., description="counts, crosstab or funnel"),
+    question: Optional[str] = Query(
+        None, description="Question ID for counts and crosstab queries"),
+    by: Optional[str] = Query(
+        None, description="customer, time or another question ID"),
+    bucket: int = Query(
+        3600, gt=0, description="Time bucket size in seconds for by=time"),
+    customer_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Answer counts, cross-tabs and completion funnels for a survey."""
+    if query not in ("counts", "crosstab", "funnel"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown query {query}; expected counts, crosstab or funnel"
+        )
+    if query in ("counts", "crosstab") and not question:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The {query} query requires a question"
+        )
+    if query == "crosstab" and not by:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The crosstab query requires by"
+        )
+
+    try:
+        payload = survey_cache.get_or_load(
+            ("survey", survey_id), lambda: db.get_survey_by_id(survey_id))
+        if not payload:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Survey with ID {survey_id} not found"
+            )
+
+        filters = {"customer_id": customer_id, "since": since, "until": until}
+        if query == "counts":
+            result = await run_in_threadpool(analytics.counts, survey_id, question, **filters)
+        elif query == "crosstab":
+            result = await run_in_threadpool(
+                analytics.crosstab, survey_id, question, by, bucket, **filters)
+        else:
+            progress = await run_in_threadpool(with_retry, db.get_conversation_progress, survey_id)
+            result = analytics.funnel(
+                [q["id"] for q in payload.value["questions"]], progress)
+    except HTTPException:
+        raise
+    except ConnectionError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database service is currently unavailable. Please try again later."
+        )
+
+    return {"survey_id": survey_id, "query": query, **result}
+
+# Enrichment pipeline metrics
+
+
+@app.get("/enrichment/metrics")
+async def get_enrichment_metrics():
+    """Queue depth, throughput and batch latency of the enrichment pipeline."""
+    return enrichment.stats()
+
 # Start a new conversation
 
 
@@ -206,30 +888,9 @@ async def start_conversation(
         conversation_id = db.create_conversation(customer_id, survey_id)
 
         # Send the first message in the background
-        def send_first_message(conv_id, cust, surv):
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    print(
-                        f"Sending first message for conversation {conv_id}, attempt {attempt+1}/{max_retries}")
-                    first_question = surv["questions"][0]
-                    message = format_bot_message(cust["name"], first_question)
-                    result = with_retry(
-                        db.add_message_to_conversation, conv_id, "BOT", message)
-                    print(
-                        f"First message sent for conversation {conv_id}, result: {result}")
-                    return
-                except ConnectionError as e:
-                    if attempt == max_retries - 1:
-                        print(
-                            f"Failed to send first message after {max_retries} attempts: {e}")
-                except Exception as e:
-                    print(f"Error sending first message: {e}")
-                    traceback.print_exc()
-                    break  # Don't retry on non-connection errors
-
         background_tasks.add_task(
-            send_first_message, conversation_id, customer, survey)
+            tracked_task(send_first_message, conversation_id=conversation_id),
+            conversation_id, customer, survey)
 
         return {"conversation_id": conversation_id}
     except ConnectionError:
@@ -244,12 +905,242 @@ async def start_conversation(
             detail=f"An unexpected error occurred: {str(e)}"
         )
 
+# Start many conversations at once
+
+
+BATCH_MAX_ITEMS = 10000
+BATCH_CHUNK_SIZE = 500
+
+# Greetings for batch-created conversations are sent through a bounded pool
+greeting_pool = WorkerPool("greeting", size=16, max_queue=1000)
+
+
+class StartConversationBatchRequest(BaseModel):
+    items: List[StartConversationRequest] = Field(
+        ..., max_length=BATCH_MAX_ITEMS)
+
+
+def batch_result(index: int, item: StartConversationRequest, **result: Any) -> bytes:
+    line = {"index": index, "customer_id": item.customer_id,
+            "survey_id": item.survey_id}
+    line.update(result)
+    return encode_json(line) + b"\n"
+
+
+async def stream_conversation_batch(items: List[StartConversationRequest]):
+    """Validate, create and greet a batch, yielding one NDJSON line per item."""
+    unavailable = "Database service is currently unavailable. Please try again later."
+
+    # Validate every pair with one customer lookup and one survey lookup
+    try:
+        customer_ids = list(dict.fromkeys(item.customer_id for item in items))
+        customers = await run_in_threadpool(with_retry, db.get_customers_info, customer_ids)
+        surveys_payload = await run_in_threadpool(
+            survey_cache.get_or_load, "surveys", lambda: with_retry(db.get_all_surveys))
+        surveys = {survey["id"]: survey for survey in (
+            surveys_payload.value if surveys_payload else [])}
+    except ConnectionError:
+        for index, item in enumerate(items):
+            yield batch_result(index, item, status="error", error=unavailable)
+        return
+
+    valid = []
+    for index, item in enumerate(items):
+        if item.customer_id not in customers:
+            yield batch_result(index, item, status="error",
+                               error=f"Customer with ID {item.customer_id} not found")
+        elif item.survey_id not in surveys:
+            yield batch_result(index, item, status="error",
+                               error=f"Survey with ID {item.survey_id} not found")
+        else:
+            valid.append((index, item))
+
+    # Create the conversations in chunks, greeting each one through the pool
+    for start in range(0, len(valid), BATCH_CHUNK_SIZE):
+        chunk = valid[start:start + BATCH_CHUNK_SIZE]
+        pairs = [(item.customer_id, item.survey_id) for _, item in chunk]
+        try:
+            conversation_ids = await run_in_threadpool(with_retry, db.create_conversations, pairs)
+        except ConnectionError:
+            for index, item in chunk:
+                yield batch_result(index, item, status="error", error=unavailable)
+            continue
+
+        for (index, item), conversation_id in zip(chunk, conversation_ids):
+            if not conversation_id:
+                yield batch_result(index, item, status="error",
+                                   error="Customer or survey not found")
+                continue
+            await greeting_pool.submit(
+                send_first_message, conversation_id,
+                customers[item.customer_id], surveys[item.survey_id])
+            yield batch_result(index, item, status="created", conversation_id=conversation_id)
+
+
+@app.post("/conversations:batch")
+async def start_conversation_batch(request: StartConversationBatchRequest):
+    """Start conversations for many (customer_id, survey_id) pairs, streaming per-item results as NDJSON."""
+    return StreamingResponse(
+        stream_conversation_batch(request.items),
+        media_type="application/x-ndjson"
+    )
+
+# Campaigns dispatch conversations to a customer segment at a controlled rate
+
+
+campaigns = CampaignRegistry()
+
+
+class StartCampaignRequest(BaseModel):
+    survey_id: str
+    customer_ids: Optional[List[str]] = None
+    # Select customers whose fields equal all of these values
+    customer_filter: Optional[Dict[str, Any]] = None
+    rate: float = Field(50.0, gt=0, description="Conversations per second")
+    concurrency: int = Field(10, ge=1, le=500)
+
+
+def customer_id_source(customer_ids: List[str], page_size: int = 500):
+    """Yield (customer_id, customer) for a list of IDs, looking customers up a page at a time."""
+    async def source():
+        for start in range(0, len(customer_ids), page_size):
+            page = customer_ids[start:start + page_size]
+            customers = await run_in_threadpool(with_retry, db.get_customers_info, page)
+            for customer_id in page:
+                yield customer_id, customers.get(customer_id)
+    return source
+
+
+def customer_predicate_source(predicate, page_size: int = 500):
+    """Yield (customer_id, customer) for every customer matching a predicate."""
+    async def source():
+        offset = 0
+        while True:
+            page = await run_in_threadpool(with_retry, db.list_customers, offset, page_size)
+            for customer in page:
+                if predicate(customer):
+                    yield customer["id"], customer
+            if len(page) < page_size:
+                return
+            offset += page_size
+    return source
+
+
+def dispatch_campaign_conversation(customer_id: str, customer: Dict[str, Any], survey: Dict[str, Any],
+                                   created: Dict[str, str]):
+    # ConnectionError, from the greeting too, is left to the campaign, which
+    # backs off and retries. A retry after a failed greeting reuses the
+    # conversation the first attempt created.
+    conversation_id = created.get(customer_id)
+    if conversation_id is None:
+        conversation_id = created[customer_id] = db.create_conversation(customer_id, survey["id"])
+    greet_customer(conversation_id, customer, survey)
+    del created[customer_id]
+
+
+def get_campaign_or_404(campaign_id: str) -> Campaign:
+    campaign = campaigns.get(campaign_id)
+    if not campaign:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Campaign with ID {campaign_id} not found"
+        )
+    return campaign
+
+
+@app.post("/campaigns", status_code=status.HTTP_202_ACCEPTED)
+async def start_campaign(request: StartCampaignRequest):
+    """Start dispatching a survey to a list of customers or to the customers matching a filter."""
+    if (request.customer_ids is None) == (request.customer_filter is None):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Provide exactly one of customer_ids or customer_filter"
+        )
+    try:
+        payload = survey_cache.get_or_load(
+            ("survey", request.survey_id), lambda: db.get_survey_by_id(request.survey_id))
+    except ConnectionError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database service is currently unavailable. Please try again later."
+        )
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Survey with ID {request.survey_id} not found"
+        )
+    survey = payload.value
+
+    if request.customer_ids is not None:
+        source = customer_id_source(request.customer_ids)
+        total = len(request.customer_ids)
+    else:
+        customer_filter = request.customer_filter
+        source = customer_predicate_source(
+            lambda customer: all(customer.get(key) == value for key, value in customer_filter.items()))
+        total = None
+
+    # Conversations created for customers whose greeting is still to be sent
+    created: Dict[str, str] = {}
+    campaign = campaigns.start(Campaign(
+        survey_id=request.survey_id,
+        source=source,
+        dispatch=lambda customer_id, customer: dispatch_campaign_conversation(
+            customer_id, customer, survey, created),
+        rate=request.rate,
+        concurrency=request.concurrency,
+        total=total,
+        retry_budget=retry_budget,
+    ))
+    return campaign.snapshot()
+
+
+@app.get("/campaigns")
+async def list_campaigns():
+    """List campaigns started by this process with their progress."""
+    return [campaign.snapshot() for campaign in campaigns.list()]
+
+
+@app.get("/campaigns/{campaign_id}")
+async def get_campaign(campaign_id: str):
+    """Get the progress of a campaign."""
+    return get_campaign_or_404(campaign_id).snapshot()
+
+
+@app.post("/campaigns/{campaign_id}/pause")
+async def pause_campaign(campaign_id: str):
+    """Pause a running campaign; in-flight dispatches are allowed to finish."""
+    campaign = get_campaign_or_404(campaign_id)
+    campaign.pause()
+    return campaign.snapshot()
+
+
+@app.post("/campaigns/{campaign_id}/resume")
+async def resume_campaign(campaign_id: str):
+    """Resume a paused campaign."""
+    campaign = get_campaign_or_404(campaign_id)
+    campaign.resume()
+    return campaign.snapshot()
+
+
+@app.post("/campaigns/{campaign_id}/cancel")
+async def cancel_campaign(campaign_id: str):
+    """Stop a campaign; customers not yet dispatched are skipped."""
+    campaign = get_campaign_or_404(campaign_id)
+    campaign.cancel()
+    return campaign.snapshot()
+
 # Get conversation state
 
 
-@app.get("/conversations/{conversation_id}")
-async def get_conversation(conversation_id: str):
+@app.get("/conversations/{conversation_id}", response_model=ConversationState, response_model_exclude_unset=True)
+async def get_conversation(
+    conversation_id: str,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated list of fields to return")
+):
     """Get the state of a conversation."""
+    include = parse_fields(fields, ConversationState)
     try:
         conversation = db.get_conversation_state(conversation_id)
         if not conversation:
@@ -257,7 +1148,7 @@ async def get_conversation(conversation_id: str):
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Conversation with ID {conversation_id} not found"
             )
-        return conversation
+        return typed_response(conversation_adapter, conversation, include)
     except ConnectionError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -272,12 +1163,18 @@ async def get_conversation(conversation_id: str):
 # Get conversation messages
 
 
-@app.get("/conversations/{conversation_id}/messages")
-async def get_messages(conversation_id: str):
+@app.get("/conversations/{conversation_id}/messages", response_model=List[Message])
+async def get_messages(
+    conversation_id: str,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated list of message fields to return")
+):
     """Get all messages for a conversation."""
+    include = parse_fields(fields, Message)
     try:
         messages = db.get_conversation_messages(conversation_id)
-        return messages
+        return typed_response(
+            message_list_adapter, messages, {"__all__": include} if include else None)
     except ConnectionError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -319,206 +1216,208 @@ async def send_message(
 
         # Process user's response and continue the survey flow
         def process_user_response(conv_id, response, conv):
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    print(
-                        f"Processing response '{response}' for conversation {conv_id}, attempt {attempt+1}/{max_retries}")
-
-                    # Get updated conversation state after user message
-                    conv = with_retry(db.get_conversation_state, conv_id)
-                    if not conv:
-                        print(f"Conversation {conv_id} not found")
-                        return
+            # Each RPC is retried by with_retry. The turn as a whole is not:
+            # conv is the stored state, already changed by the time a save
+            # fails, so running the turn again would apply the answer twice.
+            try:
+                logger.debug("Processing response %r", response)
 
-                    # Check if we're awaiting detailed feedback from a previous interaction
-                    if conv.get("awaiting_detailed_feedback", False):
-                        # Get customer information
-                        customer = with_retry(
-                            db.get_customer_info, conv["customer_id"])
-                        if not customer:
-                            print(f"Customer {conv['customer_id']} not found")
-                            return
-
-                        # Store the detailed feedback
-                        conv["answers"]["detailed_feedback"] = response
-                        conv["awaiting_detailed_feedback"] = False
-                        with_retry(db.save_conversation_state, conv_id, conv)
-                        print(f"Received detailed feedback: {response}")
-
-                        # Thank the user for their feedback and complete the survey
-                        completion_message = f"Thank you for your feedback, {customer['name']}! Your detailed response has been recorded. Have a wonderful day!"
-                        result = with_retry(
-                            db.add_message_to_conversation, conv_id, "BOT", completion_message)
-                        print(
-                            f"Sent completion message with feedback acknowledgment: {completion_message}, result: {result}")
-
-                        # Mark survey as completed
-                        conv["status"] = "completed"
-                        with_retry(db.save_conversation_state, conv_id, conv)
-
-                        # Save the survey response
-                        survey_response = {
-                            "conversation_id": conv_id,
-                            "customer_id": conv["customer_id"],
-                            "survey_id": conv["survey_id"],
-                            "answers": conv["answers"],
-                            "completed_at": datetime.now().isoformat()
-                        }
-                        with_retry(db.save_survey_response, survey_response)
-                        print(
-                            f"Saved survey response with detailed feedback: {survey_response}")
-                        return
+                # Get updated conversation state after user message
+                conv = with_retry(db.get_conversation_state, conv_id)
+                if not conv:
+                    logger.warning("Conversation %s not found", conv_id)
+                    return
 
+                # Check if we're awaiting detailed feedback from a previous interaction
+                if conv.get("awaiting_detailed_feedback", False):
                     # Get customer information
                     customer = with_retry(
                         db.get_customer_info, conv["customer_id"])
                     if not customer:
-                        print(f"Customer {conv['customer_id']} not found")
+                        logger.warning(
+                            "Customer %s not found", conv["customer_id"])
                         return
 
-                    # Get survey information
-                    survey = with_retry(db.get_survey_by_id, conv["survey_id"])
-                    if not survey:
-                        print(f"Survey {conv['survey_id']} not found")
-                        return
+                    # Store the detailed feedback
+                    conv["answers"]["detailed_feedback"] = response
+                    conv["awaiting_detailed_feedback"] = False
+                    with_retry(db.save_conversation_state, conv_id, conv)
+                    logger.debug("Received detailed feedback")
 
-                    # Save the user's answer
-                    current_question_idx = conv.get(
-                        "current_question_index", 0)
-                    print(
-                        f"Processing question at index {current_question_idx}")
-
-                    try:
-                        current_question = survey["questions"][current_question_idx]
-                        print(f"Current question: {current_question['text']}")
-                    except IndexError:
-                        print(
-                            f"Question index {current_question_idx} is out of bounds")
-                        return
+                    # Thank the user for their feedback and complete the survey
+                    completion_message = f"Thank you for your feedback, {customer['name']}! Your detailed response has been recorded. Have a wonderful day!"
+                    result = with_retry(
+                        db.add_message_to_conversation, conv_id, "BOT", completion_message)
+                    logger.debug(
+                        "Sent completion message with feedback acknowledgment, result: %s", result)
 
-                    # Store the user's response
-                    conv["answers"][current_question["id"]] = response
-                    print(
-                        f"Stored answer for question {current_question['id']}: {response}")
-
-                    # Handle feedback question specifically
-                    if current_question["id"] == "q2":
-                        # Check if the response indicates user wants to provide feedback
-                        positive_responses = ["yes", "yes please", "sure", "ok", "okay",
-                                              "of course", "certainly", "definitely", "absolutely", "yeah"]
-                        if any(pos in response.lower() for pos in positive_responses):
-                            print(
-                                "User indicated they would like to provide feedback")
-
-                            # Ask for detailed feedback
-                            feedback_message = "Great! Please share your thoughts about why you selected this flavor."
-                            result = with_retry(
-                                db.add_message_to_conversation, conv_id, "BOT", feedback_message)
-                            print(
-                                f"Asked for detailed feedback: {feedback_message}, result: {result}")
-
-                            # Add another question to the survey dynamically (or handle as a sub-state)
-                            # For this example, we'll create a special state to indicate we're awaiting detailed feedback
-                            conv["awaiting_detailed_feedback"] = True
-                            with_retry(db.save_conversation_state,
-                                       conv_id, conv)
-                            return
-                        else:
-                            # User doesn't want to provide feedback, proceed to completion
-                            print(
-                                "User declined to provide feedback, completing survey")
-
-                    # Determine if we've reached the end of the survey
-                    next_question_idx = current_question_idx + 1
-                    print(f"Next question index would be: {next_question_idx}")
-                    print(f"Total questions: {len(survey['questions'])}")
-
-                    if next_question_idx >= len(survey["questions"]):
-                        print("Reached end of survey, marking as completed")
-                        # Survey complete
-                        conv["status"] = "completed"
-                        with_retry(db.save_conversation_state, conv_id, conv)
-                        print(f"Saved conversation state with status 'completed'")
-
-                        # Save the survey response
-                        survey_response = {
-                            "conversation_id": conv_id,
-                            "customer_id": conv["customer_id"],
-                            "survey_id": conv["survey_id"],
-                            "answers": conv["answers"],
-                            "completed_at": datetime.now().isoformat()
-                        }
-                        with_retry(db.save_survey_response, survey_response)
-                        print(f"Saved survey response: {survey_response}")
-
-                        # Send completion message
-                        completion_message = f"Thank you for your time, {customer['name']}! Your response has been recorded. Have a wonderful day!"
+                    # Mark survey as completed
+                    conv["status"] = "completed"
+                    with_retry(db.save_conversation_state, conv_id, conv)
+
+                    # Save the survey response
+                    survey_response = {
+                        "conversation_id": conv_id,
+                        "customer_id": conv["customer_id"],
+                        "survey_id": conv["survey_id"],
+                        "answers": conv["answers"],
+                        "completed_at": datetime.now().isoformat()
+                    }
+                    with_retry(db.save_survey_response, survey_response)
+                    logger.info("Saved survey response with detailed feedback",
+                                extra={"survey_id": conv["survey_id"]})
+                    return
+
+                # Get customer information
+                customer = with_retry(
+                    db.get_customer_info, conv["customer_id"])
+                if not customer:
+                    logger.warning(
+                        "Customer %s not found", conv["customer_id"])
+                    return
+
+                # Get survey information
+                survey = with_retry(db.get_survey_by_id, conv["survey_id"])
+                if not survey:
+                    logger.warning("Survey %s not found", conv["survey_id"])
+                    return
+
+                # Save the user's answer
+                current_question_idx = conv.get(
+                    "current_question_index", 0)
+                logger.debug("Processing question at index %d",
+                             current_question_idx)
+
+                try:
+                    current_question = survey["questions"][current_question_idx]
+                    logger.debug("Current question: %s",
+                                 current_question["id"])
+                except IndexError:
+                    logger.warning(
+                        "Question index %d is out of bounds", current_question_idx)
+                    return
+
+                # Store the user's response
+                conv["answers"][current_question["id"]] = response
+                logger.debug("Stored answer for question %s",
+                             current_question["id"])
+
+                # Handle feedback question specifically
+                if current_question["id"] == "q2":
+                    # Check if the response indicates user wants to provide feedback
+                    positive_responses = ["yes", "yes please", "sure", "ok", "okay",
+                                          "of course", "certainly", "definitely", "absolutely", "yeah"]
+                    if any(pos in response.lower() for pos in positive_responses):
+                        logger.debug(
+                            "User indicated they would like to provide feedback")
+
+                        # Ask for detailed feedback
+                        feedback_message = "Great! Please share your thoughts about why you selected this flavor."
                         result = with_retry(
-                            db.add_message_to_conversation, conv_id, "BOT", completion_message)
-                        print(
-                            f"Sent completion message: {completion_message}, result: {result}")
+                            db.add_message_to_conversation, conv_id, "BOT", feedback_message)
+                        logger.debug(
+                            "Asked for detailed feedback, result: %s", result)
+
+                        # Add another question to the survey dynamically (or handle as a sub-state)
+                        # For this example, we'll create a special state to indicate we're awaiting detailed feedback
+                        conv["awaiting_detailed_feedback"] = True
+                        with_retry(db.save_conversation_state,
+                                   conv_id, conv)
                         return
-
-                    # Move to the next question
-                    print(
-                        f"Moving to next question at index {next_question_idx}")
-                    conv["current_question_index"] = next_question_idx
+                    else:
+                        # User doesn't want to provide feedback, proceed to completion
+                        logger.debug(
+                            "User declined to provide feedback, completing survey")
+
+                # Determine if we've reached the end of the survey
+                next_question_idx = current_question_idx + 1
+                logger.debug("Next question index would be %d of %d",
+                             next_question_idx, len(survey["questions"]))
+
+                if next_question_idx >= len(survey["questions"]):
+                    logger.debug(
+                        "Reached end of survey, marking as completed")
+                    # Survey complete
+                    conv["status"] = "completed"
                     with_retry(db.save_conversation_state, conv_id, conv)
-                    print(f"Updated conversation state with new question index")
-
-                    # If the previous question was about flavor choice and user provided a choice
-                    if current_question["id"] == "q1" and response in ["1", "2", "3"]:
-                        print(f"Processing flavor choice: {response}")
-                        # Get flavor name based on user's choice
-                        flavor_choice = None
-                        for option in current_question["options"]:
-                            if option["id"] == response:
-                                flavor_choice = option["text"]
-                                break
-
-                        if flavor_choice:
-                            print(f"Selected flavor: {flavor_choice}")
-                            # Send acknowledgment message for the flavor choice
-                            ack_message = f"Great choice! {flavor_choice} is a classic favorite. Would you like to provide feedback on why you selected this flavor?"
-                            result = with_retry(
-                                db.add_message_to_conversation, conv_id, "BOT", ack_message)
-                            print(
-                                f"Sent acknowledgment message for {flavor_choice}: {ack_message}, result: {result}")
-                            return
-                        else:
-                            print(f"No flavor found for choice: {response}")
-
-                    # For other questions or if flavor not found, send the next question
-                    try:
-                        next_question = survey["questions"][next_question_idx]
-                        print(f"Next question: {next_question['text']}")
-                        next_message = format_bot_message(
-                            customer["name"], next_question)
-                        result = with_retry(
-                            db.add_message_to_conversation, conv_id, "BOT", next_message)
-                        print(
-                            f"Sent next question: {next_message}, result: {result}")
-                    except IndexError:
-                        print(
-                            f"No question found at index {next_question_idx}")
-
-                    # Successfully processed, exit the retry loop
+                    logger.debug(
+                        "Saved conversation state with status 'completed'")
+
+                    # Save the survey response
+                    survey_response = {
+                        "conversation_id": conv_id,
+                        "customer_id": conv["customer_id"],
+                        "survey_id": conv["survey_id"],
+                        "answers": conv["answers"],
+                        "completed_at": datetime.now().isoformat()
+                    }
+                    with_retry(db.save_survey_response, survey_response)
+                    logger.info("Saved survey response",
+                                extra={"survey_id": conv["survey_id"]})
+
+                    # Send completion message
+                    completion_message = f"Thank you for your time, {customer['name']}! Your response has been recorded. Have a wonderful day!"
+                    result = with_retry(
+                        db.add_message_to_conversation, conv_id, "BOT", completion_message)
+                    logger.debug(
+                        "Sent completion message, result: %s", result)
                     return
 
-                except ConnectionError as e:
-                    if attempt == max_retries - 1:
-                        print(
-                            f"Failed to process response after {max_retries} attempts: {e}")
-                    # Will retry on next iteration if not the last attempt
-                except Exception as e:
-                    print(f"Error processing user response: {e}")
-                    traceback.print_exc()
-                    break  # Don't retry on non-connection errors
+                # Move to the next question
+                logger.debug("Moving to next question at index %d",
+                             next_question_idx)
+                conv["current_question_index"] = next_question_idx
+                with_retry(db.save_conversation_state, conv_id, conv)
+                logger.debug(
+                    "Updated conversation state with new question index")
+
+                # If the previous question was about flavor choice and user provided a choice
+                if current_question["id"] == "q1" and response in ["1", "2", "3"]:
+                    logger.debug("Processing flavor choice: %s", response)
+                    # Get flavor name based on user's choice
+                    flavor_choice = None
+                    for option in current_question["options"]:
+                        if option["id"] == response:
+                            flavor_choice = option["text"]
+                            break
+
+                    if flavor_choice:
+                        logger.debug("Selected flavor: %s", flavor_choice)
+                        # Send acknowledgment message for the flavor choice
+                        ack_message = f"Great choice! {flavor_choice} is a classic favorite. Would you like to provide feedback on why you selected this flavor?"
+                        result = with_retry(
+                            db.add_message_to_conversation, conv_id, "BOT", ack_message)
+                        logger.debug(
+                            "Sent acknowledgment message for %s, result: %s", flavor_choice, result)
+                        return
+                    else:
+                        logger.warning(
+                            "No flavor found for choice: %s", response)
+
+                # For other questions or if flavor not found, send the next question
+                try:
+                    next_question = survey["questions"][next_question_idx]
+                    logger.debug("Next question: %s", next_question["id"])
+                    next_message = format_bot_message(
+                        customer["name"], next_question)
+                    result = with_retry(
+                        db.add_message_to_conversation, conv_id, "BOT", next_message)
+                    logger.debug(
+                        "Sent next question, result: %s", result)
+                except IndexError:
+                    logger.warning(
+                        "No question found at index %d", next_question_idx)
+
+            except ConnectionError as e:
+                logger.error("Failed to process response: %s", e)
+            except Exception as e:
+                logger.exception("Error processing user response: %s", e)
 
         # Process the user's response in the background
         background_tasks.add_task(
-            process_user_response, conversation_id, message.content, conversation)
+            tracked_task(process_user_response, turn_latency.labels("rest"),
+                         conversation_id=conversation_id),
+            conversation_id, message.content, conversation)
 
         return {"status": "message received"}
     except ConnectionError:
@@ -533,9 +1432,14 @@ async def send_message(
         )
 
 
-@app.get("/customers/{customer_id}/active-surveys")
-async def get_active_surveys(customer_id: str):
+@app.get("/customers/{customer_id}/active-surveys", response_model=List[ActiveSurvey])
+async def get_active_surveys(
+    customer_id: str,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated list of fields to return")
+):
     """Get all active/incomplete surveys for a customer."""
+    include = parse_fields(fields, ActiveSurvey)
     try:
         # Check if customer exists
         customer = db.get_customer_info(customer_id)
@@ -572,7 +1476,8 @@ async def get_active_surveys(customer_id: str):
                 "total_questions": total_questions
             })
 
-        return formatted_surveys
+        return typed_response(
+            active_survey_list_adapter, formatted_surveys, {"__all__": include} if include else None)
     except ConnectionError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -629,14 +1534,14 @@ async def resume_survey(
                 with_retry(db.add_message_to_conversation,
                            conv_id, "BOT", resume_message)
 
-                print(f"Sent resume message for conversation {conv_id}")
+                logger.debug("Sent resume message")
             except Exception as e:
-                print(f"Error sending resume message: {e}")
-                traceback.print_exc()
+                logger.exception("Error sending resume message: %s", e)
 
         # Add the background task
         background_tasks.add_task(
-            send_resume_message, conversation_id, customer, survey, conversation
+            tracked_task(send_resume_message, conversation_id=conversation_id),
+            conversation_id, customer, survey, conversation
         )
 
         return {"status": "resumed", "conversation_id": conversation_id}
@@ -652,18 +1557,82 @@ async def resume_survey(
         )
 
 
+class Connection:
+    __slots__ = ("websocket", "conversation_id", "connected_at", "last_seen", "outbox", "framing")
+
+    def __init__(self, websocket: WebSocket, conversation_id: Optional[str], outbox: Optional[Outbox] = None,
+                 framing: Framing = JSON_FRAMING):
+        self.websocket = websocket
+        self.conversation_id = conversation_id
+        self.connected_at = self.last_seen = time.monotonic()
+        self.outbox = outbox
+        self.framing = framing
+
+
+PING_FRAME = '{"type":"ping"}'
+
+
+def is_pong(data: str) -> bool:
+    try:
+        return json.loads(data).get("type") == "pong"
+    except (ValueError, AttributeError):
+        return False
+
+
 class ConnectionManager:
-    def __init__(self):
+    """
+    Tracks open WebSockets by conversation and bounds their number and lifetime.
+
+    A reaper task sends a ping frame every `ping_interval` seconds and closes
+    connections that have not sent anything (a message or a pong) for
+    `idle_timeout` seconds, or that have been open longer than `max_lifetime`.
+    New connections beyond `max_connections` are refused with close code
+    1013; beyond `max_per_conversation` the conversation's oldest is closed.
+    The outbox of a connection that closes with unacknowledged frames is
+    parked for the conversation's next connection.
+
+    A multiplexed connection has no conversation of its own. Its channels
+    are served by the multiplexer, not tracked here.
+    """
+
+    def __init__(self, max_connections: int = 10000, max_per_conversation: int = 5,
+                 ping_interval: float = 30.0, idle_timeout: float = 300.0, max_lifetime: float = 4 * 3600):
         # Store active connections by conversation_id
         self.active_connections: Dict[str, List[WebSocket]] = {}
-
-    async def connect(self, websocket: WebSocket, conversation_id: str):
-        await websocket.accept()
-        if conversation_id not in self.active_connections:
-            self.active_connections[conversation_id] = []
-        self.active_connections[conversation_id].append(websocket)
-
-    def disconnect(self, websocket: WebSocket, conversation_id: str):
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.max_connections = max_connections
+        self.max_per_conversation = max_per_conversation
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.parked = ParkedOutboxes()
+        self._reaper: Optional[asyncio.Task] = None
+        self._reaper_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def connect(self, websocket: WebSocket, conversation_id: Optional[str],
+                      outbox: Optional[Outbox] = None, framing: Framing = JSON_FRAMING) -> bool:
+        """Accept and register a connection; False if it was refused and closed."""
+        # Confirm the negotiated framing only to clients that offered it
+        offered = websocket.scope.get("subprotocols", [])
+        await websocket.accept(subprotocol=framing.subprotocol if framing.subprotocol in offered else None)
+        if len(self.connections) >= self.max_connections:
+            ws_closed.labels("limit").inc()
+            await websocket.close(code=1013, reason="Too many connections")
+            return False
+        if conversation_id is not None:
+            existing = self.active_connections.get(conversation_id, [])
+            if len(existing) >= self.max_per_conversation:
+                ws_closed.labels("replaced").inc()
+                await self._close(existing[0], 1001, "Replaced by a newer connection")
+            self.active_connections.setdefault(conversation_id, []).append(websocket)
+        self.connections[websocket] = Connection(websocket, conversation_id, outbox, framing)
+        self.ensure_reaper()
+        return True
+
+    def disconnect(self, websocket: WebSocket, conversation_id: Optional[str]):
+        connection = self.connections.pop(websocket, None)
+        if connection is not None and connection.outbox is not None and not connection.outbox.all_acked:
+            self.parked.park(conversation_id, connection.outbox, time.monotonic())
         if conversation_id in self.active_connections:
             if websocket in self.active_connections[conversation_id]:
                 self.active_connections[conversation_id].remove(websocket)
@@ -671,25 +1640,555 @@ class ConnectionManager:
             if not self.active_connections[conversation_id]:
                 del self.active_connections[conversation_id]
 
+    def outbox(self, websocket: WebSocket) -> Optional[Outbox]:
+        connection = self.connections.get(websocket)
+        return connection.outbox if connection is not None else None
+
+    def framing(self, websocket: WebSocket) -> Framing:
+        connection = self.connections.get(websocket)
+        return connection.framing if connection is not None else JSON_FRAMING
+
+    def touch(self, websocket: WebSocket):
+        """Record that the client is alive."""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+
+    async def _close(self, websocket: WebSocket, code: int, reason: str):
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self.disconnect(websocket, connection.conversation_id)
+        try:
+            await websocket.close(code=code, reason=reason)
+        except Exception:
+            pass  # Already closed by the client
+
+    async def reap(self):
+        """Ping live connections and close the idle and expired ones."""
+        now = time.monotonic()
+        self.parked.prune(now)
+        for connection in list(self.connections.values()):
+            if now - connection.connected_at > self.max_lifetime:
+                ws_closed.labels("lifetime").inc()
+                await self._close(connection.websocket, 1001, "Connection lifetime exceeded")
+            elif now - connection.last_seen > self.idle_timeout:
+                ws_closed.labels("idle").inc()
+                await self._close(connection.websocket, 1001, "Idle timeout")
+            else:
+                try:
+                    await send_encoded(connection.websocket, connection.framing,
+                                       connection.framing.encode(PING_FRAME))
+                except Exception:
+                    ws_closed.labels("send_failed").inc()
+                    await self._close(connection.websocket, 1011, "Ping failed")
+
+    def ensure_reaper(self):
+        """Run the reaper on the current loop, restarting it if the loop changed."""
+        loop = asyncio.get_running_loop()
+        if self._reaper_loop is loop and self._reaper is not None and not self._reaper.done():
+            return
+        self._reaper_loop = loop
+        self._reaper = loop.create_task(self._run_reaper())
+
+    def stop_reaper(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        self._reaper = None
+        self._reaper_loop = None
+
+    async def _run_reaper(self):
+        while True:
+            await asyncio.sleep(min(self.ping_interval, self.idle_timeout))
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.exception("WebSocket reaper failed: %s", e)
+
     async def send_message(self, message: dict, conversation_id: str):
-        if conversation_id in self.active_connections:
-            for connection in self.active_connections[conversation_id]:
-                await connection.send_json(message)
+        body = json.dumps(message)
+        for target in list(self.active_connections.get(conversation_id, [])):
+            await send_raw(target, body)
 
     async def broadcast(self, message: dict):
         # Send to all connected clients across all conversations
-        for connections in self.active_connections.values():
-            for connection in connections:
-                await connection.send_json(message)
+        body = json.dumps(message)
+        for targets in list(self.active_connections.values()):
+            for target in list(targets):
+                await send_raw(target, body)
 
 
 # Create connection manager instance
-manager = ConnectionManager()
+manager = ConnectionManager(
+    max_connections=int(os.environ.get("WS_MAX_CONNECTIONS", 10000)),
+    max_per_conversation=int(os.environ.get("WS_MAX_PER_CONVERSATION", 5)),
+    ping_interval=float(os.environ.get("WS_PING_INTERVAL", 30)),
+    idle_timeout=float(os.environ.get("WS_IDLE_TIMEOUT", 300)),
+    max_lifetime=float(os.environ.get("WS_MAX_LIFETIME", 4 * 3600)),
+)
+
+metrics.register(GaugeFunc(
+    "websocket_connections", "Open WebSocket connections", lambda: len(manager.connections)))
+metrics.register(GaugeFunc(
+    "websocket_connections_limit", "Most WebSocket connections this process accepts",
+    lambda: manager.max_connections))
+metrics.register(GaugeFunc(
+    "websocket_connections_per_conversation_limit", "Most WebSocket connections per conversation",
+    lambda: manager.max_per_conversation))
+metrics.register(GaugeFunc(
+    "websocket_conversations", "Conversations with at least one open WebSocket",
+    lambda: len(manager.active_connections)))
+metrics.register(GaugeFunc(
+    "websocket_messages_per_second", "WebSocket frames received and sent per second over the last minute",
+    RateMeter(ws_messages.total)))
+metrics.register(GaugeFunc(
+    "greeting_queue_depth", "Greetings waiting for a worker", lambda: greeting_pool.queue_depth))
+metrics.register(GaugeFunc(
+    "greeting_in_flight", "Greetings being sent", lambda: greeting_pool.in_flight))
+metrics.register(GaugeFunc(
+    "enrichment_queue_depth", "Responses waiting for enrichment", lambda: enrichment.queue_depth))
+
+metrics.register(GaugeFunc(
+    "websocket_observers", "Open observer WebSockets", lambda: len(observers.observers)))
+metrics.register(CounterFunc(
+    "websocket_observer_dropped_total", "Events dropped because an observer fell behind",
+    lambda: observers.dropped))
+metrics.register(GaugeFunc(
+    "websocket_sessions", "Open WebSocket sessions", lambda: len(sessions)))
+metrics.register(GaugeFunc(
+    "admission_in_flight", "Requests holding an admission slot", lambda: admission.in_flight))
+
+# Admission control state
+
+
+@app.get("/debug/admission")
+async def get_admission_state():
+    """Slots in use and requests waiting, per admission class."""
+    return admission.snapshot()
+
+# Event loop lag and the call sites that blocked it
+
+
+@app.get("/debug/event-loop")
+async def get_event_loop_report(top: int = Query(10, ge=1, le=100)):
+    """Lag percentiles and the call sites that blocked the event loop the longest."""
+    watchdog.ensure_started()
+    return watchdog.report(top)
+
+# Prometheus metrics
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Expose the collected metrics in the Prometheus text format."""
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+async def send_initial_state(websocket: WebSocket, conversation_id: str) -> Optional[Tuple[Dict, Dict, Dict]]:
+    """
+    Load the conversation one lookup at a time and send the state, history
+    and (for a survey in progress) resumed frames. Returns the conversation,
+    customer and survey, or None if the conversation could not be loaded and
+    the connection was closed.
+    """
+    # Get conversation state
+    conversation = None
+    try:
+        conversation = with_retry(
+            db.get_conversation_state, conversation_id)
+        if not conversation:
+            await send_frame(websocket, ErrorFrame(
+                message=f"Conversation with ID {conversation_id} not found"
+            ))
+            await websocket.close()
+            return None
+    except ConnectionError:
+        await send_frame(websocket, ErrorFrame(
+            message="Database service is currently unavailable. Please try again later."
+        ))
+        await websocket.close()
+        return None
+
+    # Get customer and survey information
+    customer = None
+    survey = None
+    survey_payload = None
+
+    if conversation and "customer_id" in conversation:
+        customer = with_retry(db.get_customer_info,
+                              conversation["customer_id"])
+        if not customer:
+            await send_frame(websocket, ErrorFrame(
+                message=f"Customer with ID {conversation['customer_id']} not found"
+            ))
+            await websocket.close()
+            return None
+
+    if conversation and "survey_id" in conversation:
+        survey_id = conversation["survey_id"]
+        survey_payload = survey_cache.get_or_load(
+            ("survey", survey_id), lambda: with_retry(db.get_survey_by_id, survey_id))
+        if not survey_payload:
+            await send_frame(websocket, ErrorFrame(
+                message=f"Survey with ID {conversation['survey_id']} not found"
+            ))
+            await websocket.close()
+            return None
+        survey = survey_payload.value
+
+    # Send initial state to the client, reusing the pre-encoded survey
+    await send_raw(websocket, splice_json_object({
+        "type": encode_json("state"),
+        "conversation": encode_model(conversation_adapter, conversation),
+        "customer": encode_model(customer_adapter, customer) if customer else encode_json(None),
+        "survey": survey_payload.body if survey_payload else encode_json(None)
+    }))
+
+    # Send message history
+    messages = with_retry(db.get_conversation_messages, conversation_id)
+    await send_frame(websocket, HistoryFrame(messages=messages))
+
+    # Notify if this is a resumed conversation
+    if conversation and conversation.get("current_question_index", 0) > 0:
+        current_question_idx = conversation["current_question_index"]
+        if survey and "questions" in survey and current_question_idx < len(survey["questions"]):
+            current_question = survey["questions"][current_question_idx]
+            if customer and "name" in customer:
+                resume_message = format_bot_message(
+                    customer["name"], current_question)
+                await send_frame(websocket, ResumedFrame(
+                    currentQuestion=current_question,
+                    message=resume_message
+                ))
+    return conversation, customer, survey
+
+
+async def send_bootstrap(websocket: WebSocket, conversation_id: str,
+                         first_paint: bool = False) -> Optional[Tuple[Dict, Dict, Dict]]:
+    """
+    Load the conversation with its lookups running concurrently and send it
+    as one bootstrap frame. With `first_paint` the frame is sent as soon as
+    the current question is known and the history follows in its own frame.
+    Returns the conversation, customer and survey, or None if the
+    conversation could not be loaded and the connection was closed.
+    """
+    # The history only needs the conversation ID, so it loads alongside everything else
+    messages = asyncio.ensure_future(run_in_threadpool(
+        with_retry, db.get_conversation_messages, conversation_id))
+    try:
+        try:
+            conversation = await run_in_threadpool(with_retry, db.get_conversation_state, conversation_id)
+        except ConnectionError:
+            await send_frame(websocket, ErrorFrame(
+                message="Database service is currently unavailable. Please try again later."
+            ))
+            await websocket.close()
+            return None
+        if not conversation:
+            await send_frame(websocket, ErrorFrame(
+                message=f"Conversation with ID {conversation_id} not found"
+            ))
+            await websocket.close()
+            return None
+
+        survey_id = conversation["survey_id"]
+        customer, survey_payload = await asyncio.gather(
+            run_in_threadpool(with_retry, db.get_customer_info, conversation["customer_id"]),
+            run_in_threadpool(survey_cache.get_or_load, ("survey", survey_id),
+                              lambda: with_retry(db.get_survey_by_id, survey_id)))
+        if not customer:
+            await send_frame(websocket, ErrorFrame(
+                message=f"Customer with ID {conversation['customer_id']} not found"
+            ))
+            await websocket.close()
+            return None
+        if not survey_payload:
+            await send_frame(websocket, ErrorFrame(
+                message=f"Survey with ID {survey_id} not found"
+            ))
+            await websocket.close()
+            return None
+
+        questions = survey_payload.value.get("questions", [])
+        question_index = conversation.get("current_question_index", 0)
+        current_question = questions[question_index] if question_index < len(questions) else None
+        fields = {
+            "type": encode_json("bootstrap"),
+            "conversation": encode_model(conversation_adapter, conversation),
+            "customer": encode_model(customer_adapter, customer),
+            "survey": survey_payload.body,
+            "current_question": encode_json(current_question),
+        }
+        if question_index > 0 and current_question and "name" in customer:
+            fields["resume_message"] = encode_json(format_bot_message(customer["name"], current_question))
+
+        if first_paint:
+            fields["messages_pending"] = encode_json(True)
+            await send_raw(websocket, splice_json_object(fields))
+            await send_frame(websocket, HistoryFrame(messages=await messages))
+        else:
+            fields["messages"] = encode_model(message_list_adapter, await messages)
+            await send_raw(websocket, splice_json_object(fields))
+        return conversation, customer, survey_payload.value
+    finally:
+        messages.cancel()
+
+
+async def handle_turn(websocket: WebSocket, conversation_id: str, session: SessionContext, data: str,
+                      send_timing: bool = False):
+    """
+    Process one client message for a conversation: an answer, or a
+    reconnection confirmation. Errors are reported to the client in error
+    frames. The connection is closed if the answer completed the survey.
+    """
+    turn_started = time.perf_counter()
+    turn = ExitStack()
+    turn.enter_context(
+        trace("ws.turn", conversation_id=conversation_id, timing=send_timing))
+    try:
+        # Survey turns share the "turn" admission class with REST answers
+        try:
+            await admission.acquire("turn")
+        except Rejected:
+            await send_frame(websocket, ErrorFrame(
+                message="Server is busy. Please send your answer again shortly."
+            ))
+            return
+        turn.callback(admission.release, "turn")
+
+        # Reconnection confirmation handler here
+        try:
+            message_data = json.loads(data)
+            if message_data.get('type') == 'reconnect_confirm':
+                await send_frame(websocket, ReconnectSuccessFrame(
+                    message="Reconnection successful"
+                ))
+                return
+        except json.JSONDecodeError:
+            pass
+
+        # Parse the message
+        message_data = json.loads(data)
+        content = message_data.get("content", "")
+
+        # An answer with a message_id is processed once; a resend gets
+        # the frames the first one produced
+        message_id = message_data.get("message_id")
+        if message_id is not None:
+            idempotency_key = ("ws", conversation_id, str(message_id))
+            state, frames = idempotency.reserve(idempotency_key, fingerprint(content))
+            if state == DONE:
+                for frame in frames:
+                    await send_raw(websocket, frame)
+                return
+            if state == PENDING:
+                await send_frame(websocket, ErrorFrame(
+                    message=f"Message {message_id} is still being processed"
+                ))
+                return
+            if state == MISMATCH:
+                await send_frame(websocket, ErrorFrame(
+                    message=f"Message ID {message_id} was already used for a different message"
+                ))
+                return
+            turn.callback(finish_idempotent_message, idempotency_key,
+                          turn.enter_context(recording()))
+
+        # Add user message to conversation
+        success = with_retry(
+            db.add_message_to_conversation, conversation_id, "USER", content
+        )
+
+        if not success:
+            await send_frame(websocket, ErrorFrame(
+                message="Failed to process message"
+            ))
+            return
+
+        # Get the conversation before processing
+        conversation = session.conversation
+
+        # Process the message only if conversation is valid
+        if conversation:
+            await process_websocket_message(websocket, conversation_id, content, conversation,
+                                            session=session)
+        else:
+            await send_frame(websocket, ErrorFrame(
+                message="Conversation state could not be retrieved"
+            ))
+            return
+
+        # The survey was completed and the connection closed
+        if websocket.application_state == WebSocketState.DISCONNECTED:
+            return
+
+        # Get updated conversation state after processing
+        conversation = session.conversation
+
+        # Check if survey is completed
+        if conversation and conversation.get("status") == "completed":
+            await send_frame(websocket, CompletedFrame(
+                message="Survey completed. Thank you for your participation!"
+            ))
+
+    except json.JSONDecodeError:
+        await send_frame(websocket, ErrorFrame(
+            message="Invalid message format. Expected JSON."
+        ))
+    except Exception as e:
+        # The turn may have changed the session's copy without saving it
+        session.invalidate("conversation")
+        await send_frame(websocket, ErrorFrame(
+            message=f"An error occurred: {str(e)}"
+        ))
+    finally:
+        turn.close()
+        turn_latency.labels("ws").observe(
+            time.perf_counter() - turn_started)
+
+
+
+def close_mux_channel(channel: MuxChannel):
+    if channel.session is not None:
+        sessions.close(channel.session)
+
+
+# Multiplexed WebSocket carrying many conversations on one connection. It is
+# declared before /ws/{conversation_id}, which would otherwise match it.
+@app.websocket("/ws/mux")
+async def websocket_mux_endpoint(websocket: WebSocket):
+    # Every conversation's frames go out in the framing negotiated for the socket
+    framing = negotiate(websocket.scope.get("subprotocols", []))
+    if not await manager.connect(websocket, None, framing=framing):
+        return
+    send_timing = websocket.query_params.get("timing") in ("1", "true")
+
+    async def send(frame: str):
+        await send_encoded(websocket, framing, framing.encode(frame))
+
+    async def start(channel: MuxChannel, options: Dict[str, Any]):
+        # Runs in the conversation's own task, like a single-conversation socket
+        set_conversation_id(channel.conversation_id)
+        if options.get("bootstrap") in (True, "1", "true", "first_paint"):
+            loaded = await send_bootstrap(channel, channel.conversation_id,
+                                          first_paint=options["bootstrap"] == "first_paint")
+        else:
+            loaded = await send_initial_state(channel, channel.conversation_id)
+        if loaded:
+            channel.session = sessions.open(channel.conversation_id, SESSION_LOADERS)
+            channel.session.seed(*loaded)
+            bind_session(channel.session)
+
+    async def handle(channel: MuxChannel, data: str):
+        await handle_turn(channel, channel.conversation_id, channel.session, data, send_timing)
+
+    def send_error(conversation_id: Optional[str], message: str):
+        body = ErrorFrame(message=message).model_dump_json(exclude_none=True)
+        mux.send_control(tag_frame(conversation_id, body) if conversation_id else body)
+
+    mux = Multiplexer(send, start, handle, on_close=close_mux_channel,
+                      max_channels=int(os.environ.get("WS_MUX_MAX_CONVERSATIONS", 1000)))
+    writer = asyncio.ensure_future(mux.run_writer())
+    try:
+        while not writer.done():
+            data = await websocket.receive_text()
+            ws_messages.labels("in").inc()
+            manager.touch(websocket)
+            if is_pong(data):
+                continue
+            try:
+                message = json.loads(data)
+                conversation_id = message.get("conversation_id")
+            except (ValueError, AttributeError):
+                send_error(None, "Invalid message format. Expected JSON.")
+                continue
+            if not isinstance(conversation_id, str) or not conversation_id:
+                send_error(None, "Every message needs a conversation_id")
+                continue
+
+            message_type = message.get("type")
+            if message_type == "subscribe":
+                if conversation_id in mux.channels:
+                    send_error(conversation_id, "Already subscribed")
+                elif len(mux.channels) >= mux.max_channels:
+                    send_error(conversation_id, "Too many conversations on this connection")
+                else:
+                    mux.open(conversation_id, message)
+            elif message_type == "unsubscribe":
+                await mux.unsubscribe(conversation_id)
+            else:
+                channel = mux.channels.get(conversation_id)
+                if channel is None:
+                    send_error(conversation_id, "Not subscribed to this conversation")
+                elif not channel.deliver(data):
+                    ws_mux_busy.inc()
+                    send_error(conversation_id, "Too many messages waiting for this conversation. "
+                                                "Please send your answer again shortly.")
+
+    except WebSocketDisconnect:
+        logger.debug("Multiplexed client disconnected")
+    except Exception as e:
+        logger.warning("Multiplexed WebSocket error: %s", e)
+    finally:
+        writer.cancel()
+        await mux.aclose()
+        manager.disconnect(websocket, None)
+
+
+# Read-only WebSocket for supervisors and dashboards. Like /ws/mux it is
+# declared before /ws/{conversation_id}.
+@app.websocket("/ws/observe")
+async def websocket_observe_endpoint(websocket: WebSocket):
+    framing = negotiate(websocket.scope.get("subprotocols", []))
+    if not await manager.connect(websocket, None, framing=framing):
+        return
+
+    async def send(frame: str):
+        await send_encoded(websocket, framing, framing.encode(frame))
+
+    observer = Observer(send)
+    observers.attach(observer)
+    for conversation_id in websocket.query_params.getlist("conversation_id"):
+        observers.watch(observer, conversation_id=conversation_id)
+    for survey_id in websocket.query_params.getlist("survey_id"):
+        observers.watch(observer, survey_id=survey_id)
+    sender = asyncio.ensure_future(observer.run())
+    try:
+        while not sender.done():
+            data = await websocket.receive_text()
+            ws_messages.labels("in").inc()
+            manager.touch(websocket)
+            if is_pong(data):
+                continue
+            try:
+                message = json.loads(data)
+                message_type = message.get("type")
+            except (ValueError, AttributeError):
+                message, message_type = None, None
+            if message_type in ("subscribe", "unsubscribe"):
+                change = observers.watch if message_type == "subscribe" else observers.unwatch
+                change(observer, conversation_id=message.get("conversation_id"),
+                       survey_id=message.get("survey_id"))
+            else:
+                await send(ErrorFrame(
+                    message="Observers can only subscribe and unsubscribe"
+                ).model_dump_json(exclude_none=True))
+
+    except WebSocketDisconnect:
+        logger.debug("Observer disconnected")
+    except Exception as e:
+        logger.warning("Observer WebSocket error: %s", e)
+    finally:
+        sender.cancel()
+        observers.detach(observer)
+        manager.disconnect(websocket, None)
 
 
 # WebSocket endpoint for real-time survey communication
 @app.websocket("/ws/{conversation_id}")
 async def websocket_endpoint(websocket: WebSocket, conversation_id: str):
+    # Each connection runs in its own task, so this context needs no reset
+    set_conversation_id(conversation_id)
+    session: Optional[SessionContext] = None
     try:
         # Add this reconnection detection code here
         reconnection_attempt = False
@@ -697,191 +2196,105 @@ async def websocket_endpoint(websocket: WebSocket, conversation_id: str):
             query_string = websocket.scope['query_string'].decode('utf-8')
             if 'reconnect=true' in query_string:
                 reconnection_attempt = True
-                print(
-                    f"Reconnection attempt for conversation {conversation_id}")
-
-        # Accept the connection
-        await manager.connect(websocket, conversation_id)
-
-        # Get conversation state
-        conversation = None
-        try:
-            conversation = with_retry(
-                db.get_conversation_state, conversation_id)
-            if not conversation:
-                await websocket.send_json({
-                    "type": "error",
-                    "message": f"Conversation with ID {conversation_id} not found"
-                })
-                await websocket.close()
-                return
-        except ConnectionError:
-            await websocket.send_json({
-                "type": "error",
-                "message": "Database service is currently unavailable. Please try again later."
-            })
-            await websocket.close()
+                logger.info("Reconnection attempt")
+        # ?timing=1 adds span timings to the frames sent during each turn
+        send_timing = websocket.query_params.get("timing") in ("1", "true")
+
+        # With ?ack=1 frames carry a seq and the client acknowledges them. A
+        # reconnecting client passes the last seq it saw and gets the frames
+        # it missed from its previous connection.
+        outbox = None
+        if websocket.query_params.get("ack") in ("1", "true"):
+            last_seq = websocket.query_params.get("last_seq", "")
+            last_seq = int(last_seq) if last_seq.isdigit() else 0
+            outbox = manager.parked.take(conversation_id, time.monotonic()) or Outbox(start=last_seq)
+            outbox.ack(last_seq)
+
+        # The client may offer the survey.zlib or survey.msgpack subprotocol
+        # to get large frames compressed or every frame in binary
+        framing = negotiate(websocket.scope.get("subprotocols", []))
+
+        # Accept the connection, unless this process is at its limit
+        if not await manager.connect(websocket, conversation_id, outbox=outbox, framing=framing):
             return
-
-        # Get customer and survey information
-        customer = None
-        survey = None
-
-        if conversation and "customer_id" in conversation:
-            customer = with_retry(db.get_customer_info,
-                                  conversation["customer_id"])
-            if not customer:
-                await websocket.send_json({
-                    "type": "error",
-                    "message": f"Customer with ID {conversation['customer_id']} not found"
-                })
-                await websocket.close()
-                return
-
-        if conversation and "survey_id" in conversation:
-            survey = with_retry(db.get_survey_by_id, conversation["survey_id"])
-            if not survey:
-                await websocket.send_json({
-                    "type": "error",
-                    "message": f"Survey with ID {conversation['survey_id']} not found"
-                })
-                await websocket.close()
-                return
-
-        # Send initial state to the client
-        await websocket.send_json({
-            "type": "state",
-            "conversation": conversation,
-            "customer": customer,
-            "survey": survey
-        })
-
-        # Send message history
-        messages = with_retry(db.get_conversation_messages, conversation_id)
-        await websocket.send_json({
-            "type": "history",
-            "messages": messages
-        })
-
-        # Notify if this is a resumed conversation
-        if conversation and conversation.get("current_question_index", 0) > 0:
-            current_question_idx = conversation["current_question_index"]
-            if survey and "questions" in survey and current_question_idx < len(survey["questions"]):
-                current_question = survey["questions"][current_question_idx]
-                if customer and "name" in customer:
-                    resume_message = format_bot_message(
-                        customer["name"], current_question)
-                    await websocket.send_json({
-                        "type": "resumed",
-                        "currentQuestion": current_question,
-                        "message": resume_message
-                    })
+        if outbox is not None:
+            for frame in outbox.unacked():
+                await send_encoded(websocket, framing, framing.encode(frame))
+
+        # ?bootstrap=1 loads the conversation concurrently and sends it as a
+        # single frame; ?bootstrap=first_paint sends the history separately
+        bootstrap = websocket.query_params.get("bootstrap")
+        if bootstrap in ("1", "true", "first_paint"):
+            loaded = await send_bootstrap(websocket, conversation_id, first_paint=bootstrap == "first_paint")
+        else:
+            loaded = await send_initial_state(websocket, conversation_id)
+        if not loaded:
+            return
+        # Later turns read the conversation, customer and survey from the
+        # session; only writes go to the store
+        session = sessions.open(conversation_id, SESSION_LOADERS)
+        session.seed(*loaded)
+        bind_session(session)
 
         # Listen for messages from the client
         while True:
             # Wait for message from client
             data = await websocket.receive_text()
-            try:
-                # Reconnection confirmation handler here
-                try:
-                    message_data = json.loads(data)
-                    if message_data.get('type') == 'reconnect_confirm':
-                        await websocket.send_json({
-                            "type": "reconnect_success",
-                            "message": "Reconnection successful"
-                        })
-                        continue
-                except json.JSONDecodeError:
-                    pass
-
-                # Parse the message
-                message_data = json.loads(data)
-                content = message_data.get("content", "")
-
-                # Add user message to conversation
-                success = with_retry(
-                    db.add_message_to_conversation, conversation_id, "USER", content
-                )
-
-                if not success:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": "Failed to process message"
-                    })
-                    continue
-
-                # Get updated conversation before processing
-                conversation = with_retry(
-                    db.get_conversation_state, conversation_id)
-
-                # Process the message only if conversation is valid
-                if conversation:
-                    await process_websocket_message(websocket, conversation_id, content, conversation)
-                else:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": "Conversation state could not be retrieved"
-                    })
-                    continue
-
-                # Get updated conversation state after processing
-                conversation = with_retry(
-                    db.get_conversation_state, conversation_id)
-
-                # Check if survey is completed
-                if conversation and conversation.get("status") == "completed":
-                    await websocket.send_json({
-                        "type": "completed",
-                        "message": "Survey completed. Thank you for your participation!"
-                    })
-
-            except json.JSONDecodeError:
-                await websocket.send_json({
-                    "type": "error",
-                    "message": "Invalid message format. Expected JSON."
-                })
-            except Exception as e:
-                await websocket.send_json({
-                    "type": "error",
-                    "message": f"An error occurred: {str(e)}"
-                })
+            ws_messages.labels("in").inc()
+            manager.touch(websocket)
+            if is_pong(data):
+                continue
+            seq = parse_ack(data)
+            if seq is not None:
+                if outbox is not None:
+                    outbox.ack(seq)
+                continue
+            await handle_turn(websocket, conversation_id, session, data, send_timing)
+            # The survey was completed and the connection closed
+            if websocket.application_state == WebSocketState.DISCONNECTED:
+                return
 
     except WebSocketDisconnect:
         # Handle disconnection
-        manager.disconnect(websocket, conversation_id)
-        print(f"Client disconnected from conversation {conversation_id}")
+        logger.debug("Client disconnected")
     except Exception as e:
         # Handle any other exceptions
-        print(f"WebSocket error: {str(e)}")
-        try:
-            manager.disconnect(websocket, conversation_id)
-        except:
-            pass  # Already disconnected or other error
+        logger.warning("WebSocket error: %s", e)
+        # Don't leave the client waiting on a connection nothing serves
+        if websocket.application_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.close(code=1011, reason="Internal error")
+            except Exception:
+                pass  # Already closed by the client
+    finally:
+        # Also covers the early returns after the connection was accepted
+        manager.disconnect(websocket, conversation_id)
+        if session is not None:
+            sessions.close(session)
 
 
 # Helper function to process WebSocket messages
-async def process_websocket_message(websocket: WebSocket, conversation_id: str, content: str, conv: Dict[str, Any]):
+async def process_websocket_message(websocket: WebSocket, conversation_id: str, content: str, conv: Dict[str, Any],
+                                    session: Optional[SessionContext] = None):
     try:
-        # Get customer information
+        # Get customer information, from the connection's session when it has one
         customer = None
         survey = None
 
         if "customer_id" in conv:
-            customer = with_retry(db.get_customer_info, conv["customer_id"])
+            customer = session.customer if session else with_retry(db.get_customer_info, conv["customer_id"])
             if not customer:
-                await websocket.send_json({
-                    "type": "error",
-                    "message": f"Customer information not found"
-                })
+                await send_frame(websocket, ErrorFrame(
+                    message=f"Customer information not found"
+                ))
                 return
 
         if "survey_id" in conv:
-            survey = with_retry(db.get_survey_by_id, conv["survey_id"])
+            survey = session.survey if session else with_retry(db.get_survey_by_id, conv["survey_id"])
             if not survey:
-                await websocket.send_json({
-                    "type": "error",
-                    "message": f"Survey information not found"
-                })
+                await send_frame(websocket, ErrorFrame(
+                    message=f"Survey information not found"
+                ))
                 return
 
         # Check if we're awaiting detailed feedback
@@ -902,12 +2315,11 @@ async def process_websocket_message(websocket: WebSocket, conversation_id: str,
                        conversation_id, "BOT",      completion_message)
 
             # Send completion message to client
-            await websocket.send_json({
-                "type": "message",
-                "sender": "BOT",
-                "content": completion_message,
-                "timestamp": datetime.now().isoformat()
-            })
+            await send_frame(websocket, MessageFrame(
+                sender="BOT",
+                content=completion_message,
+                timestamp=datetime.now().isoformat()
+            ))
 
             # Mark survey as completed
             conv["status"] = "completed"
@@ -924,29 +2336,24 @@ async def process_websocket_message(websocket: WebSocket, conversation_id: str,
             with_retry(db.save_survey_response, survey_response)
 
             # Notify completion and that connection will close
-            await websocket.send_json({
-                "type": "completed",
-                "message": "Survey completed. Thank you for your        participation!",
-                "close_connection": True,
-                "close_code": 1000,
-                "close_reason": "Survey completed successfully"
-            })
-
-            # Wait a short time to ensure the client receives the messages
-            await asyncio.sleep(0.5)
-
-            # Close the connection gracefully
-            await websocket.close(code=1000, reason="Survey completed       successfully")
+            await send_frame(websocket, CompletedFrame(
+                message="Survey completed. Thank you for your        participation!",
+                close_connection=True,
+                close_code=1000,
+                close_reason="Survey completed successfully"
+            ))
+
+            # Close the connection as soon as the client has the final frames
+            await close_when_delivered(websocket, 1000, "Survey completed successfully")
             return
 
         # Save the user's answer
         current_question_idx = conv.get("current_question_index", 0)
 
         if not survey or "questions" not in survey or current_question_idx >= len(survey["questions"]):
-            await websocket.send_json({
-                "type": "error",
-                "message": "Invalid survey state"
-            })
+            await send_frame(websocket, ErrorFrame(
+                message="Invalid survey state"
+            ))
             return
 
         current_question = survey["questions"][current_question_idx]
@@ -955,10 +2362,9 @@ async def process_websocket_message(websocket: WebSocket, conversation_id: str,
         if "id" in current_question:
             conv["answers"][current_question["id"]] = content
         else:
-            await websocket.send_json({
-                "type": "error",
-                "message": "Invalid question format"
-            })
+            await send_frame(websocket, ErrorFrame(
+                message="Invalid question format"
+            ))
             return
 
         # Handle feedback question specifically
@@ -975,12 +2381,11 @@ async def process_websocket_message(websocket: WebSocket, conversation_id: str,
                            conversation_id, "BOT", feedback_message)
 
                 # Send message to client
-                await websocket.send_json({
-                    "type": "message",
-                    "sender": "BOT",
-                    "content": feedback_message,
-                    "timestamp": datetime.now().isoformat()
-                })
+                await send_frame(websocket, MessageFrame(
+                    sender="BOT",
+                    content=feedback_message,
+                    timestamp=datetime.now().isoformat()
+                ))
 
                 # Set awaiting feedback state
                 conv["awaiting_detailed_feedback"] = True
@@ -1016,27 +2421,22 @@ async def process_websocket_message(websocket: WebSocket, conversation_id: str,
                        conversation_id, "BOT",      completion_message)
 
             # Send message to client
-            await websocket.send_json({
-                "type": "message",
-                "sender": "BOT",
-                "content": completion_message,
-                "timestamp": datetime.now().isoformat()
-            })
+            await send_frame(websocket, MessageFrame(
+                sender="BOT",
+                content=completion_message,
+                timestamp=datetime.now().isoformat()
+            ))
 
             # Notify completion and that connection will close
-            await websocket.send_json({
-                "type": "completed",
-                "message": "Survey completed. Thank you for your        participation!",
-                "close_connection": True,
-                "close_code": 1000,
-                "close_reason": "Survey completed successfully"
-            })
-
-            # Wait a short time to ensure the client receives the messages
-            await asyncio.sleep(0.5)
-
-            # Close the connection gracefully
-            await websocket.close(code=1000, reason="Survey completed       successfully")
+            await send_frame(websocket, CompletedFrame(
+                message="Survey completed. Thank you for your        participation!",
+                close_connection=True,
+                close_code=1000,
+                close_reason="Survey completed successfully"
+            ))
+
+            # Close the connection as soon as the client has the final frames
+            await close_when_delivered(websocket, 1000, "Survey completed successfully")
             return
 
         # Move to the next question
@@ -1061,12 +2461,11 @@ async def process_websocket_message(websocket: WebSocket, conversation_id: str,
                            conversation_id, "BOT", ack_message)
 
                 # Send message to client
-                await websocket.send_json({
-                    "type": "message",
-                    "sender": "BOT",
-                    "content": ack_message,
-                    "timestamp": datetime.now().isoformat()
-                })
+                await send_frame(websocket, MessageFrame(
+                    sender="BOT",
+                    content=ack_message,
+                    timestamp=datetime.now().isoformat()
+                ))
                 return
 
         # For other questions or if flavor not found, send the next question
@@ -1083,28 +2482,29 @@ async def process_websocket_message(websocket: WebSocket, conversation_id: str,
                        conversation_id, "BOT", next_message)
 
             # Send message to client
-            await websocket.send_json({
-                "type": "message",
-                "sender": "BOT",
-                "content": next_message,
-                "timestamp": datetime.now().isoformat()
-            })
+            await send_frame(websocket, MessageFrame(
+                sender="BOT",
+                content=next_message,
+                timestamp=datetime.now().isoformat()
+            ))
         except IndexError:
-            await websocket.send_json({
-                "type": "error",
-                "message": f"No question found at index {next_question_idx}"
-            })
+            await send_frame(websocket, ErrorFrame(
+                message=f"No question found at index {next_question_idx}"
+            ))
 
     except ConnectionError:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Database service is currently unavailable. Please try again later."
-        })
+        # The answer may be applied to the session's copy but not saved
+        if session is not None:
+            session.invalidate("conversation")
+        await send_frame(websocket, ErrorFrame(
+            message="Database service is currently unavailable. Please try again later."
+        ))
     except Exception as e:
-        await websocket.send_json({
-            "type": "error",
-            "message": f"An error occurred: {str(e)}"
-        })
+        if session is not None:
+            session.invalidate("conversation")
+        await send_frame(websocket, ErrorFrame(
+            message=f"An error occurred: {str(e)}"
+        ))
 
 
 @app.websocket("/ws-test")
@@ -0,0 +1,335 @@
+import bisect
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Shards:
+    """
+    Per-thread arrays of numbers that are summed when read.
+
+    Each thread only ever writes its own array, so updates need no lock; the
+    lock is taken once per thread, when its array is registered.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._register_lock = threading.Lock()
+
+    def local(self) -> List[float]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = [0.0] * self._size
+            with self._register_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def totals(self) -> List[float]:
+        totals = [0.0] * self._size
+        for shard in list(self._shards):
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+class _CounterChild:
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount: float = 1.0):
+        self._shards.local()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._shards.totals()[0]
+
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount: float = 1.0):
+        self._shards.local()[0] -= amount
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf, then sum and count
+        self._shards = _Shards(len(buckets) + 3)
+
+    def observe(self, value: float):
+        shard = self._shards.local()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[float], float, float]:
+        """Cumulative bucket counts, sum and count."""
+        totals = self._shards.totals()
+        cumulative, running = [], 0.0
+        for count in totals[:-2]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-2], totals[-1]
+
+
+class _Timer:
+    def __init__(self, histogram: _HistogramChild):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._started)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: Any) -> Any:
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(
+                    f"{self.name} expects labels {self.labelnames}")
+            # setdefault keeps the first child if two threads race here
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _label_text(self, values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+                   for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def total(self) -> float:
+        """Sum over every label combination."""
+        return sum(child.value for child in list(self._children.values()))
+
+    def samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{self._label_text(values)} {_format(child.value)}"
+
+
+class Gauge(Counter):
+    """A gauge that is only moved up and down, so it can be sharded like a counter."""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+
+class GaugeFunc(_Metric):
+    """A gauge whose value is read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self._read = read
+        super().__init__(name, documentation)
+
+    def _new_child(self) -> None:
+        return None
+
+    def samples(self) -> Iterable[str]:
+        yield f"{self.name} {_format(self._read())}"
+
+
+class CounterFunc(GaugeFunc):
+    """A counter kept elsewhere and read from a callback at scrape time."""
+
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return self._default.time()
+
+    def samples(self) -> Iterable[str]:
+        bounds = [_format(bound) for bound in self.buckets] + ["+Inf"]
+        for values, child in list(self._children.items()):
+            cumulative, total, count = child.snapshot()
+            for bound, bucket_count in zip(bounds, cumulative):
+                yield f"{self.name}_bucket{self._label_text(values, ('le', bound))} {_format(bucket_count)}"
+            yield f"{self.name}_sum{self._label_text(values)} {_format(total)}"
+            yield f"{self.name}_count{self._label_text(values)} {_format(count)}"
+
+
+class RateMeter:
+    """Per-second rate of a counter over a sliding window of scrapes."""
+
+    def __init__(self, counter: Callable[[], float], window: float = 60.0):
+        self._counter = counter
+        self._window = window
+        self._samples: deque = deque()
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        now, total = time.monotonic(), self._counter()
+        with self._lock:
+            self._samples.append((now, total))
+            while len(self._samples) > 2 and now - self._samples[1][0] >= self._window:
+                self._samples.popleft()
+            started, first = self._samples[0]
+        return round((total - first) / (now - started), 3) if now > started else 0.0
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedRPC:
+    """
+    Proxy that times every method call on an RPC client.
+
+    Wrapped methods keep their __name__, so callers that dispatch on it
+    still work. Wrappers are created once per method and cached. `span`,
+    if given, returns a context manager to run each call in (e.g. a trace span).
+    """
+
+    def __init__(self, target: Any, latency: Histogram, errors: Counter,
+                 span: Optional[Callable[[str], ContextManager[Any]]] = None):
+        self._target = target
+        self._latency = latency
+        self._errors = errors
+        self._span = span or (lambda name: nullcontext())
+        self._wrapped: Dict[str, Callable[..., Any]] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+        attribute = getattr(self._target, name)
+        if not callable(attribute) or name.startswith("_"):
+            return attribute
+
+        latency = self._latency.labels(name)
+        errors = self._errors
+        span = self._span
+
+        @functools.wraps(attribute)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with span(name):
+                    return attribute(*args, **kwargs)
+            except Exception as e:
+                errors.labels(name, type(e).__name__).inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - started)
+
+        self._wrapped[name] = timed
+        return timed
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording HTTP request latency by route template."""
+
+    def __init__(self, app: Any, latency: Histogram):
+        self.app = app
+        self.latency = latency
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.latency.labels(scope["method"], path, status_code[0]).observe(
+                time.perf_counter() - started)
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from starlette.websockets import WebSocketState
+
+logger = logging.getLogger(__name__)
+
+
+def tag_frame(conversation_id: str, body: str) -> str:
+    """Add the conversation ID to an encoded JSON object frame."""
+    return '{"conversation_id":' + json.dumps(conversation_id) + "," + body[1:]
+
+
+class MuxChannel:
+    """
+    One conversation carried on a multiplexed WebSocket.
+
+    It has the send side of a WebSocket (send_text, send_json, close and
+    application_state), so the code that serves a single-conversation
+    socket can serve a channel unchanged. Frames sent on it are tagged with
+    the conversation ID. At most `max_pending` frames wait to be written;
+    a sender past that waits, without holding up the other channels.
+    """
+
+    def __init__(self, mux: "Multiplexer", conversation_id: str):
+        self.mux = mux
+        self.conversation_id = conversation_id
+        self.application_state = WebSocketState.CONNECTED
+        self.pending: Deque[str] = deque()
+        self.incoming: asyncio.Queue = asyncio.Queue(maxsize=mux.max_queued)
+        self.session: Any = None
+        self.worker: Optional[asyncio.Task] = None
+        self._space = asyncio.Event()
+        self._space.set()
+
+    async def send_text(self, body: str):
+        if self.application_state == WebSocketState.DISCONNECTED:
+            return  # Unsubscribed; the client no longer wants this conversation
+        while len(self.pending) >= self.mux.max_pending:
+            self._space.clear()
+            await self._space.wait()
+        self.mux.push(self, tag_frame(self.conversation_id, body))
+
+    async def send_json(self, message: Dict[str, Any]):
+        await self.send_text(json.dumps(message))
+
+    def deliver(self, data: str) -> bool:
+        """Queue a client message for this conversation; False if too many are waiting."""
+        try:
+            self.incoming.put_nowait(data)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        """End the subscription and tell the client why, in an unsubscribed frame."""
+        if self.application_state == WebSocketState.DISCONNECTED:
+            return
+        self.application_state = WebSocketState.DISCONNECTED
+        self.mux.push(self, json.dumps({
+            "conversation_id": self.conversation_id, "type": "unsubscribed", "code": code, "reason": reason}))
+        self.mux.discard(self)
+        if self.worker is not None and self.worker is not asyncio.current_task():
+            self.worker.cancel()
+
+
+class Multiplexer:
+    """
+    The conversations subscribed on one multiplexed WebSocket.
+
+    Each conversation has its own worker task, which runs `start` once and
+    then `handle` for each client message, in order. At most `max_queued`
+    messages wait per conversation. A single writer sends pending frames
+    round-robin, one frame per conversation at a time, so a busy
+    conversation cannot starve the others. Control frames go first.
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[None]],
+                 start: Callable[[MuxChannel, Dict[str, Any]], Awaitable[None]],
+                 handle: Callable[[MuxChannel, str], Awaitable[None]],
+                 on_close: Optional[Callable[[MuxChannel], None]] = None,
+                 max_channels: int = 1000, max_pending: int = 32, max_queued: int = 4):
+        self.channels: Dict[str, MuxChannel] = {}
+        self.max_channels = max_channels
+        self.max_pending = max_pending
+        self.max_queued = max_queued
+        self._send = send
+        self._start = start
+        self._handle = handle
+        self._on_close = on_close
+        self._control: Deque[str] = deque()
+        self._ready: Deque[MuxChannel] = deque()
+        self._wake = asyncio.Event()
+
+    def open(self, conversation_id: str, options: Dict[str, Any]) -> MuxChannel:
+        """Subscribe to a conversation and start its worker."""
+        channel = MuxChannel(self, conversation_id)
+        self.channels[conversation_id] = channel
+        channel.worker = asyncio.ensure_future(self._run(channel, options))
+        return channel
+
+    async def unsubscribe(self, conversation_id: str, reason: str = "Unsubscribed") -> bool:
+        channel = self.channels.get(conversation_id)
+        if channel is None:
+            return False
+        await channel.close(1000, reason)
+        return True
+
+    def discard(self, channel: MuxChannel):
+        if self.channels.get(channel.conversation_id) is channel:
+            del self.channels[channel.conversation_id]
+            if self._on_close is not None:
+                self._on_close(channel)
+
+    async def _run(self, channel: MuxChannel, options: Dict[str, Any]):
+        try:
+            await self._start(channel, options)
+            while channel.application_state == WebSocketState.CONNECTED:
+                await self._handle(channel, await channel.incoming.get())
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.exception("Multiplexed conversation failed: %s", e)
+            await channel.close(1011, "Internal error")
+        finally:
+            self.discard(channel)
+
+    def push(self, channel: MuxChannel, frame: str):
+        if not channel.pending:
+            self._ready.append(channel)
+        channel.pending.append(frame)
+        self._wake.set()
+
+    def send_control(self, frame: str):
+        """Send a frame ahead of the conversations' frames."""
+        self._control.append(frame)
+        self._wake.set()
+
+    async def run_writer(self):
+        """Write pending frames until cancelled or the socket fails."""
+        while True:
+            if self._control:
+                await self._send(self._control.popleft())
+                continue
+            if not self._ready:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            channel = self._ready.popleft()
+            frame = channel.pending.popleft()
+            if channel.pending:
+                self._ready.append(channel)
+            if len(channel.pending) < self.max_pending:
+                channel._space.set()
+            await self._send(frame)
+
+    async def aclose(self):
+        """Stop every worker; the socket is gone, so no frames are sent."""
+        for channel in list(self.channels.values()):
+            channel.application_state = WebSocketState.DISCONNECTED
+            self.discard(channel)
+            if channel.worker is not None:
+                channel.worker.cancel()
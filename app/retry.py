@@ -0,0 +1,70 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+_retrying: contextvars.ContextVar[bool] = contextvars.ContextVar("retrying", default=False)
+
+
+class RetryBudget:
+    """
+    Token bucket shared by every caller that retries RPCs.
+
+    Each call deposits `ratio` tokens and each retry withdraws one, so across
+    all callers retries stay below `ratio` of calls. `min_per_second` tokens
+    are added over time so a few retries remain possible when traffic is low.
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 1.0, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.tokens = self.max_tokens
+            self._last = time.monotonic()
+            self.calls = 0
+            self.retries = 0
+            self.exhausted = 0
+
+    def record_call(self):
+        with self._lock:
+            self.calls += 1
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take a token for one retry; False means the retry must not happen."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.max_tokens, self.tokens + (now - self._last) * self.min_per_second)
+            self._last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.retries += 1
+                return True
+            self.exhausted += 1
+            return False
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {"tokens": round(self.tokens, 3), "calls": self.calls,
+                    "retries": self.retries, "exhausted": self.exhausted}
+
+
+def in_retry_layer() -> bool:
+    """True when an enclosing layer already retries, so this one should not."""
+    return _retrying.get()
+
+
+@contextmanager
+def retry_layer() -> Iterator[None]:
+    """Mark the block as covered by a retry loop; retry loops inside it make one attempt."""
+    token = _retrying.set(True)
+    try:
+        yield
+    finally:
+        _retrying.reset(token)
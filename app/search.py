@@ -0,0 +1,148 @@
+import math
+import re
+from typing import Any, Dict, Hashable, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+
+STOPWORDS = frozenset("""
+a an and are as at be because but by for from i i'm if in is it its me my of
+on or so that the this to was were with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, stopwords included so that positions stay exact."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class InvertedIndex:
+    """
+    Incremental positional inverted index ranked with BM25.
+
+    Postings map each term to {doc_id: [positions]}. Positions make quoted
+    phrase queries possible. Documents can only be added, which matches the
+    append-only survey response store.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[Hashable, List[int]]] = {}
+        self.documents: Dict[Hashable, Dict[str, Any]] = {}
+        self.lengths: Dict[Hashable, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add(self, doc_id: Hashable, text: str, **fields: Any):
+        """Index a document; `fields` are stored and returned with search results."""
+        if doc_id in self.documents:
+            return
+        tokens = tokenize(text)
+        self.documents[doc_id] = dict(fields, text=text)
+        self.lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+        for position, token in enumerate(tokens):
+            self.postings.setdefault(token, {}).setdefault(
+                doc_id, []).append(position)
+
+    @staticmethod
+    def parse_query(query: str) -> Tuple[List[str], List[List[str]]]:
+        """Split a query into ranking terms and quoted phrases that must match."""
+        phrases = [tokenize(phrase) for phrase in PHRASE_PATTERN.findall(query)]
+        phrases = [phrase for phrase in phrases if phrase]
+        terms = [token for token in tokenize(query) if token not in STOPWORDS]
+        # A phrase made only of stopwords still needs something to rank by
+        for phrase in phrases:
+            terms.extend(token for token in phrase if token not in terms)
+        return list(dict.fromkeys(terms)), phrases
+
+    def snapshot(self, query: str) -> "SearchSnapshot":
+        """
+        Copy what a search for `query` reads: the postings of its terms and
+        the documents they point to. The copy is proportional to the matches,
+        and can be ranked while writers keep adding documents.
+        """
+        terms, phrases = self.parse_query(query)
+        postings = {term: dict(self.postings[term]) for term in terms if term in self.postings}
+        doc_ids = {doc_id for term_postings in postings.values() for doc_id in term_postings}
+        return SearchSnapshot(
+            terms, phrases, postings,
+            documents={doc_id: self.documents[doc_id] for doc_id in doc_ids},
+            lengths={doc_id: self.lengths[doc_id] for doc_id in doc_ids},
+            document_count=len(self.documents),
+            total_length=self._total_length,
+        )
+
+    def search(self, query: str, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """Return one page of documents matching the query, best first."""
+        return self.snapshot(query).search(offset, limit)
+
+
+class SearchSnapshot:
+    """The part of an index one query reads, ranked with BM25."""
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, terms: List[str], phrases: List[List[str]],
+                 postings: Dict[str, Dict[Hashable, List[int]]], documents: Dict[Hashable, Dict[str, Any]],
+                 lengths: Dict[Hashable, int], document_count: int, total_length: int):
+        self.terms = terms
+        self.phrases = phrases
+        self.postings = postings
+        self.documents = documents
+        self.lengths = lengths
+        self.document_count = document_count
+        self.total_length = total_length
+
+    def _idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (self.document_count - df + 0.5) / (df + 0.5))
+
+    def _has_phrase(self, doc_id: Hashable, phrase: List[str]) -> bool:
+        position_sets = []
+        for term in phrase:
+            positions = self.postings.get(term, {}).get(doc_id)
+            if not positions:
+                return False
+            position_sets.append(set(positions))
+        return any(
+            all(start + offset in position_sets[offset]
+                for offset in range(1, len(phrase)))
+            for start in position_sets[0]
+        )
+
+    def search(self, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """Return one page of documents matching the query, best first."""
+        if not self.terms or not self.document_count:
+            return {"total": 0, "results": []}
+
+        average_length = self.total_length / self.document_count or 1.0
+        scores: Dict[Hashable, float] = {}
+        for term in self.terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for doc_id, positions in postings.items():
+                tf = len(positions)
+                norm = self.K1 * (1 - self.B + self.B *
+                                  self.lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(
+                    doc_id, 0.0) + idf * tf * (self.K1 + 1) / (tf + norm)
+
+        if self.phrases:
+            scores = {
+                doc_id: score for doc_id, score in scores.items()
+                if all(self._has_phrase(doc_id, phrase) for phrase in self.phrases)
+            }
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], str(item[0])))
+        return {
+            "total": len(ranked),
+            "results": [
+                dict(self.documents[doc_id], score=round(score, 4))
+                for doc_id, score in ranked[offset:offset + limit]
+            ],
+        }
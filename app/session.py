@@ -0,0 +1,122 @@
+import contextvars
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set
+
+_current_session: contextvars.ContextVar[Optional["SessionContext"]] = contextvars.ContextVar(
+    "current_session", default=None)
+
+# Loads one part of a session ("conversation", "customer" or "survey") by ID
+Loader = Callable[[str], Any]
+
+PARTS = ("conversation", "customer", "survey")
+
+
+class SessionContext:
+    """
+    What one WebSocket connection knows about its conversation.
+
+    The conversation state, customer and survey are loaded once and then
+    served from memory. A part is reloaded only after a store change event
+    marked it stale. The session's own writes do not mark it stale: the
+    conversation dict it holds is the one those writes saved.
+    """
+
+    def __init__(self, conversation_id: str, loaders: Dict[str, Loader],
+                 on_reload: Optional[Callable[[str], None]] = None):
+        self.conversation_id = conversation_id
+        self._loaders = loaders
+        self._on_reload = on_reload
+        self._values: Dict[str, Any] = {}
+        self._stale: Set[str] = set(PARTS)
+
+    def seed(self, conversation: Any, customer: Any, survey: Any):
+        """Use values loaded at connect time instead of loading them again."""
+        self._values.update(conversation=conversation, customer=customer, survey=survey)
+        self._stale.clear()
+
+    def invalidate(self, part: str):
+        self._stale.add(part)
+
+    def _get(self, part: str, key: Optional[str]) -> Any:
+        if part in self._stale:
+            self._stale.discard(part)
+            if self._on_reload is not None:
+                self._on_reload(part)
+            try:
+                self._values[part] = self._loaders[part](key) if key is not None else None
+            except Exception:
+                self._stale.add(part)
+                raise
+        return self._values.get(part)
+
+    @property
+    def conversation(self) -> Optional[Dict[str, Any]]:
+        return self._get("conversation", self.conversation_id)
+
+    @property
+    def survey_id(self) -> Optional[str]:
+        conversation = self._values.get("conversation")
+        return conversation.get("survey_id") if conversation else None
+
+    @property
+    def customer(self) -> Optional[Dict[str, Any]]:
+        conversation = self.conversation
+        return self._get("customer", conversation.get("customer_id") if conversation else None)
+
+    @property
+    def survey(self) -> Optional[Dict[str, Any]]:
+        conversation = self.conversation
+        return self._get("survey", conversation.get("survey_id") if conversation else None)
+
+
+def current_session() -> Optional[SessionContext]:
+    return _current_session.get()
+
+
+def bind_session(session: Optional[SessionContext]):
+    """Attribute store writes made for the rest of the current task to a session."""
+    _current_session.set(session)
+
+
+class SessionRegistry:
+    """
+    The open sessions, by conversation, invalidated from store change events.
+    Register on_store_event() as a store listener.
+    """
+
+    def __init__(self, on_reload: Optional[Callable[[str], None]] = None):
+        self._on_reload = on_reload
+        self._sessions: Dict[str, List[SessionContext]] = {}
+        self._lock = threading.Lock()
+
+    def open(self, conversation_id: str, loaders: Dict[str, Loader]) -> SessionContext:
+        session = SessionContext(conversation_id, loaders, self._on_reload)
+        with self._lock:
+            self._sessions.setdefault(conversation_id, []).append(session)
+        return session
+
+    def close(self, session: SessionContext):
+        with self._lock:
+            sessions = self._sessions.get(session.conversation_id, [])
+            if session in sessions:
+                sessions.remove(session)
+            if not sessions:
+                self._sessions.pop(session.conversation_id, None)
+
+    def __len__(self) -> int:
+        return sum(len(sessions) for sessions in self._sessions.values())
+
+    def on_store_event(self, event: str, payload: Dict[str, Any]):
+        origin = current_session()
+        with self._lock:
+            if event == "conversation_saved":
+                affected = [(session, "conversation")
+                            for session in self._sessions.get(payload.get("conversation_id"), [])]
+            elif event == "survey_saved":
+                affected = [(session, "survey") for sessions in self._sessions.values()
+                            for session in sessions if session.survey_id == payload.get("survey_id")]
+            else:
+                return
+        for session, part in affected:
+            if session is not origin:
+                session.invalidate(part)
@@ -0,0 +1,227 @@
+import contextvars
+import functools
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+
+from fastapi.routing import APIRoute
+
+
+class Span:
+    __slots__ = ("id", "parent_id", "name", "attrs", "start", "end")
+
+    def __init__(self, name: str, parent_id: Optional[int], attrs: Dict[str, Any]):
+        self.id = 0
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+
+class Trace:
+    """
+    The spans recorded while handling one request or WebSocket turn.
+
+    Spans finished after the trace has ended (e.g. in background tasks that
+    run after the response was sent) are not recorded.
+    """
+
+    def __init__(self, name: str, **attrs: Any):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.root = Span(name, None, attrs)
+        self.spans: List[Span] = []
+        self.closed = False
+        self._ids = itertools.count(1)
+
+    def add(self, span: Span):
+        if not self.closed:
+            self.spans.append(span)
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Total milliseconds per span name, slowest first, plus the trace total.
+        Retry attempts are already counted in their RPC span and only appear
+        in exported traces.
+        """
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            if span.end is not None and "attempt" not in span.attrs:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        ordered = dict(sorted(totals.items(), key=lambda item: -item[1]))
+        ordered["total"] = self.root.duration
+        return {name: round(duration, 2) for name, duration in ordered.items()}
+
+    def server_timing(self) -> str:
+        """Render the summary as a Server-Timing header value."""
+        return ", ".join(
+            f"{name.replace('.', '_').replace(' ', '_')};dur={duration}"
+            for name, duration in self.summary().items())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "attrs": self.attrs,
+            "started_at": self.started_at,
+            "duration_ms": round(self.root.duration, 3),
+            "spans": [
+                {"id": span.id, "parent_id": span.parent_id, "name": span.name,
+                 "start_ms": round((span.start - self.root.start) * 1000, 3),
+                 "duration_ms": round(span.duration, 3), "attrs": span.attrs}
+                for span in self.spans
+            ],
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "current_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+class TraceExporter:
+    """Appends finished traces to a file as NDJSON from a background thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace):
+        self._queue.put(trace.to_dict())
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(5)
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                f.write(json.dumps(item, separators=(",", ":")) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+
+# Set TRACE_FILE to export every trace
+exporter: Optional[TraceExporter] = TraceExporter(
+    os.environ["TRACE_FILE"]) if os.environ.get("TRACE_FILE") else None
+
+
+@contextmanager
+def trace(name: str, **attrs: Any) -> Iterator[Trace]:
+    """Record spans for the duration of the block, e.g. one request or turn."""
+    current = Trace(name, **attrs)
+    trace_token = _current_trace.set(current)
+    span_token = _current_span.set(current.root)
+    try:
+        yield current
+    finally:
+        current.root.end = time.perf_counter()
+        current.closed = True
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        if exporter is not None:
+            exporter.export(current)
+
+
+@contextmanager
+def _span(current: Trace, name: str, attrs: Dict[str, Any]) -> Iterator[Span]:
+    parent = _current_span.get()
+    span = Span(name, parent.id if parent is not None and parent is not current.root else None, attrs)
+    span.id = next(current._ids)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        span.end = time.perf_counter()
+        _current_span.reset(token)
+        current.add(span)
+
+
+def span(name: str, **attrs: Any) -> ContextManager[Any]:
+    """Record a child span of the current span; a no-op outside a trace."""
+    current = _current_trace.get()
+    if current is None or current.closed:
+        return nullcontext()
+    return _span(current, name, attrs)
+
+
+def rpc_span(method: str) -> ContextManager[Any]:
+    """Span for one RPC, unless with_retry already opened one for this call."""
+    parent = _current_span.get()
+    if parent is not None and parent.attrs.get("rpc") == method:
+        return nullcontext()
+    return span(f"rpc.{method}", rpc=method)
+
+
+def traced(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator recording each call of a function as a span."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TracedRoute(APIRoute):
+    """Route class that records the endpoint itself as a "handler" span."""
+
+    def get_route_handler(self) -> Callable[..., Any]:
+        handler = super().get_route_handler()
+
+        async def traced_handler(request):
+            with span("handler", route=self.path):
+                return await handler(request)
+        return traced_handler
+
+
+class TracingMiddleware:
+    """ASGI middleware tracing each HTTP request and returning a Server-Timing header."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with trace("request", method=scope["method"], path=scope["path"]) as current:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    route = scope.get("route")
+                    if route is not None:
+                        current.attrs["route"] = route.path
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", current.server_timing().encode("latin-1"))]
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
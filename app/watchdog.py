@@ -0,0 +1,172 @@
+import asyncio
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import deque
+from types import FrameType
+from typing import Any, Callable, Dict, List, Optional
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _location(frame: FrameType) -> str:
+    filename = frame.f_code.co_filename
+    if filename.startswith(_ROOT):
+        filename = os.path.relpath(filename, _ROOT)
+    return f"{filename}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def blocking_site(frame: FrameType) -> Dict[str, Any]:
+    """
+    Describe what a blocked event loop thread is doing: the innermost
+    coroutine on the stack (the async code that made the blocking call),
+    the innermost frame (what is actually blocking) and the full stack.
+    """
+    stack: List[FrameType] = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    coroutine = next((f for f in stack if f.f_code.co_flags & inspect.CO_COROUTINE), None)
+    leaf = stack[0]
+    return {
+        "coroutine": _location(coroutine) if coroutine is not None else None,
+        "blocking_call": _location(leaf),
+        "stack": [_location(f) for f in reversed(stack)],
+    }
+
+
+class LoopWatchdog:
+    """
+    Measures event loop lag and samples the stack whenever the loop is blocked.
+
+    A heartbeat task wakes every `interval` seconds and records how late it
+    woke up. A watcher thread checks the heartbeat; when the loop has not
+    run for more than `threshold` seconds it samples the loop thread's stack
+    once per stall, and the lag of that stall is attributed to the sampled site.
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1,
+                 on_lag: Optional[Callable[[float], None]] = None,
+                 on_block: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.interval = interval
+        self.threshold = threshold
+        self._on_lag = on_lag
+        self._on_block = on_block
+        self._lags: deque = deque(maxlen=4096)
+        self.blocked = 0
+        self.sites: Dict[str, Dict[str, Any]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._last_beat = 0.0
+        self._stall_site: Optional[str] = None
+        self._sampled_beat: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def ensure_started(self):
+        """Start monitoring the running loop, restarting if it changed."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self.running:
+            return
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = loop.create_task(self._heartbeat())
+        if self._watcher is None or not self._watcher.is_alive():
+            self._watcher = threading.Thread(
+                target=self._watch, name="loop-watchdog", daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._task = None
+        self._loop = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            self._record_lag(max(0.0, now - expected))
+
+    def _record_lag(self, lag: float):
+        self._lags.append(lag)
+        if self._on_lag is not None:
+            self._on_lag(lag)
+        if lag < self.threshold:
+            return
+        with self._lock:
+            self.blocked += 1
+            site = self.sites.get(self._stall_site) if self._stall_site else None
+            if site is not None:
+                site["blocked_seconds"] += lag
+                site["max_seconds"] = max(site["max_seconds"], lag)
+            self._stall_site = None
+
+    def _watch(self):
+        while self._loop is not None and not self._loop.is_closed():
+            time.sleep(self.threshold / 2)
+            beat = self._last_beat
+            if time.monotonic() - beat < self.threshold or self._sampled_beat == beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            self._sampled_beat = beat
+            self._sample(blocking_site(frame))
+
+    def _sample(self, sample: Dict[str, Any]):
+        key = f"{sample['coroutine']} -> {sample['blocking_call']}"
+        with self._lock:
+            site = self.sites.get(key)
+            if site is None:
+                site = self.sites[key] = dict(
+                    sample, samples=0, blocked_seconds=0.0, max_seconds=0.0)
+            site["samples"] += 1
+            site["stack"] = sample["stack"]
+            self._stall_site = key
+        if self._on_block is not None:
+            self._on_block(sample)
+
+    def lag_percentiles(self) -> Dict[str, Optional[float]]:
+        lags = sorted(self._lags)
+        if not lags:
+            return {"p50": None, "p95": None, "p99": None, "max": None}
+
+        def percentile(fraction: float) -> float:
+            return round(lags[min(len(lags) - 1, int(fraction * len(lags)))], 4)
+
+        return {"p50": percentile(0.5), "p95": percentile(0.95),
+                "p99": percentile(0.99), "max": round(lags[-1], 4)}
+
+    def report(self, top: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            sites = sorted(self.sites.values(),
+                           key=lambda site: (-site["blocked_seconds"], -site["samples"]))
+            top_sites = [dict(site, blocked_seconds=round(site["blocked_seconds"], 4),
+                              max_seconds=round(site["max_seconds"], 4))
+                         for site in sites[:top]]
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "threshold_seconds": self.threshold,
+            "lag_seconds": self.lag_percentiles(),
+            "stalls": self.blocked,
+            "top_sites": top_sites,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._lags.clear()
+            self.blocked = 0
+            self.sites = {}
+            self._stall_site = None
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    A bounded pool of asyncio workers that run blocking jobs in the threadpool.
+
+    At most `size` jobs run at once and at most `max_queue` jobs wait, so
+    submit() applies backpressure to producers instead of letting the
+    backlog grow without limit. Workers are started lazily on the running
+    event loop and restarted if the pool is later used from a new loop.
+    """
+
+    def __init__(self, name: str, size: int = 16, max_queue: int = 1000):
+        self.name = name
+        self.size = size
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._queue is not None:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [
+            loop.create_task(self._worker()) for _ in range(self.size)
+        ]
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, func: Callable[..., Any], *args: Any):
+        """Queue a blocking job, waiting while the queue is full."""
+        self._ensure_started()
+        await self._queue.put((func, args))
+
+    async def _worker(self):
+        while True:
+            func, args = await self._queue.get()
+            self.in_flight += 1
+            try:
+                await run_in_threadpool(func, *args)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.exception("%s job failed: %s", self.name, e)
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+    async def join(self):
+        """Wait until every queued job has finished."""
+        if self._queue is not None:
+            await self._queue.join()
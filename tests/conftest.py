@@ -2,10 +2,14 @@ import pytest
 from unittest.mock import MagicMock, patch
 from fastapi.testclient import TestClient
 import json
+import os
 from datetime import datetime, timedelta
 
+# Simulated RPCs neither sleep nor fail unless a test switches profiles
+os.environ.setdefault("RPC_LATENCY_PROFILE", "zero")
+
 # Import the app but patch the db
-from app.main import app
+from app.main import app, survey_cache
 from app.db import MockRPCDatabase
 
 # Setup test client
@@ -68,9 +72,29 @@ def mock_db():
     db_mock.resume_conversation.return_value = test_conversation
     db_mock.get_customer_active_surveys.return_value = [test_conversation]
 
-    # Patch the database in main
+    # Patch the database in main; cached survey payloads belong to the old db
+    survey_cache.clear()
     with patch('app.main.db', db_mock):
         yield db_mock
+    survey_cache.clear()
+
+# Every test starts with a full retry budget
+
+
+@pytest.fixture(autouse=True)
+def reset_retry_budget():
+    from app.main import retry_budget
+    retry_budget.reset()
+
+# Switch the simulated RPC latency profile for one test
+
+
+@pytest.fixture
+def latency_profile():
+    from app.db import rpc_simulator, set_latency_profile
+    previous = rpc_simulator.profile, rpc_simulator.seed
+    yield set_latency_profile
+    rpc_simulator.configure(*previous)
 
 # Fixture for WebSocket testing
 
@@ -80,3 +104,20 @@ def websocket_client():
     from fastapi.testclient import TestClient
     client = TestClient(app)
     return client
+
+# Send one message over a survey WebSocket and collect the frames it
+# produced, up to the reply to a trailing reconnect confirmation
+
+
+@pytest.fixture
+def ws_turn():
+    def turn(websocket, message):
+        websocket.send_json(message)
+        websocket.send_json({"type": "reconnect_confirm"})
+        frames = []
+        while True:
+            frame = websocket.receive_json()
+            if frame["type"] == "reconnect_success":
+                return frames
+            frames.append(frame)
+    return turn
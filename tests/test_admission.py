@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.admission import AdmissionClass, AdmissionController, Rejected
+from app.main import admission, admission_class
+
+
+def controller(capacity=1, **overrides):
+    rejected = []
+    classes = [
+        AdmissionClass("turn", limit=1, priority=0, max_wait=1.0),
+        AdmissionClass("create", limit=1, priority=1, max_wait=1.0),
+        AdmissionClass("analytics", limit=1, priority=2, max_wait=0.05, retry_after=5.0),
+    ]
+    for limits in classes:
+        for key, value in overrides.get(limits.name, {}).items():
+            setattr(limits, key, value)
+    return AdmissionController(classes, capacity, on_reject=rejected.append), rejected
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_admitted_by_priority():
+    admission_controller, _ = controller()
+    await admission_controller.acquire("create")
+    order = []
+
+    async def run(name):
+        async with admission_controller.slot(name):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    waiters = [asyncio.create_task(run("create")), asyncio.create_task(run("turn"))]
+    await asyncio.sleep(0)
+    assert admission_controller.snapshot()["classes"]["turn"]["waiting"] == 1
+    admission_controller.release("create")
+    await asyncio.gather(*waiters)
+
+    assert order == ["turn", "create"]
+    assert admission_controller.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_sheds_work_that_waits_too_long():
+    admission_controller, rejected = controller()
+    await admission_controller.acquire("turn")
+
+    with pytest.raises(Rejected) as error:
+        await admission_controller.acquire("analytics")
+    assert error.value.reason == "queue_timeout"
+    assert error.value.retry_after == 5.0
+    assert rejected == [error.value]
+    assert admission_controller.class_waiting["analytics"] == 0
+
+    # The timed-out waiter does not take the slot when it frees up
+    admission_controller.release("turn")
+    assert admission_controller.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_immediately_and_class_limits_do_not_block_others():
+    admission_controller, _ = controller(capacity=2, create={"max_queue": 0})
+    await admission_controller.acquire("create")
+
+    with pytest.raises(Rejected) as error:
+        await admission_controller.acquire("create")
+    assert error.value.reason == "queue_full"
+
+    await asyncio.wait_for(admission_controller.acquire("turn"), 0.1)
+    assert admission_controller.class_in_flight == {"turn": 1, "create": 1, "analytics": 0}
+
+
+@pytest.mark.asyncio
+async def test_waiter_at_its_class_limit_does_not_hold_back_lower_priorities():
+    admission_controller, _ = controller(capacity=2)
+    await admission_controller.acquire("turn")
+    blocked = asyncio.create_task(admission_controller.acquire("turn"))
+    await asyncio.sleep(0)
+
+    await asyncio.wait_for(admission_controller.acquire("create"), 0.1)
+    assert admission_controller.class_in_flight == {"turn": 1, "create": 1, "analytics": 0}
+    blocked.cancel()
+
+
+@pytest.mark.asyncio
+async def test_slot_granted_as_the_wait_times_out_is_released(monkeypatch):
+    admission_controller, _ = controller()
+    await admission_controller.acquire("turn")
+
+    async def wait_for(future, timeout):
+        admission_controller.release("turn")  # Wakes the waiter...
+        assert future.done()
+        raise asyncio.TimeoutError  # ...just as its wait times out
+
+    monkeypatch.setattr("app.admission.asyncio.wait_for", wait_for)
+    with pytest.raises(Rejected):
+        await admission_controller.acquire("analytics")
+    assert admission_controller.in_flight == 0
+    assert admission_controller.class_in_flight["analytics"] == 0
+
+
+def test_classifies_endpoints():
+    def classify(method, path):
+        return admission_class({"method": method, "path": path})
+
+    assert classify("POST", "/conversations/abc/messages") == "turn"
+    assert classify("POST", "/conversations/abc/resume") == "turn"
+    assert classify("POST", "/conversations") == "create"
+    assert classify("POST", "/conversations:batch") == "create"
+    assert classify("GET", "/analytics") == "analytics"
+    assert classify("GET", "/surveys/s1/responses/export") == "analytics"
+    assert classify("GET", "/conversations/abc") == "read"
+    assert classify("GET", "/health") is None
+    assert classify("GET", "/metrics") is None
+
+
+@pytest.fixture
+def shed(monkeypatch):
+    """Make one admission class of the app shed everything."""
+    def shed_class(name):
+        monkeypatch.setattr(admission.classes[name], "limit", 0)
+        monkeypatch.setattr(admission.classes[name], "max_wait", 0)
+    return shed_class
+
+
+def test_shed_request_gets_429_with_retry_after(client, mock_db, shed):
+    shed("analytics")
+    response = client.get("/analytics")
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "5"
+    assert response.json()["detail"] == "Server is busy, please retry later."
+
+    # Other classes and exempt endpoints are unaffected
+    assert client.get("/conversations/test_conv").status_code == 200
+    assert client.get("/health").status_code == 200
+    assert 'admission_rejected_total{class="analytics",reason="queue_timeout"}' in client.get("/metrics").text
+
+
+def test_shed_websocket_is_closed_with_1013(client, mock_db, shed):
+    shed("read")
+    with client.websocket_connect("/ws/test_conv") as websocket:
+        with pytest.raises(WebSocketDisconnect) as error:
+            websocket.receive_json()
+    assert error.value.code == 1013
+
+
+def test_websocket_releases_its_slot_after_setup(client, mock_db):
+    with client.websocket_connect("/ws/test_conv") as websocket:
+        assert websocket.receive_json()["type"] == "state"
+        assert websocket.receive_json()["type"] == "history"
+        websocket.send_json({"content": "Option 1"})
+        websocket.receive_json()
+        assert admission.class_in_flight["read"] == 0
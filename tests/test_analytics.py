@@ -0,0 +1,160 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app.analytics import AnalyticsEngine, ResponseColumns
+
+
+def make_responses():
+    return [
+        {"seq": 1, "customer_id": "1", "completed_at": "2024-01-01T10:15:00",
+         "answers": {"q1": "1", "q2": "yes"}},
+        {"seq": 2, "customer_id": "2", "completed_at": "2024-01-01T10:45:00",
+         "answers": {"q1": "2", "q2": "no"}},
+        {"seq": 3, "customer_id": "1", "completed_at": "2024-01-01T11:05:00",
+         "answers": {"q1": "1", "q2": "no"}},
+    ]
+
+
+class FakeStore:
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+        self.fail = False
+
+    def fetch_page(self, survey_id, after_seq, limit):
+        self.calls.append(after_seq)
+        if self.fail:
+            raise ConnectionError("RPC call failed")
+        return [r for r in self.responses if r["seq"] > after_seq][:limit]
+
+
+def test_columns_grow_past_initial_capacity():
+    columns = ResponseColumns("1")
+    page = [{"seq": i + 1, "customer_id": str(i % 3), "answers": {"q1": "1"}}
+            for i in range(3000)]
+    columns.append(page)
+    assert columns.size == 3000
+    assert (columns.answers("q1") == 0).all()
+    assert columns.answers("missing").tolist() == [-1] * 3000
+
+
+def test_counts_and_filters():
+    store = FakeStore(make_responses())
+    engine = AnalyticsEngine(store.fetch_page)
+
+    result = engine.counts("1", "q1")
+    assert result["counts"] == {"1": 2, "2": 1}
+
+    result = engine.counts("1", "q1", customer_id="2")
+    assert result["counts"] == {"1": 0, "2": 1}
+
+    result = engine.counts("1", "q1", customer_id="nobody")
+    assert result["answered"] == 0
+
+    result = engine.counts("1", "q1", since=datetime(2024, 1, 1, 11))
+    assert result["counts"] == {"1": 1, "2": 0}
+
+
+def test_crosstabs():
+    engine = AnalyticsEngine(FakeStore(make_responses()).fetch_page)
+
+    by_customer = engine.crosstab("1", "q1", "customer")
+    assert by_customer["rows"] == ["1", "2"]
+    assert by_customer["counts"] == [[2, 0], [0, 1]]
+
+    by_time = engine.crosstab("1", "q1", "time", bucket_seconds=3600)
+    assert len(by_time["rows"]) == 2
+    assert by_time["counts"] == [[1, 1], [1, 0]]
+
+    by_question = engine.crosstab("1", "q2", "q1")
+    assert by_question["rows"] == ["1", "2"]
+    assert by_question["columns"] == ["yes", "no"]
+    assert by_question["counts"] == [[1, 1], [0, 1]]
+
+
+def test_columns_are_refreshed_incrementally():
+    store = FakeStore(make_responses()[:2])
+    engine = AnalyticsEngine(store.fetch_page)
+    engine.counts("1", "q1")
+    assert store.calls == [0]
+
+    # Without a change event the cached columns are reused
+    engine.counts("1", "q1")
+    assert store.calls == [0]
+
+    store.responses = make_responses()
+    engine.mark_dirty("1")
+    assert engine.counts("1", "q1")["answered"] == 3
+    assert store.calls == [0, 2]
+
+
+def test_failed_fetch_is_retried_on_next_query():
+    store = FakeStore(make_responses())
+    engine = AnalyticsEngine(store.fetch_page)
+    store.fail = True
+    with pytest.raises(ConnectionError):
+        engine.counts("1", "q1")
+
+    # The next query loads the columns instead of serving an empty cache
+    store.fail = False
+    assert engine.counts("1", "q1")["answered"] == 3
+
+    # A failed refresh stays due until it succeeds
+    store.responses = make_responses() + [
+        {"seq": 4, "customer_id": "2", "completed_at": "2024-01-01T12:00:00", "answers": {"q1": "2"}}]
+    engine.mark_dirty("1")
+    store.fail = True
+    with pytest.raises(ConnectionError):
+        engine.counts("1", "q1")
+    store.fail = False
+    assert engine.counts("1", "q1")["answered"] == 4
+
+
+def test_snapshot_is_unaffected_by_a_refresh():
+    store = FakeStore(make_responses()[:2])
+    engine = AnalyticsEngine(store.fetch_page)
+    snapshot = engine.columns("1")
+
+    # A refresh appends to the same columns while a query holds the snapshot
+    store.responses = make_responses() + [
+        {"seq": 4, "customer_id": "3", "completed_at": "2024-01-01T12:00:00", "answers": {"q1": "3", "q3": "x"}}]
+    engine.mark_dirty("1")
+    assert engine.columns("1").size == 4
+
+    mask = engine._mask(snapshot, customer_id="3")
+    assert mask.size == snapshot.answers("q1").size == snapshot.customer.size == 2
+    assert not mask.any()
+    assert snapshot.labels("q1") == ["1", "2"]
+    assert snapshot.customer_labels == ["1", "2"]
+    assert snapshot.answers("q3").tolist() == [-1, -1]
+
+
+def test_funnel():
+    result = AnalyticsEngine.funnel(["q1", "q2"], {
+        "current_question_index": [0, 0, 1, 1],
+        "status": ["active", "active", "active", "completed"],
+    })
+    assert [step["reached"] for step in result["steps"]] == [4, 2]
+    assert result["completed"] == 1
+    assert result["completion_rate"] == 0.25
+
+
+def test_analytics_endpoint(client, mock_db):
+    mock_db.get_conversation_progress.return_value = {
+        "current_question_index": [0, 1], "status": ["active", "completed"]}
+
+    response = client.get("/analytics?survey_id=test_survey&query=funnel")
+    assert response.status_code == 200
+    assert response.json()["completed"] == 1
+
+    with patch('app.main.analytics', AnalyticsEngine(FakeStore(make_responses()).fetch_page)):
+        response = client.get(
+            "/analytics?survey_id=test_survey&query=crosstab&question=q1&by=customer")
+    assert response.json()["counts"] == [[2, 0], [0, 1]]
+
+    assert client.get(
+        "/analytics?survey_id=test_survey&query=crosstab&question=q1").status_code == 400
+    assert client.get(
+        "/analytics?survey_id=test_survey&query=median").status_code == 400
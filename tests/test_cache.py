@@ -0,0 +1,66 @@
+import gzip
+import json
+from unittest.mock import MagicMock
+
+from app.cache import EncodedResponseCache, encode_json, splice_json_object
+
+
+def test_get_or_load_caches_encoded_payload():
+    cache = EncodedResponseCache(compress_min_size=None)
+    loader = MagicMock(return_value={"id": "1", "name": "Survey"})
+
+    first = cache.get_or_load("key", loader)
+    second = cache.get_or_load("key", loader)
+
+    assert first is second
+    loader.assert_called_once()
+    assert json.loads(first.body) == {"id": "1", "name": "Survey"}
+    assert first.gzip_body is None
+
+
+def test_missing_values_are_not_cached():
+    cache = EncodedResponseCache()
+    loader = MagicMock(return_value=None)
+
+    assert cache.get_or_load("key", loader) is None
+    assert cache.get_or_load("key", loader) is None
+    assert loader.call_count == 2
+
+
+def test_invalidate_single_key_and_all():
+    cache = EncodedResponseCache()
+    cache.get_or_load("a", lambda: [1])
+    cache.get_or_load("b", lambda: [2])
+
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+
+    cache.invalidate()
+    assert cache.get("b") is None
+
+
+def test_load_racing_with_invalidation_is_not_stored():
+    cache = EncodedResponseCache()
+
+    def loader():
+        cache.invalidate("key")
+        return {"stale": True}
+
+    payload = cache.get_or_load("key", loader)
+    assert payload.value == {"stale": True}
+    assert cache.get("key") is None
+
+
+def test_large_payloads_are_precompressed():
+    cache = EncodedResponseCache(compress_min_size=16)
+    payload = cache.get_or_load("key", lambda: {"text": "x" * 100})
+    assert gzip.decompress(payload.gzip_body) == payload.body
+
+
+def test_splice_json_object():
+    text = splice_json_object({
+        "type": encode_json("state"),
+        "survey": encode_json({"id": "1"}),
+    })
+    assert json.loads(text) == {"type": "state", "survey": {"id": "1"}}
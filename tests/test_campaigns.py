@@ -0,0 +1,146 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.campaigns import Campaign, CampaignRegistry, RateLimiter
+from app.main import app
+
+
+def list_source(customer_ids):
+    async def source():
+        for customer_id in customer_ids:
+            yield customer_id, {"id": customer_id, "name": f"Customer {customer_id}"}
+    return source
+
+
+@pytest.mark.asyncio
+async def test_campaign_dispatches_every_customer():
+    dispatched = []
+    campaign = Campaign("1", list_source(["1", "2", "3"]),
+                        lambda customer_id, customer: dispatched.append(customer_id),
+                        rate=1000, concurrency=2, total=3)
+    campaign.start()
+    await asyncio.wait_for(campaign.wait(), timeout=5)
+
+    snapshot = campaign.snapshot()
+    assert sorted(dispatched) == ["1", "2", "3"]
+    assert snapshot["status"] == "completed"
+    assert snapshot["succeeded"] == 3
+    assert snapshot["in_progress"] == 0
+
+
+@pytest.mark.asyncio
+async def test_campaign_backs_off_and_retries_on_rpc_errors():
+    calls = {"count": 0}
+
+    def flaky(customer_id, customer):
+        calls["count"] += 1
+        if calls["count"] == 1:
+            raise ConnectionError("RPC call failed")
+
+    campaign = Campaign("1", list_source(["1"]), flaky, rate=1000, concurrency=1)
+    campaign.BASE_BACKOFF = 0.01
+    campaign.start()
+    await asyncio.wait_for(campaign.wait(), timeout=5)
+
+    snapshot = campaign.snapshot()
+    assert snapshot["succeeded"] == 1
+    assert snapshot["retried"] == 1
+    assert snapshot["current_rate"] < 1000
+
+
+@pytest.mark.asyncio
+async def test_campaign_pause_and_resume():
+    dispatched = []
+    campaign = Campaign("1", list_source(["1", "2"]),
+                        lambda customer_id, customer: dispatched.append(customer_id),
+                        rate=1000, concurrency=1)
+    campaign.start()
+    campaign.pause()
+    await asyncio.sleep(0.05)
+    assert dispatched == []
+    assert campaign.snapshot()["status"] == "paused"
+
+    campaign.resume()
+    await asyncio.wait_for(campaign.wait(), timeout=5)
+    assert dispatched == ["1", "2"]
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spaces_out_acquisitions():
+    limiter = RateLimiter(rate=50, burst=1)
+    start = time.monotonic()
+    for _ in range(4):
+        await limiter.acquire()
+    assert time.monotonic() - start >= 0.05
+
+
+def test_campaign_routes(mock_db):
+    mock_db.get_customers_info.return_value = {"1": {"name": "Test User"}}
+
+    with patch('app.main.greet_customer'), TestClient(app) as client:
+        response = client.post("/campaigns", json={
+            "survey_id": "test_survey", "customer_ids": ["1", "2"], "rate": 1000})
+        assert response.status_code == 202
+        campaign_id = response.json()["id"]
+
+        for _ in range(100):
+            snapshot = client.get(f"/campaigns/{campaign_id}").json()
+            if snapshot["status"] == "completed":
+                break
+            time.sleep(0.01)
+
+        assert snapshot["status"] == "completed"
+        assert snapshot["succeeded"] == 1
+        assert snapshot["skipped"] == 1
+        mock_db.create_conversation.assert_called_once_with("1", "test_survey")
+
+        assert client.get("/campaigns/missing").status_code == 404
+        response = client.post("/campaigns", json={"survey_id": "test_survey"})
+        assert response.status_code == 422
+
+
+def test_failed_greeting_backs_off_and_keeps_the_conversation(mock_db, monkeypatch):
+    from app.main import rpc_retries_collapsed
+
+    monkeypatch.setattr(Campaign, "BASE_BACKOFF", 0.01)
+    mock_db.get_customers_info.return_value = {"1": {"name": "Test User"}}
+    mock_db.add_message_to_conversation.side_effect = [ConnectionError("RPC call failed")] * 3 + [True]
+    mock_db.add_message_to_conversation.__name__ = "add_message_to_conversation"
+    collapsed = rpc_retries_collapsed.labels("add_message_to_conversation").value
+
+    with TestClient(app) as client:
+        campaign_id = client.post("/campaigns", json={
+            "survey_id": "test_survey", "customer_ids": ["1"], "rate": 1000}).json()["id"]
+        for _ in range(100):
+            snapshot = client.get(f"/campaigns/{campaign_id}").json()
+            if snapshot["status"] == "completed":
+                break
+            time.sleep(0.01)
+
+    assert snapshot["succeeded"] == 1
+    assert snapshot["retried"] == 3
+    assert snapshot["current_rate"] < 1000
+    # One greeting RPC per campaign attempt, without a second conversation
+    assert mock_db.add_message_to_conversation.call_count == 4
+    assert rpc_retries_collapsed.labels("add_message_to_conversation").value == collapsed + 4
+    mock_db.create_conversation.assert_called_once_with("1", "test_survey")
+
+
+@pytest.mark.asyncio
+async def test_registry_forgets_finished_campaigns_after_ttl():
+    registry = CampaignRegistry(ttl=60)
+    done = registry.start(Campaign("1", list_source([]), lambda customer_id, customer: None))
+    running = registry.start(Campaign("1", list_source(["1"]), lambda customer_id, customer: None))
+    running.pause()
+    await asyncio.wait_for(done.wait(), timeout=5)
+
+    registry.prune(done.finished_monotonic + 59)
+    assert registry.get(done.id) is done
+    registry.prune(done.finished_monotonic + 60)
+    assert registry.campaigns == {running.id: running}
+    running.cancel()
+    await asyncio.wait_for(running.wait(), timeout=5)
@@ -1,3 +1,5 @@
+import copy
+
 import pytest
 from unittest.mock import patch, MagicMock
 import uuid
@@ -6,6 +8,16 @@ import time
 
 from app.db import MockRPCDatabase, mock_db
 
+# Every test gets the store back as it found it
+
+
+@pytest.fixture(autouse=True)
+def restore_store():
+    snapshot = copy.deepcopy(mock_db)
+    yield
+    mock_db.clear()
+    mock_db.update(snapshot)
+
 # Test the database mock initialization
 
 
@@ -25,8 +37,9 @@ def test_mock_db_initialization():
 
 
 @patch('app.db.time.sleep')  # Patch sleep to speed up tests
-def test_simulate_rpc_call(mock_sleep):
+def test_simulate_rpc_call(mock_sleep, latency_profile):
     from app.db import simulate_rpc_call
+    latency_profile("default")
 
     # Mock random to always return 0.2 (below failure threshold)
     with patch('app.db.random.random', return_value=0.2):
@@ -120,6 +133,112 @@ def test_save_survey_response(mock_simulate):
     assert len(mock_db["survey_responses"]) == initial_count + 1
     assert mock_db["survey_responses"][-1] == test_response
 
+# Test the incrementally maintained survey results
+
+
+@patch('app.db.simulate_rpc_call')
+def test_survey_results_are_aggregated_on_save(mock_simulate):
+    db = MockRPCDatabase()
+    mock_db["survey_results"].pop("1", None)
+
+    db.save_survey_response(
+        {"survey_id": "1", "answers": {"q1": "2", "q2": "yes"}})
+    db.save_survey_response(
+        {"survey_id": "1", "answers": {"q1": "2", "detailed_feedback": "Rich"}})
+    db.save_survey_response({"survey_id": "1", "answers": {"q1": "banana"}})
+
+    results = db.get_survey_results("1")
+    assert results["responses"] == 3
+    assert results["questions"]["q1"] == {
+        "answered": 3, "options": {"2": 2, "other": 1}}
+    assert results["questions"]["q2"] == {"answered": 1, "options": {}}
+    assert results["questions"]["detailed_feedback"]["answered"] == 1
+
+    assert db.get_survey_results("nonexistent") == {
+        "responses": 0, "questions": {}}
+
+
+@patch('app.db.simulate_rpc_call')
+def test_survey_results_with_concurrent_writers(mock_simulate):
+    import threading
+    db = MockRPCDatabase()
+    mock_db["survey_results"].pop("1", None)
+
+    def writer():
+        for _ in range(200):
+            db.save_survey_response({"survey_id": "1", "answers": {"q1": "1"}})
+
+    threads = [threading.Thread(target=writer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    results = db.get_survey_results("1")
+    assert results["responses"] == 1600
+    assert results["questions"]["q1"]["options"]["1"] == 1600
+
+# Test paging through the responses of a survey
+
+
+@patch('app.db.simulate_rpc_call')
+def test_get_survey_responses_page(mock_simulate):
+    db = MockRPCDatabase()
+    for index in range(5):
+        db.save_survey_response(
+            {"survey_id": "paging", "conversation_id": f"c{index}", "answers": {}})
+    db.save_survey_response(
+        {"survey_id": "other", "conversation_id": "x", "answers": {}})
+
+    first = db.get_survey_responses_page("paging", 0, 2)
+    assert [r["conversation_id"] for r in first] == ["c0", "c1"]
+
+    rest = db.get_survey_responses_page("paging", first[-1]["seq"], 10)
+    assert [r["conversation_id"] for r in rest] == ["c2", "c3", "c4"]
+    assert db.get_survey_responses_page("paging", rest[-1]["seq"], 10) == []
+
+    # Stored responses are not modified
+    assert "seq" not in mock_db["survey_responses"][-1]
+
+# Test searching free-text answers
+
+
+@patch('app.db.simulate_rpc_call')
+def test_search_feedback(mock_simulate):
+    db = MockRPCDatabase()
+    mock_db["feedback_index"].pop("1", None)
+
+    db.save_survey_response({"survey_id": "1", "conversation_id": "a",
+                             "answers": {"q1": "2", "q2": "yes", "detailed_feedback": "So rich and creamy"}})
+    db.save_survey_response({"survey_id": "1", "conversation_id": "b",
+                             "answers": {"q1": "1", "q2": "no"}})
+
+    results = db.search_feedback("1", "creamy")
+    assert results["total"] == 1
+    assert results["results"][0]["conversation_id"] == "a"
+    assert results["results"][0]["question_id"] == "detailed_feedback"
+
+    # Open questions are indexed, closed questions are not
+    assert db.search_feedback("1", "no")["total"] == 1
+    assert db.search_feedback("1", "2")["total"] == 0
+    assert db.search_feedback("missing", "creamy")["total"] == 0
+
+# Test writing enrichment results back to responses
+
+
+@patch('app.db.simulate_rpc_call')
+def test_update_survey_responses(mock_simulate):
+    db = MockRPCDatabase()
+    db.save_survey_response({"survey_id": "enrich", "answers": {}})
+    seq = db.get_survey_responses_page("enrich")[-1]["seq"]
+
+    db.update_survey_responses([(seq, {"enrichment": {"keywords": ["rich"]}})])
+    assert mock_db["survey_responses"][seq - 1]["enrichment"] == {
+        "keywords": ["rich"]}
+
+    # Unknown positions are ignored
+    db.update_survey_responses([(10 ** 9, {"enrichment": {}})])
+
 # Test get_all_surveys and get_survey_by_id methods
 
 
@@ -274,3 +393,11 @@ def test_customer_surveys_methods(mock_simulate):
     resumed_conv = db.resume_conversation("nonexistent")
     mock_simulate.assert_called_once()
     assert resumed_conv is None
+
+
+# Test that writes made by one test are undone before the next
+
+
+def test_store_changes_are_undone_between_tests():
+    assert "other_customer" not in mock_db["conversations"]
+    assert "message_test" not in mock_db["conversations"]
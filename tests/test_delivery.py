@@ -0,0 +1,90 @@
+import time
+
+import pytest
+from fastapi.websockets import WebSocketDisconnect
+
+from app.delivery import Outbox, ParkedOutboxes, parse_ack
+from app.main import manager
+
+
+def test_outbox_numbers_frames_and_forgets_acked_ones():
+    outbox = Outbox(max_pending=3)
+    assert outbox.stamp('{"type":"a"}') == '{"type":"a","seq":1}'
+    outbox.stamp('{"type":"b"}')
+    outbox.stamp('{"type":"c"}')
+
+    outbox.ack(2)
+    assert outbox.unacked() == ['{"type":"c","seq":3}']
+    assert not outbox.all_acked
+
+    # Acks are cumulative and never go backwards or past the last frame
+    outbox.ack(1)
+    outbox.ack(10)
+    assert outbox.acked_seq == 3 and outbox.all_acked
+
+    for name in "defg":
+        outbox.stamp('{"type":"%s"}' % name)
+    assert len(outbox.unacked()) == 3 and outbox.dropped == 1
+
+
+def test_parse_ack():
+    assert parse_ack('{"type": "ack", "seq": 4}') == 4
+    assert parse_ack('{"content": "ack"}') is None
+    assert parse_ack('{"type": "ack"}') is None
+    assert parse_ack('{"content": "Option 1"}') is None
+
+
+def test_parked_outboxes_expire():
+    parked = ParkedOutboxes(ttl=10)
+    outbox = Outbox()
+    parked.park("c1", outbox, now=0)
+    assert parked.take("c1", now=5) is outbox
+    assert parked.take("c1", now=5) is None
+
+    parked.park("c1", outbox, now=0)
+    parked.prune(now=11)
+    assert len(parked) == 0
+
+
+def test_completed_survey_closes_once_final_frame_is_acked(client, mock_db):
+    mock_db.get_conversation_state.return_value = dict(
+        mock_db.get_conversation_state.return_value, awaiting_detailed_feedback=True)
+
+    with client.websocket_connect("/ws/test_conv?ack=1") as websocket:
+        assert websocket.receive_json()["seq"] == 1
+        assert websocket.receive_json()["seq"] == 2
+        websocket.send_json({"type": "ack", "seq": 2})
+
+        websocket.send_json({"content": "Great service"})
+        message = websocket.receive_json()
+        completed = websocket.receive_json()
+        assert (message["type"], message["seq"]) == ("message", 3)
+        assert (completed["type"], completed["seq"]) == ("completed", 4)
+
+        started = time.monotonic()
+        websocket.send_json({"type": "ack", "seq": 4})
+        with pytest.raises(WebSocketDisconnect) as error:
+            websocket.receive_json()
+        assert error.value.code == 1000
+        assert time.monotonic() - started < 0.5
+    assert "test_conv" not in manager.active_connections
+    # Everything was acknowledged, so nothing is kept for a reconnect
+    assert manager.parked.take("test_conv", time.monotonic()) is None
+
+
+def test_unacked_frames_are_redelivered_on_reconnect(client, mock_db):
+    with client.websocket_connect("/ws/redeliver_conv?ack=1") as websocket:
+        websocket.receive_json()
+        websocket.receive_json()
+    assert len(manager.parked) >= 1
+
+    with client.websocket_connect("/ws/redeliver_conv?ack=1&last_seq=1") as websocket:
+        redelivered = websocket.receive_json()
+        assert (redelivered["type"], redelivered["seq"]) == ("history", 2)
+        state = websocket.receive_json()
+        assert (state["type"], state["seq"]) == ("state", 3)
+        assert websocket.receive_json()["seq"] == 4
+
+    # Without parked frames numbering continues from the client's last seq
+    with client.websocket_connect("/ws/fresh_conv?ack=1&last_seq=7") as websocket:
+        assert websocket.receive_json()["seq"] == 8
@@ -0,0 +1,111 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.enrichment import EnrichmentPipeline, score_batch
+
+
+def test_score_batch_sentiment_and_keywords():
+    results = score_batch([
+        "I love it, the chocolate is so rich and creamy",
+        "Not good at all, bland and icy",
+        "",
+        "It reminds me of summer holidays",
+    ])
+
+    assert results[0]["sentiment"]["label"] == "positive"
+    assert "chocolate" in results[0]["keywords"]
+    assert results[1]["sentiment"]["label"] == "negative"
+    assert results[2] == {"sentiment": {"score": 0.0, "label": "neutral"}, "keywords": []}
+    assert results[3]["sentiment"]["label"] == "neutral"
+    assert all(-1 <= r["sentiment"]["score"] <= 1 for r in results)
+
+
+def test_negation_flips_polarity():
+    good, not_good = score_batch(["good", "not good"])
+    assert good["sentiment"]["score"] > 0 > not_good["sentiment"]["score"]
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_pipeline_batches_and_writes_back():
+    written, latencies = [], []
+    pipeline = EnrichmentPipeline(written.extend, batch_size=10, max_wait=0.05,
+                                  batchers=1, executor_factory=lambda: ThreadPoolExecutor(1),
+                                  on_batch=latencies.append)
+    try:
+        for seq in range(1, 26):
+            assert pipeline.submit(seq, "delicious")
+        assert wait_for(lambda: len(written) == 25)
+    finally:
+        pipeline.stop()
+
+    assert sorted(seq for seq, _ in written) == list(range(1, 26))
+    assert written[0][1]["sentiment"]["label"] == "positive"
+    assert "enriched_at" in written[0][1]
+    stats = pipeline.stats()
+    assert stats["enriched"] == 25
+    assert stats["batches"] >= 3
+    assert stats["batch_latency_seconds"]["p50"] is not None
+    assert len(latencies) == stats["batches"]
+
+
+def test_pipeline_drops_instead_of_blocking_when_full():
+    def slow_writer(updates):
+        time.sleep(0.2)
+
+    pipeline = EnrichmentPipeline(slow_writer, batch_size=1, max_queue=2, batchers=1,
+                                  executor_factory=lambda: ThreadPoolExecutor(1))
+    try:
+        started = time.monotonic()
+        accepted = [pipeline.submit(seq, "good") for seq in range(10)]
+        assert time.monotonic() - started < 0.1
+    finally:
+        pipeline.stop()
+
+    assert accepted.count(False) == pipeline.stats()["dropped"] > 0
+
+
+def test_pipeline_counts_failed_batches():
+    def failing_writer(updates):
+        raise ConnectionError("RPC call failed")
+
+    pipeline = EnrichmentPipeline(failing_writer, batch_size=5, max_wait=0.01, batchers=1,
+                                  executor_factory=lambda: ThreadPoolExecutor(1))
+    try:
+        pipeline.submit(1, "good")
+        assert wait_for(lambda: pipeline.stats()["failed_batches"] == 1)
+    finally:
+        pipeline.stop()
+
+
+def test_app_starts_the_pipeline_at_startup():
+    from fastapi.testclient import TestClient
+
+    from app.main import app, enrichment
+
+    with TestClient(app):
+        assert enrichment.running
+    assert not enrichment.running
+
+
+def test_batch_latency_is_exported_as_a_histogram(mock_db):
+    from fastapi.testclient import TestClient
+
+    from app.main import app, enrichment, enrichment_batch_latency
+
+    def batch_count():
+        return enrichment_batch_latency.labels().snapshot()[2]
+
+    before = batch_count()
+    with TestClient(app) as client:
+        enrichment.submit(1, "delicious")
+        assert wait_for(lambda: batch_count() == before + 1)
+        text = client.get("/metrics").text
+    assert "# TYPE enrichment_batch_duration_seconds histogram" in text
+    assert f"enrichment_batch_duration_seconds_count {int(before) + 1}" in text
+    mock_db.update_survey_responses.assert_called_once()
@@ -0,0 +1,114 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from app.export import decode_cursor, encode_cursor, stream_export
+
+
+def make_fetcher(responses, page_size=2):
+    calls = []
+
+    async def fetch_page(after_seq):
+        calls.append(after_seq)
+        return [r for r in responses if r["seq"] > after_seq][:page_size]
+    return fetch_page, calls
+
+
+RESPONSES = [
+    {"seq": 1, "conversation_id": "a", "customer_id": "1", "survey_id": "1",
+     "answers": {"q1": "1"}, "completed_at": "2024-01-01T10:00:00"},
+    {"seq": 3, "conversation_id": "b", "customer_id": "2", "survey_id": "1",
+     "answers": {"q1": "2", "detailed_feedback": "Tasty, rich"}, "completed_at": "2024-01-02T10:00:00"},
+    {"seq": 7, "conversation_id": "c", "customer_id": "1", "survey_id": "1",
+     "answers": {"q1": "3"}, "completed_at": "2024-01-03T10:00:00"},
+]
+
+
+async def collect(stream):
+    return b"".join([chunk async for chunk in stream]).decode()
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42)) == 42
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_ndjson_export_pages_through_responses():
+    fetch_page, calls = make_fetcher(RESPONSES)
+    text = await collect(stream_export(fetch_page, "ndjson"))
+
+    rows = [json.loads(line) for line in text.splitlines()]
+    assert [row["conversation_id"] for row in rows] == ["a", "b", "c"]
+    assert decode_cursor(rows[-1]["cursor"]) == 7
+    assert "seq" not in rows[0]
+    assert calls == [0, 3, 7]
+
+
+@pytest.mark.asyncio
+async def test_export_resumes_from_cursor_and_filters_since():
+    fetch_page, _ = make_fetcher(RESPONSES)
+    text = await collect(stream_export(fetch_page, "ndjson", after_seq=1))
+    assert [json.loads(line)["conversation_id"]
+            for line in text.splitlines()] == ["b", "c"]
+
+    fetch_page, _ = make_fetcher(RESPONSES)
+    text = await collect(stream_export(fetch_page, "ndjson", since=datetime(2024, 1, 3)))
+    assert [json.loads(line)["conversation_id"]
+            for line in text.splitlines()] == ["c"]
+
+
+@pytest.mark.asyncio
+async def test_since_compares_points_in_time():
+    responses = [
+        # 09:00 UTC, later than `since` even though the string sorts before it
+        {"seq": 1, "conversation_id": "a", "completed_at": "2024-01-03T10:00:00+01:00"},
+        {"seq": 2, "conversation_id": "b", "completed_at": "2024-01-03T10:00:00+03:00"},
+        {"seq": 3, "conversation_id": "c"},
+    ]
+    fetch_page, _ = make_fetcher(responses)
+    since = datetime(2024, 1, 3, 8, 30, tzinfo=timezone.utc)
+    text = await collect(stream_export(fetch_page, "ndjson", since=since))
+    assert [json.loads(line)["conversation_id"]
+            for line in text.splitlines()] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_csv_export():
+    fetch_page, _ = make_fetcher(RESPONSES)
+    text = await collect(stream_export(fetch_page, "csv",
+                                       answer_columns=["q1", "detailed_feedback"]))
+    lines = text.splitlines()
+    assert lines[0] == "cursor,conversation_id,customer_id,survey_id,completed_at,q1,detailed_feedback"
+    assert lines[2].endswith(',2,"Tasty, rich"')
+    assert len(lines) == 4
+
+
+@pytest.mark.asyncio
+async def test_ndjson_export_reports_errors_mid_stream():
+    async def fetch_page(after_seq):
+        if after_seq:
+            raise ConnectionError("RPC call failed")
+        return RESPONSES[:1]
+
+    text = await collect(stream_export(fetch_page, "ndjson"))
+    lines = [json.loads(line) for line in text.splitlines()]
+    assert lines[0]["conversation_id"] == "a"
+    assert "error" in lines[1]
+
+
+@pytest.mark.asyncio
+async def test_csv_export_is_aborted_mid_stream():
+    async def fetch_page(after_seq):
+        if after_seq:
+            raise ConnectionError("RPC call failed")
+        return RESPONSES[:1]
+
+    chunks = []
+    with pytest.raises(ConnectionError):
+        async for chunk in stream_export(fetch_page, "csv", answer_columns=["q1"]):
+            chunks.append(chunk)
+    # The rows sent so far still carry the cursor to resume from
+    assert len(b"".join(chunks).decode().splitlines()) == 2
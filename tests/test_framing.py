@@ -0,0 +1,74 @@
+import json
+import zlib
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.framing import JSON_FRAMING, ZlibFraming, negotiate
+
+
+def test_negotiate_takes_the_first_supported_offer():
+    assert negotiate(["survey.cbor", "survey.zlib", "survey.json"]).name == "zlib"
+    assert negotiate(["chat"]) is JSON_FRAMING
+    assert negotiate([]) is JSON_FRAMING
+
+
+def test_zlib_framing_only_compresses_large_frames():
+    framing = ZlibFraming(threshold=100)
+    assert framing.encode('{"type":"ping"}') == '{"type":"ping"}'
+    body = json.dumps({"type": "history", "messages": ["answer"] * 50})
+    assert zlib.decompress(framing.encode(body)).decode() == body
+
+
+@pytest.mark.asyncio
+async def test_pings_use_the_connection_framing():
+    from app.main import ConnectionManager
+
+    connections = ConnectionManager()
+    websocket = MagicMock(accept=AsyncMock(), send_text=AsyncMock(), send_bytes=AsyncMock())
+    try:
+        await connections.connect(websocket, "c1", framing=ZlibFraming(threshold=0))
+        await connections.reap()
+    finally:
+        connections.stop_reaper()
+
+    websocket.send_text.assert_not_awaited()
+    assert json.loads(zlib.decompress(websocket.send_bytes.await_args.args[0])) == {"type": "ping"}
+
+
+def test_history_is_compressed_for_zlib_clients(client, mock_db):
+    mock_db.get_conversation_messages.return_value = [
+        {"sender": "USER", "content": f"Answer number {n}", "timestamp": "2025-01-01T00:00:00"}
+        for n in range(100)]
+
+    with client.websocket_connect("/ws/test_conv", subprotocols=["survey.zlib", "survey.json"]) as websocket:
+        assert websocket.accepted_subprotocol == "survey.zlib"
+        # The state frame is under the threshold and stays text
+        state = websocket.receive_json()
+        history = json.loads(zlib.decompress(websocket.receive_bytes()))
+    assert state["type"] == "state"
+    assert len(history["messages"]) == 100
+
+    with client.websocket_connect("/ws/test_conv") as websocket:
+        assert websocket.accepted_subprotocol is None
+        assert websocket.receive_json()["type"] == "state"
+
+
+def test_msgpack_clients_get_binary_frames(client, mock_db):
+    msgpack = pytest.importorskip("msgpack")
+    with client.websocket_connect("/ws/test_conv", subprotocols=["survey.msgpack"]) as websocket:
+        assert msgpack.unpackb(websocket.receive_bytes())["type"] == "state"
+        assert msgpack.unpackb(websocket.receive_bytes())["type"] == "history"
+
+
+def test_multiplexed_and_observer_connections_use_the_negotiated_framing(client, mock_db):
+    msgpack = pytest.importorskip("msgpack")
+    with client.websocket_connect("/ws/mux", subprotocols=["survey.msgpack"]) as websocket:
+        assert websocket.accepted_subprotocol == "survey.msgpack"
+        websocket.send_json({"type": "subscribe", "conversation_id": "c1"})
+        frame = msgpack.unpackb(websocket.receive_bytes())
+    assert frame["conversation_id"] == "c1" and frame["type"] == "state"
+
+    with client.websocket_connect("/ws/observe", subprotocols=["survey.msgpack"]) as websocket:
+        websocket.send_json({"content": "Option 1"})
+        assert msgpack.unpackb(websocket.receive_bytes())["type"] == "error"
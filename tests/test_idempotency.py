@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+from app.idempotency import DONE, MISMATCH, NEW, PENDING, IdempotencyStore
+
+
+def test_store_reserve_complete_and_release():
+    store = IdempotencyStore()
+    assert store.reserve("k", "a") == (NEW, None)
+    assert store.reserve("k", "a") == (PENDING, None)
+    assert store.reserve("k", "b") == (MISMATCH, None)
+
+    store.complete("k", "result")
+    assert store.reserve("k", "a") == (DONE, "result")
+    assert store.replays == 1
+
+    # A failed attempt frees the key for the next try
+    assert store.reserve("other", "a") == (NEW, None)
+    store.release("other")
+    assert store.reserve("other", "a") == (NEW, None)
+
+
+def test_store_is_bounded_by_size_and_ttl():
+    store = IdempotencyStore(ttl=10, max_entries=2)
+    with patch("app.idempotency.time.monotonic", return_value=0):
+        for key in ("a", "b", "c"):
+            store.reserve(key, "x")
+            store.complete(key, key)
+        assert len(store) == 2
+        assert store.reserve("a", "x") == (NEW, None)
+
+    with patch("app.idempotency.time.monotonic", return_value=11):
+        assert store.reserve("c", "x") == (NEW, None)
+        assert len(store) == 1
+
+
+def test_replayed_message_post_skips_the_endpoint(client, mock_db):
+    headers = {"Idempotency-Key": "post-message-1"}
+    first = client.post("/conversations/test_conv/messages", json={"content": "Option 1"}, headers=headers)
+    calls = mock_db.method_calls[:]
+    second = client.post("/conversations/test_conv/messages", json={"content": "Option 1"}, headers=headers)
+
+    assert first.status_code == second.status_code == 201
+    assert second.json() == first.json()
+    assert second.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert mock_db.method_calls == calls
+
+    mismatch = client.post("/conversations/test_conv/messages", json={"content": "Option 2"}, headers=headers)
+    assert mismatch.status_code == 422
+
+
+def test_failed_conversation_creation_can_be_retried(client, mock_db):
+    headers = {"Idempotency-Key": "create-1"}
+    body = {"customer_id": "1", "survey_id": "test_survey"}
+    mock_db.create_conversation.side_effect = ConnectionError("RPC call failed")
+    assert client.post("/conversations", json=body, headers=headers).status_code == 503
+
+    mock_db.create_conversation.side_effect = None
+    response = client.post("/conversations", json=body, headers=headers)
+    assert response.status_code == 201
+    assert response.json() == {"conversation_id": "test_conv"}
+    assert client.post("/conversations", json=body, headers=headers).headers["idempotent-replayed"] == "true"
+    assert mock_db.create_conversation.call_count == 2
+
+
+def test_websocket_message_id_is_processed_once(client, mock_db, ws_turn):
+    with client.websocket_connect("/ws/test_conv") as websocket:
+        websocket.receive_json()
+        websocket.receive_json()
+        first = ws_turn(websocket, {"content": "Option 1", "message_id": "m1"})
+        replay = ws_turn(websocket, {"content": "Option 1", "message_id": "m1"})
+        mismatch = ws_turn(websocket, {"content": "Option 2", "message_id": "m1"})
+
+    assert first and replay == first
+    assert mismatch[0]["type"] == "error"
+    user_messages = [call for call in mock_db.add_message_to_conversation.call_args_list
+                     if call.args[1] == "USER"]
+    assert len(user_messages) == 1
+
+
+def test_shed_request_is_not_stored_for_its_retry(client, mock_db, monkeypatch):
+    from app.main import admission
+
+    headers = {"Idempotency-Key": "shed-1"}
+    body = {"customer_id": "1", "survey_id": "test_survey"}
+    monkeypatch.setattr(admission.classes["create"], "limit", 0)
+    monkeypatch.setattr(admission.classes["create"], "max_wait", 0)
+    assert client.post("/conversations", json=body, headers=headers).status_code == 429
+    monkeypatch.undo()
+
+    # The retry after Retry-After reaches the endpoint
+    response = client.post("/conversations", json=body, headers=headers)
+    assert response.status_code == 201
+    assert "idempotent-replayed" not in response.headers
+    assert mock_db.create_conversation.call_count == 1
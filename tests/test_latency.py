@@ -0,0 +1,95 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.latency import PROFILES, RPCSimulator, load_profile
+
+
+def test_builtin_profiles_load():
+    for name in PROFILES:
+        assert load_profile(name).name == name
+
+    zero = load_profile("zero")
+    assert zero.sample_delay(None) == 0.0
+    assert zero.current_failure_rate() == 0.0
+
+
+def test_seeded_runs_repeat():
+    def run(seed):
+        simulator = RPCSimulator(load_profile(
+            {"base": "lognormal", "failure_rate": 0.3}), seed=seed)
+        outcomes = []
+        with patch('app.latency.time.sleep') as mock_sleep:
+            for _ in range(50):
+                try:
+                    simulator.call("get_customer_info")
+                    outcomes.append("ok")
+                except ConnectionError:
+                    outcomes.append("failed")
+        return outcomes, [call.args[0] for call in mock_sleep.call_args_list]
+
+    assert run(7) == run(7)
+    assert run(7) != run(8)
+
+
+def test_lognormal_delays_are_capped():
+    profile = load_profile({"distribution": "lognormal", "median": 1.0,
+                            "sigma": 3.0, "max_delay": 2.0})
+    simulator = RPCSimulator(profile, seed=1)
+    delays = [profile.sample_delay(simulator._rng) for _ in range(1000)]
+    assert max(delays) == 2.0
+    assert min(delays) < 1.0
+
+
+def test_brownout_window():
+    profile = load_profile("brownout")
+    assert profile.in_brownout(1.0)
+    assert not profile.in_brownout(10.0)
+    assert profile.current_failure_rate(1.0) == 0.4
+    assert profile.current_failure_rate(10.0) == 0.02
+
+
+def test_method_overrides(tmp_path):
+    spec = {"base": "zero", "methods": {
+        "save_survey_response": {"delay": 0.25, "failure_rate": 1.0}}}
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps(spec))
+
+    for source in (spec, json.dumps(spec), str(path)):
+        simulator = RPCSimulator(load_profile(source), seed=0)
+        simulator.call("get_customer_info")
+        with patch('app.latency.time.sleep') as mock_sleep:
+            with pytest.raises(ConnectionError):
+                simulator.call("save_survey_response")
+            mock_sleep.assert_called_once_with(0.25)
+
+
+def test_invalid_profiles():
+    with pytest.raises(ValueError):
+        load_profile("no-such-profile")
+    with pytest.raises(ValueError):
+        load_profile({"distribution": "pareto"})
+    with pytest.raises(ValueError):
+        load_profile({"failure_rate": 2})
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("RPC_LATENCY_PROFILE", "lognormal")
+    monkeypatch.setenv("RPC_LATENCY_SEED", "42")
+    simulator = RPCSimulator.from_env()
+    assert simulator.profile.name == "lognormal"
+    assert simulator.seed == 42
+
+
+@patch('app.latency.time.sleep')
+def test_switch_profile_at_runtime(mock_sleep, latency_profile):
+    from app.db import MockRPCDatabase
+
+    latency_profile({"base": "zero", "failure_rate": 1.0})
+    with pytest.raises(ConnectionError):
+        MockRPCDatabase.get_all_surveys()
+
+    latency_profile("zero")
+    assert MockRPCDatabase.get_all_surveys()
+    mock_sleep.assert_not_called()
@@ -0,0 +1,52 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.loadtest import Recorder, run_load
+from app.main import app
+
+
+def test_recorder_report():
+    recorder = Recorder()
+
+    async def record():
+        for _ in range(9):
+            async with recorder.step("create_conversation"):
+                pass
+        with pytest.raises(ConnectionError):
+            async with recorder.step("create_conversation"):
+                raise ConnectionError("RPC call failed")
+
+    asyncio.run(record())
+    recorder.journeys_completed = 9
+    recorder.journeys_failed = 1
+    report = recorder.report(2.0, {"journey": "rest"})
+
+    step = report["steps"]["create_conversation"]
+    assert step["count"] == 10
+    assert step["error_rate"] == 0.1
+    assert set(step["latency_ms"]) == {"mean", "p50", "p95", "p99", "max"}
+    assert report["journeys"]["throughput_per_second"] == 4.5
+    assert report["journeys"]["error_rate"] == 0.1
+    assert report["top_errors"] == {
+        "create_conversation: ConnectionError: RPC call failed": 1}
+
+
+@patch('app.db.simulate_rpc_call')
+def test_rest_journeys_against_app(mock_simulate):
+    report = asyncio.run(run_load(
+        "http://testserver", journey="rest", rate=50, concurrency=5,
+        duration=None, journeys=3, transport=httpx.ASGITransport(app=app)))
+
+    assert report["journeys"]["completed"] == 3
+    assert report["journeys"]["failed"] == 0
+    assert set(report["steps"]) == {
+        "create_conversation", "greeting", "answer_q1", "answer_q2", "detailed_feedback"}
+    assert all(step["errors"] == 0 for step in report["steps"].values())
+
+
+def test_rejects_unknown_journey():
+    with pytest.raises(ValueError):
+        asyncio.run(run_load("http://testserver", journey="grpc"))
@@ -0,0 +1,105 @@
+import json
+import logging
+import queue
+import random
+import threading
+
+import pytest
+
+from app import logs
+from app.logs import (ContextFilter, DroppingQueueHandler, JsonFormatter, RateLimitFilter,
+                      SamplingFilter, bind_conversation, parse_sampling)
+
+
+def make_record(message="Conversation %s not found", args=("c1",), level=logging.WARNING, lineno=10):
+    return logging.LogRecord("app.main", level, "main.py", lineno, message, args, None)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.written = threading.Event()
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+        self.written.set()
+
+
+@pytest.fixture
+def captured():
+    handler = ListHandler()
+    logs.setup_logging(level="DEBUG", sampling="", handler=handler)
+    yield handler
+    logs.setup_logging()
+
+
+def test_records_are_written_as_json_with_context(captured):
+    logger = logging.getLogger("app.test")
+    with bind_conversation("conv-1"):
+        logger.info("Saved survey response", extra={"survey_id": "1"})
+    logger.warning("Outside %s", "context")
+    logs.shutdown_logging()
+
+    first, second = (json.loads(line) for line in captured.lines)
+    assert first["message"] == "Saved survey response"
+    assert first["conversation_id"] == "conv-1"
+    assert first["survey_id"] == "1"
+    assert first["level"] == "INFO"
+    assert second["message"] == "Outside context"
+    assert "conversation_id" not in second
+
+
+def test_exceptions_are_rendered(captured):
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logging.getLogger("app.test").exception("Failed")
+    logs.shutdown_logging()
+    assert "ValueError: boom" in json.loads(captured.lines[0])["exception"]
+
+
+def test_sampling_filter():
+    sampler = SamplingFilter(parse_sampling("DEBUG=0,INFO=0.5"), rng=random.Random(1))
+    kept = sum(sampler.filter(make_record(level=logging.INFO)) for _ in range(1000))
+    assert 400 < kept < 600
+    assert not sampler.filter(make_record(level=logging.DEBUG))
+    assert sampler.filter(make_record(level=logging.ERROR))
+
+    with pytest.raises(ValueError):
+        parse_sampling("LOUD=1")
+
+
+def test_rate_limit_filter(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(logs.time, "monotonic", lambda: now[0])
+    limiter = RateLimitFilter(interval=60, burst=2)
+
+    assert [limiter.filter(make_record()) for _ in range(5)] == [
+        True, True, False, False, False]
+    # A different call site has its own budget; INFO records are not limited
+    assert limiter.filter(make_record(lineno=20))
+    assert all(limiter.filter(make_record(level=logging.INFO)) for _ in range(5))
+
+    now[0] = 61.0
+    record = make_record()
+    assert limiter.filter(record)
+    assert record.suppressed == 3
+
+
+def test_full_queue_drops_records():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(make_record())
+    handler.handle(make_record())
+    assert handler.dropped == 1
+    record = handler.queue.get_nowait()
+    assert record.msg == "Conversation c1 not found" and record.args is None
+
+
+def test_context_filter_keeps_explicit_ids():
+    record = make_record()
+    record.conversation_id = "explicit"
+    with bind_conversation("bound"):
+        ContextFilter().filter(record)
+    assert record.conversation_id == "explicit"
+    assert json.loads(JsonFormatter().format(record))["conversation_id"] == "explicit"
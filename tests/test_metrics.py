@@ -0,0 +1,119 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.metrics import Counter, Gauge, GaugeFunc, Histogram, InstrumentedRPC, RateMeter, Registry
+
+
+def test_counter_sums_thread_shards():
+    counter = Counter("jobs_total", "Jobs", ["kind"])
+
+    def work():
+        for _ in range(1000):
+            counter.labels("a").inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.labels("a").value == 8000
+    assert list(counter.samples()) == ['jobs_total{kind="a"} 8000']
+    with pytest.raises(ValueError):
+        counter.labels("a", "b")
+
+
+def test_gauge_and_gauge_func():
+    gauge = Gauge("pending", "Pending")
+    gauge.inc(3)
+    gauge.dec()
+    assert list(gauge.samples()) == ["pending 2"]
+    assert list(GaugeFunc("depth", "Depth", lambda: 1.5).samples()) == [
+        "depth 1.5"]
+
+
+def test_histogram_exposition():
+    histogram = Histogram("latency_seconds", "Latency",
+                          ["method"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.labels("get").observe(value)
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{method="get",le="0.1"} 1',
+        'latency_seconds_bucket{method="get",le="1"} 3',
+        'latency_seconds_bucket{method="get",le="+Inf"} 4',
+        'latency_seconds_sum{method="get"} 4.05',
+        'latency_seconds_count{method="get"} 4',
+    ]
+
+
+def test_registry_rejects_duplicates():
+    registry = Registry()
+    registry.register(Counter("a_total", "A"))
+    with pytest.raises(ValueError):
+        registry.register(Counter("a_total", "A"))
+    assert registry.render().endswith("a_total 0\n")
+
+
+def test_instrumented_rpc():
+    latency = Histogram("rpc_seconds", "RPC", ["method"])
+    errors = Counter("rpc_errors_total", "Errors", ["method", "error"])
+
+    class Target:
+        timeout = 3
+
+        def get_customer_info(self, customer_id):
+            return {"id": customer_id}
+
+        def save_survey(self, survey):
+            raise ConnectionError("RPC call failed")
+
+    rpc = InstrumentedRPC(Target(), latency, errors)
+    assert rpc.get_customer_info("1") == {"id": "1"}
+    assert rpc.get_customer_info.__name__ == "get_customer_info"
+    assert rpc.get_customer_info is rpc.get_customer_info
+    assert rpc.timeout == 3
+    with pytest.raises(ConnectionError):
+        rpc.save_survey({})
+
+    assert latency.labels("get_customer_info").snapshot()[2] == 1
+    assert latency.labels("save_survey").snapshot()[2] == 1
+    assert errors.labels("save_survey", "ConnectionError").value == 1
+
+
+def test_rate_meter():
+    total = MagicMock(side_effect=[0, 10])
+    meter = RateMeter(total)
+    assert meter() == 0.0
+    assert meter() > 0
+
+
+def test_metrics_endpoint(client, mock_db):
+    client.get("/surveys/test_survey")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/surveys/{survey_id}",status="200"}' in body
+    assert "websocket_connections 0" in body
+    assert "# TYPE rpc_duration_seconds histogram" in body
+    assert "enrichment_queue_depth" in body
+
+
+def test_with_retry_counts_retries_and_give_ups(monkeypatch):
+    from app import main
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+
+    def flaky_rpc():
+        raise ConnectionError("RPC call failed")
+
+    retries = main.rpc_retries.labels("flaky_rpc").value
+    with pytest.raises(ConnectionError):
+        main.with_retry(flaky_rpc)
+    assert main.rpc_retries.labels("flaky_rpc").value == retries + 2
+    assert main.rpc_give_ups.labels("flaky_rpc").value == 1
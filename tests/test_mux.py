@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+from app.main import manager
+from app.mux import Multiplexer
+
+
+async def noop(*args):
+    pass
+
+
+def test_writer_takes_turns_between_conversations():
+    async def scenario():
+        sent = []
+
+        async def send(frame):
+            sent.append(json.loads(frame))
+
+        mux = Multiplexer(send, noop, noop, max_pending=2)
+        busy, quiet = mux.open("busy", {}), mux.open("quiet", {})
+        await busy.send_text('{"n":1}')
+        await busy.send_text('{"n":2}')
+        # The busy conversation is at its limit and waits for the writer
+        third = asyncio.ensure_future(busy.send_text('{"n":3}'))
+        await asyncio.sleep(0)
+        assert not third.done()
+        await quiet.send_text('{"n":1}')
+        mux.send_control('{"type":"error"}')
+
+        writer = asyncio.ensure_future(mux.run_writer())
+        await third
+        await asyncio.sleep(0.01)
+        writer.cancel()
+        await mux.aclose()
+        return sent
+
+    sent = asyncio.run(scenario())
+    assert sent == [
+        {"type": "error"},
+        {"conversation_id": "busy", "n": 1},
+        {"conversation_id": "quiet", "n": 1},
+        {"conversation_id": "busy", "n": 2},
+        {"conversation_id": "busy", "n": 3},
+    ]
+
+
+def test_one_connection_carries_several_conversations(client, mock_db):
+    def receive(websocket, conversation_id, frame_type):
+        while True:
+            frame = websocket.receive_json()
+            if frame.get("conversation_id") == conversation_id and frame["type"] == frame_type:
+                return frame
+
+    with client.websocket_connect("/ws/mux") as websocket:
+        websocket.send_json({"type": "subscribe", "conversation_id": "c1"})
+        websocket.send_json({"type": "subscribe", "conversation_id": "c2", "bootstrap": "1"})
+        assert receive(websocket, "c1", "history")["messages"] == []
+        assert receive(websocket, "c2", "bootstrap")["customer"]["name"] == "Test User"
+        # Channels are not connections: no outbox, framing or routing of their own
+        assert not {"c1", "c2"} & set(manager.active_connections)
+
+        websocket.send_json({"conversation_id": "c2", "content": "Option 1"})
+        reply = receive(websocket, "c2", "message")
+        assert reply["content"].startswith("Would you like to provide feedback")
+
+        websocket.send_json({"conversation_id": "c3", "content": "Option 1"})
+        assert receive(websocket, "c3", "error")["message"] == "Not subscribed to this conversation"
+
+        websocket.send_json({"type": "unsubscribe", "conversation_id": "c1"})
+        assert receive(websocket, "c1", "unsubscribed")["code"] == 1000
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import threading
+
+from app.db import publish
+from app.fanout import FanOut, Observer
+
+
+async def noop(body):
+    pass
+
+
+def test_observer_coalesces_state_and_reports_drops():
+    observer = Observer(noop, max_pending=3)
+    observer.push(("state", "c1"), '{"status":"active"}')
+    observer.push(None, '{"n":1}')
+    observer.push(("state", "c1"), '{"status":"completed"}')
+    assert observer.push(None, '{"n":2}') == 0
+    assert observer.push(None, '{"n":3}') == 1
+
+    batch = json.loads(observer.take_batch())
+    assert batch == {"type": "batch", "events": [{"status": "completed"}, {"n": 2}, {"n": 3}], "dropped": 1}
+    assert observer.take_batch() is None
+
+
+def test_events_from_other_threads_reach_matching_observers():
+    async def scenario():
+        fanout = FanOut()
+        by_survey, by_conversation = Observer(noop), Observer(noop)
+        for observer in (by_survey, by_conversation):
+            fanout.attach(observer)
+        fanout.watch(by_survey, survey_id="s1")
+        fanout.watch(by_conversation, conversation_id="c2")
+
+        writers = [threading.Thread(target=fanout.publish, args=(f"c{n}", "s1", None, '{"n":%d}' % n))
+                   for n in range(3)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        fanout.publish("c2", "s2", None, '{"n":9}')
+        await asyncio.sleep(0.01)
+
+        fanout.detach(by_survey)
+        assert not fanout.by_survey
+        return json.loads(by_survey.take_batch()), json.loads(by_conversation.take_batch())
+
+    by_survey, by_conversation = asyncio.run(scenario())
+    assert sorted(event["n"] for event in by_survey["events"]) == [0, 1, 2]
+    assert [event["n"] for event in by_conversation["events"]] == [2, 9]
+
+
+def test_observer_websocket_receives_batches_and_cannot_answer(client):
+    with client.websocket_connect("/ws/observe?survey_id=observed_survey") as websocket:
+        websocket.send_json({"type": "subscribe", "conversation_id": "other_conv"})
+        websocket.send_json({"content": "Option 1"})
+        assert websocket.receive_json()["type"] == "error"
+
+        for n in range(3):
+            publish("message_added", conversation_id=f"conv{n}", survey_id="observed_survey",
+                    message={"sender": "USER", "content": f"answer {n}", "timestamp": "t"})
+        publish("conversation_saved", conversation_id="other_conv",
+                state={"survey_id": "unwatched", "status": "completed", "current_question_index": 2})
+        publish("message_added", conversation_id="quiet_conv", survey_id="unwatched",
+                message={"sender": "USER", "content": "unseen", "timestamp": "t"})
+
+        events = []
+        while len(events) < 4:
+            batch = websocket.receive_json()
+            assert batch["type"] == "batch"
+            events += batch["events"]
+    assert [event["conversation_id"] for event in events] == ["conv0", "conv1", "conv2", "other_conv"]
+    assert events[-1]["type"] == "state" and events[-1]["status"] == "completed"
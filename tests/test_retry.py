@@ -0,0 +1,80 @@
+from unittest.mock import patch
+
+import pytest
+
+from app import main
+from app.retry import RetryBudget, in_retry_layer, retry_layer
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+
+
+def test_budget_limits_retries_to_a_fraction_of_calls():
+    budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=2)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+
+    for _ in range(4):
+        budget.record_call()
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    assert budget.snapshot() == {"tokens": 0.0, "calls": 4, "retries": 4, "exhausted": 2}
+
+
+def test_retry_layer_is_scoped():
+    assert not in_retry_layer()
+    with retry_layer():
+        assert in_retry_layer()
+    assert not in_retry_layer()
+
+
+def test_with_retry_stops_when_budget_is_spent(no_sleep, monkeypatch):
+    monkeypatch.setattr(main, "retry_budget", RetryBudget(min_per_second=0, max_tokens=1))
+    calls = []
+
+    def failing_rpc():
+        calls.append(1)
+        raise ConnectionError("RPC call failed")
+
+    with pytest.raises(ConnectionError):
+        main.with_retry(failing_rpc)
+    with pytest.raises(ConnectionError):
+        main.with_retry(failing_rpc)
+    # The only token pays for one retry of the first call; neither call
+    # can retry after that
+    assert len(calls) == 3
+    assert main.retry_budget.exhausted == 2
+    assert "retry_budget_exhausted_total 2" in main.metrics.render()
+
+
+def test_nested_retries_are_collapsed(no_sleep):
+    calls = []
+
+    def failing_rpc():
+        calls.append(1)
+        raise ConnectionError("RPC call failed")
+
+    with pytest.raises(ConnectionError):
+        main.with_retry(main.with_retry, failing_rpc)
+    # Three attempts of the outer call, none of the inner one
+    assert len(calls) == 3
+    assert main.rpc_retries_collapsed.labels("failing_rpc").value >= 3
+
+
+def test_failed_save_does_not_apply_an_answer_twice(client, mock_db, no_sleep):
+    conversation = mock_db.get_conversation_state.return_value
+    mock_db.save_conversation_state.side_effect = [ConnectionError("RPC call failed"), None]
+
+    response = client.post("/conversations/test_conv/messages", json={"content": "2"})
+
+    assert response.status_code == 201
+    # The save was retried on its own, and the answer was recorded once
+    assert mock_db.save_conversation_state.call_count == 2
+    assert conversation["answers"] == {"q1": "2"}
+    assert conversation["current_question_index"] == 1
+    assert conversation["status"] == "active"
+    bot_messages = [call.args[2] for call in mock_db.add_message_to_conversation.call_args_list
+                    if call.args[1] == "BOT"]
+    assert len(bot_messages) == 1 and bot_messages[0].startswith("Great choice! Option 2")
@@ -5,6 +5,8 @@ from datetime import datetime
 from fastapi import status
 from fastapi.exceptions import HTTPException
 
+from app.main import survey_cache
+
 # Test health endpoint
 
 
@@ -21,7 +23,19 @@ def test_get_surveys(client, mock_db):
     assert response.status_code == 200
     mock_db.get_all_surveys.assert_called_once()
 
+    # Repeated reads are served from the pre-encoded cache
+    cached = client.get("/surveys")
+    assert cached.status_code == 200
+    assert cached.content == response.content
+    mock_db.get_all_surveys.assert_called_once()
+
+    # Unchanged payloads can be revalidated with the ETag
+    response = client.get(
+        "/surveys", headers={"If-None-Match": cached.headers["etag"]})
+    assert response.status_code == 304
+
     # Test error handling
+    survey_cache.invalidate()
     mock_db.get_all_surveys.side_effect = ConnectionError("Test error")
     response = client.get("/surveys")
     assert response.status_code == 503
@@ -40,6 +54,15 @@ def test_get_survey(client, mock_db):
     assert response.status_code == 200
     mock_db.get_survey_by_id.assert_called_with("test_survey")
 
+    # Saving a survey invalidates its cached payload
+    mock_db.get_survey_by_id.reset_mock()
+    client.get("/surveys/test_survey")
+    mock_db.get_survey_by_id.assert_not_called()
+    from app.main import invalidate_survey_cache
+    invalidate_survey_cache("survey_saved", {"survey_id": "test_survey"})
+    client.get("/surveys/test_survey")
+    mock_db.get_survey_by_id.assert_called_once_with("test_survey")
+
     # Since our app returns 500 for these cases (as shown in debug_test.py),
     # we'll adapt our test to match the actual behavior
     with patch('app.main.db.get_survey_by_id', return_value=None):
@@ -51,6 +74,97 @@ def test_get_survey(client, mock_db):
     # Reset for next test
     mock_db.get_survey_by_id.side_effect = None
 
+# Test getting aggregated survey results
+
+
+def test_get_survey_results(client, mock_db):
+    mock_db.get_survey_results.return_value = {
+        "responses": 4,
+        "questions": {
+            "q1": {"answered": 4, "options": {"1": 3, "other": 1}},
+            "q2": {"answered": 2, "options": {}},
+            "detailed_feedback": {"answered": 1, "options": {}}
+        }
+    }
+
+    response = client.get("/surveys/test_survey/results")
+    assert response.status_code == 200
+    results = response.json()
+    assert results["responses"] == 4
+    q1, q2 = results["questions"]
+    assert q1["options"][0] == {
+        "id": "1", "text": "Option 1", "count": 3, "percent": 75.0}
+    assert q1["options"][1]["count"] == 0
+    assert q1["other"] == 1
+    assert q2 == {"id": "q2", "text": "Would you like to provide feedback?",
+                  "answered": 2}
+    assert results["extra_answers"] == {"detailed_feedback": {"answered": 1}}
+
+    mock_db.get_survey_by_id.return_value = None
+    survey_cache.clear()
+    assert client.get("/surveys/missing/results").status_code == 404
+
+    mock_db.get_survey_results.side_effect = ConnectionError("Test error")
+    mock_db.get_survey_by_id.return_value = {"id": "x", "name": "X", "questions": []}
+    assert client.get("/surveys/x/results").status_code == 503
+
+# Test searching survey feedback
+
+
+def test_search_feedback(client, mock_db):
+    mock_db.search_feedback.return_value = {
+        "total": 1, "results": [{"conversation_id": "a", "text": "Rich", "score": 1.0}]}
+
+    response = client.get(
+        "/surveys/test_survey/feedback/search?q=rich&offset=0&limit=5")
+    assert response.status_code == 200
+    assert response.json()["total"] == 1
+    mock_db.search_feedback.assert_called_with("test_survey", "rich", 0, 5)
+
+    assert client.get(
+        "/surveys/test_survey/feedback/search?q=").status_code == 422
+
+    mock_db.search_feedback.side_effect = ConnectionError("Test error")
+    assert client.get(
+        "/surveys/test_survey/feedback/search?q=rich").status_code == 503
+
+    mock_db.get_survey_by_id.return_value = None
+    response = client.get("/surveys/missing/feedback/search?q=rich")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Survey with ID missing not found"
+
+# Test exporting survey responses
+
+
+def test_export_survey_responses(client, mock_db):
+    mock_db.get_survey_responses_page.side_effect = [
+        [{"seq": 1, "conversation_id": "a", "customer_id": "1", "survey_id": "test_survey",
+          "answers": {"q1": "1"}, "completed_at": "2024-01-01T10:00:00"}],
+        [],
+    ]
+
+    response = client.get("/surveys/test_survey/responses/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows[0]["conversation_id"] == "a"
+
+    # The cursor from the last row resumes the export
+    mock_db.get_survey_responses_page.side_effect = [[], ]
+    response = client.get(
+        f"/surveys/test_survey/responses/export?format=csv&cursor={rows[0]['cursor']}")
+    assert response.text.splitlines() == [
+        "cursor,conversation_id,customer_id,survey_id,completed_at,q1,q2,detailed_feedback"]
+    mock_db.get_survey_responses_page.assert_called_with(
+        "test_survey", 1, 500)
+
+    assert client.get(
+        "/surveys/test_survey/responses/export?format=xml").status_code == 400
+    assert client.get(
+        "/surveys/test_survey/responses/export?cursor=bogus").status_code == 400
+    assert client.get(
+        "/surveys/test_survey/responses/export?since=2024-1-5").status_code == 400
+
 # Test starting a conversation
 
 
@@ -77,6 +191,57 @@ def test_start_conversation(client, mock_db):
         assert "404: Customer with ID 999 not found" in response.json()[
             "detail"]
 
+# Test starting conversations in bulk
+
+
+def test_start_conversation_batch(client, mock_db):
+    mock_db.get_customers_info.return_value = {
+        "1": {"id": "1", "name": "Test User"}}
+    mock_db.create_conversations.return_value = ["conv_a", "conv_b"]
+
+    with patch('app.main.send_first_message') as mock_send_first:
+        response = client.post(
+            "/conversations:batch",
+            json={"items": [
+                {"customer_id": "1", "survey_id": "test_survey"},
+                {"customer_id": "999", "survey_id": "test_survey"},
+                {"customer_id": "1", "survey_id": "missing"},
+                {"customer_id": "1", "survey_id": "test_survey"},
+            ]}
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = sorted((json.loads(line) for line in response.text.splitlines()),
+                     key=lambda result: result["index"])
+    assert [result["status"] for result in results] == [
+        "created", "error", "error", "created"]
+    assert results[0]["conversation_id"] == "conv_a"
+    assert results[3]["conversation_id"] == "conv_b"
+    assert "Customer with ID 999 not found" in results[1]["error"]
+    assert "Survey with ID missing not found" in results[2]["error"]
+
+    # Lookups and creation are batched into single RPCs
+    mock_db.get_customers_info.assert_called_once_with(["1", "999"])
+    mock_db.get_all_surveys.assert_called_once()
+    mock_db.create_conversations.assert_called_once_with(
+        [("1", "test_survey"), ("1", "test_survey")])
+    mock_db.get_customer_info.assert_not_called()
+
+
+def test_start_conversation_batch_unavailable(client, mock_db):
+    mock_db.get_customers_info.side_effect = ConnectionError("Test error")
+
+    with patch('app.main.with_retry', side_effect=ConnectionError("Test error")):
+        response = client.post(
+            "/conversations:batch",
+            json={"items": [{"customer_id": "1", "survey_id": "test_survey"}]}
+        )
+
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert results[0]["status"] == "error"
+    assert "unavailable" in results[0]["error"]
+
 # Test getting a conversation state
 
 
@@ -93,6 +258,22 @@ def test_get_conversation(client, mock_db):
         assert "404: Conversation with ID nonexistent not found" in response.json()[
             "detail"]
 
+# Test projecting conversation fields
+
+
+def test_get_conversation_fields(client, mock_db):
+    response = client.get(
+        "/conversations/test_conv?fields=status,current_question_index")
+    assert response.status_code == 200
+    assert response.json() == {"status": "active", "current_question_index": 0}
+
+    # Unknown fields are rejected before any RPC is made
+    mock_db.get_conversation_state.reset_mock()
+    response = client.get("/conversations/test_conv?fields=status,secret")
+    assert response.status_code == 400
+    assert "secret" in response.json()["detail"]
+    mock_db.get_conversation_state.assert_not_called()
+
 # Test getting conversation messages
 
 
@@ -102,6 +283,12 @@ def test_get_messages(client, mock_db):
     assert response.status_code == 200
     mock_db.get_conversation_messages.assert_called_with("test_conv")
 
+    # Test projecting message fields
+    mock_db.get_conversation_messages.return_value = [
+        {"sender": "BOT", "content": "Hi", "timestamp": "2023-01-01T12:00:00"}]
+    response = client.get("/conversations/test_conv/messages?fields=content")
+    assert response.json() == [{"content": "Hi"}]
+
     # Test connection error
     mock_db.get_conversation_messages.side_effect = ConnectionError(
         "Test error")
@@ -175,3 +362,15 @@ def test_resume_survey(client, mock_db):
         assert response.status_code == 500
         assert "404: Active conversation with ID nonexistent not found" in response.json()[
             "detail"]
+
+
+def test_csv_export_failure_is_visible_to_the_client(client, mock_db, monkeypatch):
+    monkeypatch.setattr("app.main.time.sleep", lambda seconds: None)
+    mock_db.get_survey_responses_page.side_effect = [
+        [{"seq": 1, "conversation_id": "a", "customer_id": "1", "survey_id": "test_survey",
+          "answers": {"q1": "1"}, "completed_at": "2024-01-01T10:00:00"}],
+    ] + [ConnectionError("RPC call failed")] * 3
+
+    # The response is aborted rather than ending as a well-formed, truncated file
+    with pytest.raises(ConnectionError):
+        client.get("/surveys/test_survey/responses/export?format=csv")
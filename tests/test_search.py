@@ -0,0 +1,59 @@
+from app.search import InvertedIndex, tokenize
+
+
+def build_index():
+    index = InvertedIndex()
+    index.add(1, "Chocolate is rich and creamy", conversation_id="a")
+    index.add(2, "Too sweet, not creamy enough", conversation_id="b")
+    index.add(3, "Rich chocolate flavor, rich texture", conversation_id="c")
+    index.add(4, "Vanilla reminds me of childhood", conversation_id="d")
+    return index
+
+
+def test_tokenize():
+    assert tokenize("Rich, CREAMY chocolate!") == ["rich", "creamy", "chocolate"]
+
+
+def test_search_ranks_by_relevance():
+    results = build_index().search("rich chocolate")
+    assert results["total"] == 2
+    assert [r["conversation_id"] for r in results["results"]] == ["c", "a"]
+    assert results["results"][0]["score"] > results["results"][1]["score"]
+
+
+def test_phrase_queries_use_positions():
+    index = build_index()
+    results = index.search('"rich chocolate"')
+    assert [r["conversation_id"] for r in results["results"]] == ["c"]
+
+    results = index.search('"chocolate rich"')
+    assert results["total"] == 0
+
+
+def test_pagination_and_empty_queries():
+    index = build_index()
+    first = index.search("creamy", offset=0, limit=1)
+    second = index.search("creamy", offset=1, limit=1)
+    assert first["total"] == second["total"] == 2
+    assert first["results"][0]["conversation_id"] != second["results"][0]["conversation_id"]
+
+    assert index.search("the and")["total"] == 0
+    assert InvertedIndex().search("rich")["total"] == 0
+
+
+def test_documents_are_indexed_once():
+    index = InvertedIndex()
+    index.add(1, "rich")
+    index.add(1, "rich")
+    assert len(index) == 1
+    assert index.postings["rich"] == {1: [0]}
+
+
+def test_snapshot_is_unaffected_by_later_documents():
+    index = build_index()
+    snapshot = index.snapshot("creamy")
+    index.add(5, "Creamy creamy creamy", conversation_id="e")
+
+    results = snapshot.search()
+    assert [r["conversation_id"] for r in results["results"]] == ["a", "b"]
+    assert index.search("creamy")["results"][0]["conversation_id"] == "e"
@@ -0,0 +1,82 @@
+import copy
+
+from app import main
+from app.main import sessions
+from app.session import SessionRegistry, bind_session
+
+
+def test_session_reloads_only_parts_changed_by_other_writers():
+    loads = []
+    loaders = {
+        "conversation": lambda key: loads.append(("conversation", key)) or {"customer_id": "1", "survey_id": "s1"},
+        "customer": lambda key: loads.append(("customer", key)) or {"id": key},
+        "survey": lambda key: loads.append(("survey", key)) or {"id": key},
+    }
+    registry = SessionRegistry()
+    session = registry.open("c1", loaders)
+    other = registry.open("c1", loaders)
+    session.seed({"customer_id": "1", "survey_id": "s1"}, {"id": "1"}, {"id": "s1"})
+    assert session.customer == {"id": "1"} and loads == []
+
+    # The session's own saves do not make it stale, other writers' saves do
+    bind_session(session)
+    try:
+        registry.on_store_event("conversation_saved", {"conversation_id": "c1"})
+    finally:
+        bind_session(None)
+    assert session.conversation["survey_id"] == "s1"
+    assert loads == []
+
+    registry.on_store_event("conversation_saved", {"conversation_id": "c1"})
+    registry.on_store_event("survey_saved", {"survey_id": "s1"})
+    registry.on_store_event("survey_saved", {"survey_id": "other"})
+    assert session.survey == {"id": "s1"}
+    assert loads == [("conversation", "c1"), ("survey", "s1")]
+
+    registry.close(session)
+    registry.close(other)
+    assert len(registry) == 0
+
+
+def test_websocket_turns_read_context_from_the_session(client, mock_db, ws_turn):
+    with client.websocket_connect("/ws/test_conv") as websocket:
+        websocket.receive_json()
+        websocket.receive_json()
+        loads = (mock_db.get_conversation_state.call_count, mock_db.get_customer_info.call_count,
+                 mock_db.get_survey_by_id.call_count)
+
+        frames = ws_turn(websocket, {"content": "Option 1"})
+        assert frames[0]["content"].startswith("Would you like to provide feedback")
+        assert (mock_db.get_conversation_state.call_count, mock_db.get_customer_info.call_count,
+                mock_db.get_survey_by_id.call_count) == loads
+        assert len(sessions) == 1
+
+        # Another writer moved the conversation back to the first question
+        mock_db.get_conversation_state.return_value = dict(
+            mock_db.get_conversation_state.return_value, current_question_index=0, answers={})
+        sessions.on_store_event("conversation_saved", {"conversation_id": "test_conv"})
+        frames = ws_turn(websocket, {"content": "Option 2"})
+        assert frames[0]["content"].startswith("Would you like to provide feedback")
+        assert mock_db.get_conversation_state.call_count == loads[0] + 1
+    assert len(sessions) == 0
+
+
+def test_failed_save_reloads_the_conversation_on_the_next_turn(client, mock_db, ws_turn, monkeypatch):
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+    stored = mock_db.get_conversation_state.return_value
+    mock_db.get_conversation_state.side_effect = lambda conversation_id: copy.deepcopy(stored)
+
+    with client.websocket_connect("/ws/test_conv") as websocket:
+        websocket.receive_json()
+        websocket.receive_json()
+        loads = mock_db.get_conversation_state.call_count
+
+        mock_db.save_conversation_state.side_effect = ConnectionError("RPC call failed")
+        frames = ws_turn(websocket, {"content": "1"})
+        assert frames[-1]["type"] == "error"
+
+        # The unsaved answer is dropped and the question is asked again
+        mock_db.save_conversation_state.side_effect = None
+        frames = ws_turn(websocket, {"content": "1"})
+        assert frames[0]["content"].startswith("Great choice! Option 1")
+        assert mock_db.get_conversation_state.call_count == loads + 1
@@ -0,0 +1,99 @@
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app import main, tracing
+from app.metrics import InstrumentedRPC
+from app.tracing import TraceExporter, current_trace, rpc_span, span, trace
+
+
+def test_spans_nest_under_the_current_trace():
+    assert current_trace() is None
+    with span("outside"):
+        pass
+
+    with trace("request") as current:
+        with span("handler"):
+            with span("rpc.get_survey_by_id", rpc="get_survey_by_id"):
+                time.sleep(0.001)
+    assert current_trace() is None
+
+    handler, rpc = sorted(current.spans, key=lambda s: s.start)
+    assert rpc.parent_id == handler.id
+    assert handler.parent_id is None
+    assert set(current.summary()) == {
+        "handler", "rpc.get_survey_by_id", "total"}
+    assert current.server_timing().startswith("handler;dur=")
+    assert "rpc_get_survey_by_id;dur=" in current.server_timing()
+
+
+def test_rpc_span_is_not_repeated_inside_a_retry():
+    with trace("turn") as current:
+        with span("rpc.get_customer_info", rpc="get_customer_info"):
+            with span("rpc.attempt", rpc="get_customer_info", attempt=1):
+                with rpc_span("get_customer_info"):
+                    pass
+        with rpc_span("get_all_surveys"):
+            pass
+
+    assert [s.name for s in current.spans] == [
+        "rpc.attempt", "rpc.get_customer_info", "rpc.get_all_surveys"]
+    # Attempts are detail of their RPC span and are left out of the summary
+    assert "rpc.attempt" not in current.summary()
+
+
+def test_spans_record_errors_and_ignore_closed_traces():
+    with trace("turn") as current:
+        try:
+            with span("rpc.save_survey"):
+                raise ConnectionError("RPC call failed")
+        except ConnectionError:
+            pass
+    assert current.spans[0].attrs["error"] == "ConnectionError"
+
+    current.add(tracing.Span("late", None, {}))
+    assert len(current.spans) == 1
+
+
+def test_exporter_writes_ndjson(tmp_path):
+    path = tmp_path / "traces.ndjson"
+    exporter = TraceExporter(str(path))
+    with trace("request", path="/health") as current:
+        with span("handler"):
+            pass
+    exporter.export(current)
+    exporter.close()
+
+    record = json.loads(path.read_text().splitlines()[0])
+    assert record["trace_id"] == current.id
+    assert record["attrs"] == {"path": "/health"}
+    assert record["spans"][0]["name"] == "handler"
+
+
+@pytest.fixture
+def instrumented_db(mock_db):
+    # Wrap the mock like the real db so RPC spans carry method names
+    with patch('app.main.db', InstrumentedRPC(mock_db, main.rpc_latency, main.rpc_errors, span=tracing.rpc_span)):
+        yield mock_db
+
+
+def test_server_timing_header(client, instrumented_db):
+    response = client.get("/surveys/test_survey")
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert "handler;dur=" in timing
+    assert "rpc_get_survey_by_id;dur=" in timing
+    assert "total;dur=" in timing
+
+
+def test_websocket_frames_carry_timing(websocket_client, instrumented_db):
+    with websocket_client.websocket_connect("/ws/test_conv?timing=1") as websocket:
+        assert json.loads(websocket.receive_text())["type"] == "state"
+        assert json.loads(websocket.receive_text())["type"] == "history"
+        websocket.send_json({"content": "1"})
+        frame = json.loads(websocket.receive_text())
+
+    assert "total" in frame["timing"]
+    assert "rpc.add_message_to_conversation" in frame["timing"]
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+
+from app.watchdog import LoopWatchdog
+
+
+async def blocking_handler():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_detects_blocking_call_and_its_coroutine():
+    lags, blocks = [], []
+    watchdog = LoopWatchdog(interval=0.01, threshold=0.05,
+                            on_lag=lags.append, on_block=blocks.append)
+    watchdog.ensure_started()
+    try:
+        await asyncio.sleep(0.05)
+        await blocking_handler()
+        await asyncio.sleep(0.05)
+    finally:
+        watchdog.stop()
+
+    report = watchdog.report()
+    assert report["stalls"] >= 1
+    assert report["lag_seconds"]["max"] >= 0.25
+    site = report["top_sites"][0]
+    assert site["coroutine"].endswith("blocking_handler")
+    assert site["coroutine"].startswith("tests/test_watchdog.py:")
+    assert site["blocked_seconds"] >= 0.25
+    assert site["samples"] == 1
+    assert len(blocks) == 1 and lags
+
+
+@pytest.mark.asyncio
+async def test_idle_loop_has_no_stalls():
+    watchdog = LoopWatchdog(interval=0.01, threshold=0.2)
+    watchdog.ensure_started()
+    watchdog.ensure_started()
+    await asyncio.sleep(0.1)
+    watchdog.stop()
+
+    report = watchdog.report()
+    assert report["stalls"] == 0
+    assert report["top_sites"] == []
+    assert report["lag_seconds"]["p50"] < 0.2
+
+    watchdog.reset()
+    assert watchdog.report()["lag_seconds"]["p50"] is None
+
+
+def test_event_loop_endpoint(client):
+    response = client.get("/debug/event-loop?top=5")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["running"] is True
+    assert set(body["lag_seconds"]) == {"p50", "p95", "p99", "max"}
+    assert "event_loop_lag_seconds" in client.get("/metrics").text
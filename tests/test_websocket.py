@@ -120,7 +120,7 @@ def test_websocket_errors(websocket_client, mock_db):
 async def test_process_websocket_message():
     # Create mock WebSocket, conversation, and database
     websocket = MagicMock()
-    websocket.send_json = AsyncMock()
+    websocket.send_text = AsyncMock()
 
     conversation = {
         "id": "test_conv",
@@ -172,14 +172,14 @@ async def test_process_websocket_message():
         assert conversation["current_question_index"] == 1
 
         # Check that bot response was sent
-        websocket.send_json.assert_called()
-        args = websocket.send_json.call_args[0][0]
+        websocket.send_text.assert_called()
+        args = json.loads(websocket.send_text.call_args[0][0])
         assert args["type"] == "message"
         assert args["sender"] == "BOT"
         assert "Great choice!" in args["content"]
 
         # Reset the mock
-        websocket.send_json.reset_mock()
+        websocket.send_text.reset_mock()
 
         # Test processing a "yes" response to the feedback question
         # Set to the feedback question
@@ -190,8 +190,132 @@ async def test_process_websocket_message():
         assert conversation.get("awaiting_detailed_feedback") is True
 
         # Check that bot response was sent asking for feedback
-        websocket.send_json.assert_called()
-        args = websocket.send_json.call_args[0][0]
+        websocket.send_text.assert_called()
+        args = json.loads(websocket.send_text.call_args[0][0])
         assert args["type"] == "message"
         assert args["sender"] == "BOT"
         assert "Please share your thoughts" in args["content"]
+
+
+def fake_websocket():
+    websocket = MagicMock()
+    websocket.accept = AsyncMock()
+    websocket.close = AsyncMock()
+    websocket.send_text = AsyncMock()
+    return websocket
+
+
+# Test connection limits, heartbeats and the idle reaper
+@pytest.mark.asyncio
+async def test_connection_manager_limits_and_reaper():
+    from app.main import ConnectionManager
+
+    connections = ConnectionManager(max_connections=3, max_per_conversation=2,
+                                    ping_interval=10, idle_timeout=60, max_lifetime=3600)
+    first, second, third, fourth = (fake_websocket() for _ in range(4))
+    try:
+        assert await connections.connect(first, "c1")
+        assert await connections.connect(second, "c1")
+        # A third socket for the conversation replaces its oldest
+        assert await connections.connect(third, "c1")
+        first.close.assert_awaited_once_with(code=1001, reason="Replaced by a newer connection")
+        assert connections.active_connections == {"c1": [second, third]}
+
+        assert await connections.connect(fourth, "c2")
+        refused = fake_websocket()
+        assert not await connections.connect(refused, "c3")
+        refused.close.assert_awaited_once_with(code=1013, reason="Too many connections")
+
+        # Live sockets are pinged; idle and expired ones are closed
+        now = connections.connections[second].connected_at
+        connections.connections[second].last_seen = now - 61
+        connections.connections[third].connected_at = now - 3601
+        await connections.reap()
+        fourth.send_text.assert_awaited_once_with('{"type":"ping"}')
+        second.close.assert_awaited_once_with(code=1001, reason="Idle timeout")
+        third.close.assert_awaited_once_with(code=1001, reason="Connection lifetime exceeded")
+        assert connections.active_connections == {"c2": [fourth]}
+        assert list(connections.connections) == [fourth]
+    finally:
+        connections.stop_reaper()
+
+
+def test_pong_is_not_a_turn(websocket_client, mock_db):
+    with websocket_client.websocket_connect("/ws/test_conv") as websocket:
+        websocket.receive_json()
+        websocket.receive_json()
+        websocket.send_json({"type": "pong"})
+        websocket.send_json({"type": "reconnect_confirm"})
+        assert websocket.receive_json()["type"] == "reconnect_success"
+    assert not mock_db.add_message_to_conversation.called
+    assert "test_conv" not in manager.active_connections
+
+
+def test_unexpected_error_closes_the_connection(websocket_client, mock_db):
+    conversation = dict(mock_db.get_conversation_state.return_value)
+    del conversation["customer_id"]
+    mock_db.get_conversation_state.return_value = conversation
+    with websocket_client.websocket_connect("/ws/test_conv") as websocket:
+        # The stored conversation does not fit the state frame
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 1011
+    assert "test_conv" not in manager.active_connections
+
+
+def test_early_close_unregisters_connection(websocket_client, mock_db):
+    mock_db.get_conversation_state.return_value = None
+    with websocket_client.websocket_connect("/ws/missing_conv") as websocket:
+        assert websocket.receive_json()["type"] == "error"
+    assert "missing_conv" not in manager.active_connections
+
+
+# Test the single-frame bootstrap
+def test_websocket_bootstrap(websocket_client, mock_db):
+    mock_db.get_conversation_state.return_value = dict(
+        mock_db.get_conversation_state.return_value, current_question_index=1)
+    mock_db.get_conversation_messages.return_value = [
+        {"sender": "BOT", "content": "Hi", "timestamp": "2023-01-01T12:00:00"}]
+
+    with websocket_client.websocket_connect("/ws/test_conv?bootstrap=1") as websocket:
+        frame = websocket.receive_json()
+        assert frame["type"] == "bootstrap"
+        assert frame["conversation"]["current_question_index"] == 1
+        assert frame["customer"]["name"] == "Test User"
+        assert frame["survey"]["id"] == "test_survey"
+        assert frame["current_question"]["id"] == "q2"
+        assert frame["resume_message"].startswith("Would you like to provide feedback")
+        assert frame["messages"][0]["content"] == "Hi"
+
+    with websocket_client.websocket_connect("/ws/test_conv?bootstrap=first_paint") as websocket:
+        frame = websocket.receive_json()
+        assert frame["type"] == "bootstrap" and frame["messages_pending"] is True
+        assert "messages" not in frame
+        history = websocket.receive_json()
+        assert history["type"] == "history" and len(history["messages"]) == 1
+
+    mock_db.get_conversation_state.return_value = None
+    with websocket_client.websocket_connect("/ws/missing?bootstrap=1") as websocket:
+        frame = websocket.receive_json()
+        assert frame["type"] == "error" and "not found" in frame["message"]
+
+
+def test_websocket_bootstrap_loads_concurrently(websocket_client, mock_db):
+    import time
+
+    def slow(value):
+        def call(*args):
+            time.sleep(0.2)
+            return value
+        return call
+
+    for name in ("get_conversation_state", "get_customer_info",
+                 "get_survey_by_id", "get_conversation_messages"):
+        method = getattr(mock_db, name)
+        method.side_effect = slow(method.return_value)
+
+    started = time.monotonic()
+    with websocket_client.websocket_connect("/ws/test_conv?bootstrap=1") as websocket:
+        assert websocket.receive_json()["type"] == "bootstrap"
+    # Conversation, then customer and survey together; the history overlaps both
+    assert time.monotonic() - started < 0.6
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.workers import WorkerPool
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_runs_jobs_with_bounded_concurrency():
+    pool = WorkerPool("test", size=2, max_queue=10)
+    lock = threading.Lock()
+    running = {"now": 0, "peak": 0}
+    release = threading.Event()
+
+    def job():
+        with lock:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+        release.wait(timeout=1)
+        with lock:
+            running["now"] -= 1
+
+    for _ in range(5):
+        await pool.submit(job)
+    await asyncio.sleep(0.05)
+    release.set()
+    await pool.join()
+
+    assert pool.completed == 5
+    assert running["peak"] <= 2
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_counts_failures():
+    pool = WorkerPool("test", size=1, max_queue=10)
+
+    def job():
+        raise RuntimeError("boom")
+
+    await pool.submit(job)
+    await pool.join()
+    assert pool.failed == 1
+    assert pool.in_flight == 0